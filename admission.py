@@ -0,0 +1,275 @@
+"""Rate limiting and admission control for expensive endpoints.
+
+Requests are sorted into endpoint classes by path. The expensive classes
+(chat, which calls the LLM, and web_search, which fans out to the search
+backend) have a per-client token bucket (429 with Retry-After once a
+client's burst is spent) and a per-process concurrency cap with a bounded
+FIFO wait queue. A request that finds the queue full or
+waits longer than the queue timeout is shed with a 503 instead of piling up
+work nobody will wait for.
+
+Catalog reads have priority: they are not rate limited and never queued
+or shed for load, and the expensive classes are shed outright while the process already has
+ADMISSION_MAX_IN_FLIGHT requests in progress, so a chat burst cannot take
+the capacity listing reads need.
+
+Clients are told apart by their socket address. Behind a reverse proxy
+that is the proxy's, so every client would share one bucket: set
+ADMISSION_CLIENT_HEADER=x-forwarded-for and ADMISSION_PROXY_HOPS to the
+number of trusted proxies. The address is taken that many entries from the
+right of the header, the part the proxies appended; entries further left
+are supplied by the client and could be rotated to get fresh buckets.
+
+Limits are per process, like the caches. Each class's limits can be
+overridden with ADMISSION_<CLASS>_RATE, _BURST, _CONCURRENCY, _QUEUE and
+_QUEUE_TIMEOUT; ADMISSION_ENABLED=0 turns the whole thing off.
+"""
+import asyncio
+import math
+import os
+import re
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Deque, Dict, NamedTuple, Optional, Pattern, Tuple
+
+from metrics import admission_rejected, admission_queue_wait
+
+ENABLED = os.environ.get('ADMISSION_ENABLED', '1') != '0'
+MAX_IN_FLIGHT = int(os.environ.get('ADMISSION_MAX_IN_FLIGHT', 64))
+# Header naming the client when behind a proxy (e.g. x-forwarded-for); the socket peer otherwise
+CLIENT_HEADER = os.environ.get('ADMISSION_CLIENT_HEADER', '').lower().encode('latin-1')
+# Trusted proxies in front of the app, each appending one entry to CLIENT_HEADER
+PROXY_HOPS = max(1, int(os.environ.get('ADMISSION_PROXY_HOPS', 1)))
+MAX_CLIENTS = 10000
+
+class EndpointClass(NamedTuple):
+    name: str
+    rate: Optional[float]        # tokens per second per client; None: not rate limited
+    burst: int                   # bucket size
+    concurrency: Optional[int]   # None: never queued or shed for load
+    queue_size: int = 0
+    queue_timeout: float = 0.0
+
+def _policy(name: str, rate: Optional[float] = None, burst: int = 0, concurrency: Optional[int] = None,
+            queue_size: int = 0, queue_timeout: float = 0.0) -> EndpointClass:
+    def env(key, default, cast):
+        value = os.environ.get(f'ADMISSION_{name.upper()}_{key}')
+        return cast(value) if value else default
+    return EndpointClass(name, env('RATE', rate, float), env('BURST', burst, int),
+                         env('CONCURRENCY', concurrency, int), env('QUEUE', queue_size, int),
+                         env('QUEUE_TIMEOUT', queue_timeout, float))
+
+CLASSES = {
+    'catalog': _policy('catalog'),
+    'chat': _policy('chat', rate=0.5, burst=5, concurrency=8, queue_size=16, queue_timeout=10.0),
+    'web_search': _policy('web_search', rate=2, burst=10, concurrency=8, queue_size=32, queue_timeout=5.0),
+}
+
+# First matching pattern wins; None means exempt. Everything else is catalog.
+ROUTES: Tuple[Tuple[Pattern, Optional[str]], ...] = (
+    (re.compile(r'^/(metrics$|static/)'), None),
+    (re.compile(r'^/(api/chat(/stream)?|ws/chat)$'), 'chat'),
+    (re.compile(r'^/api/(market-info/|amenities/|news$)'), 'web_search'),
+)
+
+def classify(path: str) -> Optional[str]:
+    """Endpoint class for a request path, or None when it is exempt"""
+    for pattern, name in ROUTES:
+        if pattern.match(path):
+            return name
+    return 'catalog'
+
+def client_key(scope) -> str:
+    """Who a request is rate limited as"""
+    if CLIENT_HEADER:
+        for name, value in scope.get('headers', ()):
+            if name == CLIENT_HEADER:
+                entries = [e.strip() for e in value.decode('latin-1').split(',')]
+                if len(entries) >= PROXY_HOPS:
+                    return entries[-PROXY_HOPS]
+                # Shorter than the proxies would make it: the request did not come through them
+                break
+    client = scope.get('client')
+    return client[0] if client else 'unknown'
+
+class Rejected(Exception):
+    """A request turned away: 429 when the client is over its rate, 503 when the class is overloaded"""
+
+    def __init__(self, status: int, reason: str, retry_after: float):
+        super().__init__(reason)
+        self.status = status
+        self.reason = reason
+        self.retry_after = max(1, math.ceil(retry_after))
+
+    @property
+    def message(self) -> str:
+        if self.status == 429:
+            return f'Too many requests; retry in {self.retry_after} s'
+        return f'Server busy; retry in {self.retry_after} s'
+
+class TokenBuckets:
+    """One token bucket per client, refilled lazily; the least recently seen clients are forgotten first"""
+
+    def __init__(self, rate: float, burst: int, max_clients: int = MAX_CLIENTS):
+        self.rate = rate
+        self.burst = burst
+        self.max_clients = max_clients
+        self._buckets: 'OrderedDict[str, Tuple[float, float]]' = OrderedDict()
+
+    def take(self, client: str) -> float:
+        """Spend a token; returns 0 on success, else seconds until one is available"""
+        now = time.monotonic()
+        entry = self._buckets.pop(client, None)
+        tokens = self.burst if entry is None else min(self.burst, entry[0] + (now - entry[1]) * self.rate)
+        wait = 0.0
+        if tokens >= 1:
+            tokens -= 1
+        else:
+            wait = (1 - tokens) / self.rate if self.rate > 0 else float('inf')
+        self._buckets[client] = (tokens, now)
+        if len(self._buckets) > self.max_clients:
+            self._buckets.popitem(last=False)
+        return wait
+
+class ConcurrencyLimit:
+    """At most `limit` requests at once, with up to `queue_size` more waiting in FIFO order"""
+
+    def __init__(self, limit: int, queue_size: int, queue_timeout: float):
+        self.limit = limit
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    async def acquire(self):
+        if self.active < self.limit and not self._waiters:
+            self.active += 1
+            return
+        if len(self._waiters) >= self.queue_size:
+            raise Rejected(503, 'queue_full', self.queue_timeout)
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(waiter, self.queue_timeout)
+        except asyncio.TimeoutError:
+            self._abandon(waiter)
+            raise Rejected(503, 'queue_timeout', self.queue_timeout)
+        except asyncio.CancelledError:
+            self._abandon(waiter)
+            raise
+
+    def _abandon(self, waiter: asyncio.Future):
+        if waiter.done() and not waiter.cancelled():
+            # The slot was handed over just as we gave up; pass it on
+            self.release()
+        elif waiter in self._waiters:
+            self._waiters.remove(waiter)
+
+    def release(self):
+        # Hand the slot straight to the next waiter so newcomers cannot jump the queue
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.active -= 1
+
+class AdmissionController:
+    """Token buckets and concurrency limits for each endpoint class in this process"""
+
+    def __init__(self, classes: Dict[str, EndpointClass] = CLASSES, max_in_flight: int = MAX_IN_FLIGHT,
+                 enabled: bool = ENABLED):
+        self.classes = classes
+        self.max_in_flight = max_in_flight
+        self.enabled = enabled
+        self.in_flight = 0
+        self._buckets = {name: TokenBuckets(c.rate, c.burst) for name, c in classes.items() if c.rate is not None}
+        self._limits = {name: ConcurrencyLimit(c.concurrency, c.queue_size, c.queue_timeout)
+                        for name, c in classes.items() if c.concurrency is not None}
+        self.admitted = {name: 0 for name in classes}
+        self.rejected = {name: 0 for name in classes}
+
+    @asynccontextmanager
+    async def admit(self, name: str, client: str) -> AsyncIterator[None]:
+        """Hold a slot in the class for the duration of the block; raises Rejected"""
+        if not self.enabled:
+            yield
+            return
+        limit = self._limits.get(name)
+        buckets = self._buckets.get(name)
+        try:
+            wait = buckets.take(client) if buckets is not None else 0
+            if wait:
+                raise Rejected(429, 'rate_limited', wait)
+            if limit is not None:
+                if self.in_flight >= self.max_in_flight:
+                    raise Rejected(503, 'overloaded', 1)
+                started = time.perf_counter()
+                await limit.acquire()
+                admission_queue_wait.observe(time.perf_counter() - started, endpoint_class=name)
+        except Rejected as e:
+            self.rejected[name] += 1
+            admission_rejected.inc(endpoint_class=name, reason=e.reason)
+            raise
+        self.admitted[name] += 1
+        self.in_flight += 1
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            if limit is not None:
+                limit.release()
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """Admitted/rejected counters and current active/queued requests per class"""
+        stats = {}
+        for name in self.classes:
+            limit = self._limits.get(name)
+            stats[name] = {
+                'admitted': self.admitted[name],
+                'rejected': self.rejected[name],
+                'active': limit.active if limit else 0,
+                'queued': limit.queued if limit else 0,
+            }
+        return stats
+
+# Global instance, shared by the middleware and the chat WebSocket
+admission = AdmissionController()
+
+async def _reject(send, error: Rejected):
+    body = ('{"success":false,"error":"%s"}' % error.message).encode('utf-8')
+    await send({
+        'type': 'http.response.start',
+        'status': error.status,
+        'headers': [(b'content-type', b'application/json'),
+                    (b'content-length', str(len(body)).encode('latin-1')),
+                    (b'retry-after', str(error.retry_after).encode('latin-1'))],
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+class AdmissionMiddleware:
+    """ASGI middleware admitting each HTTP request through `admission`.
+
+    WebSocket connections pass through; handlers that do expensive work per
+    message (the chat socket) call admission.admit themselves.
+    """
+
+    def __init__(self, app, controller: AdmissionController = admission):
+        self.app = app
+        self.controller = controller
+
+    async def __call__(self, scope, receive, send):
+        name = classify(scope['path']) if scope['type'] == 'http' else None
+        if name is None or not self.controller.enabled:
+            await self.app(scope, receive, send)
+            return
+        try:
+            async with self.controller.admit(name, client_key(scope)):
+                await self.app(scope, receive, send)
+        except Rejected as e:
+            await _reject(send, e)
@@ -1,80 +1,242 @@
-from fastapi import FastAPI, Request, Form, HTTPException, WebSocket, WebSocketDisconnect
-from fastapi.responses import HTMLResponse, JSONResponse
-from fastapi.staticfiles import StaticFiles
+from fastapi import FastAPI, Request, Form, HTTPException, WebSocket, WebSocketDisconnect, Query, UploadFile, File
+from fastapi.responses import HTMLResponse, JSONResponse, Response, StreamingResponse, FileResponse, RedirectResponse
 from fastapi.templating import Jinja2Templates
 from chat.agent import get_chatbot_response
 from db.query import (
-    get_all_properties, get_property_by_id, search_properties, 
-    add_property, update_property, delete_property
+    get_property_by_id,
+    add_property, update_property, delete_property, run_db,
+    list_properties, count_properties, count_properties_by_type, DEFAULT_PAGE_SIZE, cache_stats,
+    get_property_json, list_properties_json, search_properties_json, invalidate_cache, clear_caches
 )
-from web.maps_api import get_nearby_landmarks
-from web.web_search import web_search
+from db.changes import ChangeFeed, get_changes_since, get_change_bounds
+from db.retrieval import property_index
+from db.chat_cache import chat_cache, get_property_version
+from db.jobs import job_queue, job, get_job, list_jobs, count_jobs, STATUSES as JOB_STATUSES
+from db.snapshot import snapshot_publisher
+from db.bulk import import_stream, export_properties, detect_format
+from web.broadcast import BroadcastHub, DEFAULT_TOPIC, property_topic
+from web.maps_api import get_property_landmarks, refresh_property_landmarks
+from web.landmarks import landmark_store
+from web.valuation import value_catalog, value_properties, annotate_valuations, get_valuation_model
+from metrics import registry, MetricsMiddleware, stats_collector, CONTENT_TYPE as METRICS_CONTENT_TYPE
+from admission import admission, AdmissionMiddleware, Rejected, client_key
+from web.rendering import render_cards, page_etag, not_modified
+from web.static_files import PrecompressedStaticFiles
+from web.images import image_cache, thumbnail_url, image_version, preferred_format, ImageUnavailable, SIZES as IMAGE_SIZES
+from web.chat_stream import chat_streamer, sse_event
+from web.web_search import web_search, async_web_search
+import io
 import json
 import asyncio
-from typing import List, Dict
+from typing import List, Dict, Optional
 import os
 
 app = FastAPI(title="Real Estate AI Assistant", version="2.0")
+# Added first so it runs inside MetricsMiddleware, which also times rejected requests
+app.add_middleware(AdmissionMiddleware)
+app.add_middleware(MetricsMiddleware)
 
 # Mount static files
-app.mount('/static', StaticFiles(directory='web'), name='static')
+app.mount('/static', PrecompressedStaticFiles(directory='web'), name='static')
 
 # Templates
 templates = Jinja2Templates(directory="web")
+# Templates are compiled once; set TEMPLATE_AUTO_RELOAD=1 while editing them
+templates.env.auto_reload = os.environ.get('TEMPLATE_AUTO_RELOAD') == '1'
+templates.env.globals['thumbnail_url'] = thumbnail_url
 
-# WebSocket connections for real-time updates
-class ConnectionManager:
-    def __init__(self):
-        self.active_connections: List[WebSocket] = []
+# WebSocket hub for real-time updates
+hub = BroadcastHub()
 
-    async def connect(self, websocket: WebSocket):
-        await websocket.accept()
-        self.active_connections.append(websocket)
+# Every worker tails the shared change log and relays writes made by any
+# process to its own WebSocket clients and caches.
+change_feed = ChangeFeed()
 
-    def disconnect(self, websocket: WebSocket):
-        self.active_connections.remove(websocket)
+# A batch larger than this (e.g. a bulk import) is announced as one event
+MAX_CHANGE_EVENTS = 50
+# Reconnecting clients further behind than this are told to reload instead;
+# kept well under the hub's per-connection queue size
+MAX_REPLAY = 32
 
-    async def send_personal_message(self, message: str, websocket: WebSocket):
-        await websocket.send_text(message)
+_CHANGE_EVENT_TYPES = {'insert': 'property_added', 'update': 'property_updated', 'delete': 'property_deleted'}
+_CHANGE_MESSAGES = {
+    'insert': "New property '{name}' has been added",
+    'update': "Property '{name}' has been updated",
+    'delete': "Property '{name}' has been deleted",
+}
 
-    async def broadcast(self, message: str):
-        for connection in self.active_connections:
-            try:
-                await connection.send_text(message)
-            except:
-                # Remove disconnected clients
-                self.active_connections.remove(connection)
+def change_event(change: Dict) -> Dict:
+    """WebSocket message for one change log row"""
+    return {
+        "type": _CHANGE_EVENT_TYPES[change['op']],
+        "seq": change['seq'],
+        "property_id": change['property_id'],
+        "message": _CHANGE_MESSAGES[change['op']].format(name=change['name'])
+    }
+
+def relay_changes(changes: List[Dict]):
+    """Change feed listener: purge cached reads and notify subscribed clients"""
+    if len(changes) > MAX_CHANGE_EVENTS:
+        clear_caches()
+        hub.publish({
+            "type": "properties_changed",
+            "seq": changes[-1]['seq'],
+            "count": len(changes),
+            "message": f"{len(changes)} properties have been changed"
+        })
+        return
+    for change in changes:
+        invalidate_cache(change['property_id'])
+        property_id = change['property_id']
+        hub.publish(change_event(change), topics=(DEFAULT_TOPIC, property_topic(property_id)),
+                    coalesce_key=f"property_updated:{property_id}" if change['op'] == 'update' else None)
+
+change_feed.add_listener(relay_changes)
+
+async def purge_chat_cache(changes: List[Dict]):
+    """Change feed listener: drop cached chat answers about changed properties"""
+    await run_db(chat_cache.invalidate_properties, {change['property_id'] for change in changes})
+
+change_feed.add_listener(purge_chat_cache)
+
+# Strong references to fire-and-forget work so it is not garbage collected
+background_tasks = set()
+
+def spawn(coro):
+    """Run a coroutine without awaiting it"""
+    task = asyncio.create_task(coro)
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+
+def warm_local_caches(property_ids: List[int]):
+    """Rebuild this worker's in-memory state after writes: retrieval index, valuation model and property bodies"""
+    try:
+        property_index.sync()
+        get_valuation_model()
+        for property_id in property_ids:
+            get_property_json(property_id)
+    except Exception as e:
+        print(f"Error warming caches: {e}")
+
+async def warm_caches(changes: List[Dict]):
+    """Change feed listener: warm this worker's caches in the background.
 
-manager = ConnectionManager()
+    Every worker runs its own feed and its own caches, so this is not a job:
+    a job would warm whichever worker claimed it and leave the rest cold.
+    """
+    # Bulk changes only refresh catalog-wide state; per-property data is computed on first use
+    property_ids = (sorted({c['property_id'] for c in changes if c['op'] != 'delete'})
+                    if len(changes) <= MAX_CHANGE_EVENTS else [])
+    spawn(run_db(warm_local_caches, property_ids))
+
+change_feed.add_listener(warm_caches)
+
+# Slow side effects of writes with durable results run as background jobs
+# (db/jobs.py). They are queued from the change feed, so they also cover
+# writes made by other workers and the bulk CLI. Every worker queues them;
+# dedup keys merge the copies, so each runs once in some worker.
+@job_queue.handler('refresh_landmarks')
+def refresh_landmarks_job(property_id: int):
+    refresh_property_landmarks(property_id)
+
+@job_queue.handler('prefetch_image')
+async def prefetch_image_job(property_id: int):
+    property_data = await run_db(get_property_by_id, property_id)
+    if property_data:
+        await image_cache.prefetch(property_data.get('image_url'))
+
+async def enqueue_enrichment(changes: List[Dict]):
+    """Change feed listener: queue landmark and image jobs for changed properties"""
+    if len(changes) > MAX_CHANGE_EVENTS:
+        return
+    jobs = []
+    for property_id in sorted({c['property_id'] for c in changes if c['op'] != 'delete'}):
+        jobs += [job('refresh_landmarks', dedup_key=f'landmarks:{property_id}', property_id=property_id),
+                 job('prefetch_image', dedup_key=f'image:{property_id}', max_attempts=1, property_id=property_id)]
+    if jobs:
+        await job_queue.enqueue(jobs)
+
+change_feed.add_listener(enqueue_enrichment)
+
+# Point-in-time values, read when /metrics is scraped
+registry.add_collector(stats_collector(
+    'app_cache', 'Read cache counters and hit ratio',
+    lambda: dict(cache_stats(), chat=chat_cache.stats(), web_search=async_web_search.stats(),
+                 images=image_cache.stats())))
+registry.add_collector(stats_collector(
+    'websocket_hub', 'WebSocket connections, queued messages and delivery counters',
+    lambda: {'broadcast': hub.stats()}, label='hub'))
+registry.add_collector(stats_collector(
+    'background_jobs', 'Background jobs by status, and this worker\'s job counters',
+    lambda: {'all': count_jobs(), 'worker': job_queue.stats()}, label='scope'))
+registry.add_collector(stats_collector(
+    'chat_stream', 'Streaming chat counters and time-to-first-token (ms)',
+    lambda: {'chat': chat_streamer.stats()}, label='stream'))
+registry.add_collector(stats_collector(
+    'admission', 'Admission control: admitted and rejected requests, and active/queued requests per endpoint class',
+    admission.stats, label='endpoint_class'))
+if snapshot_publisher.path:
+    registry.add_collector(stats_collector(
+        'db_snapshot', 'Read snapshot publishes by this worker, and the current snapshot\'s seq, age and size',
+        lambda: {'snapshot': snapshot_publisher.stats()}, label='db'))
+
+@app.on_event("startup")
+async def start_change_feed():
+    await snapshot_publisher.start()
+    await change_feed.start()
+    await job_queue.start()
+
+@app.on_event("shutdown")
+async def stop_change_feed():
+    await job_queue.stop()
+    await change_feed.stop()
+    await snapshot_publisher.stop()
+
+@app.on_event("shutdown")
+async def stop_image_workers():
+    image_cache.close()
+
+def page_cache_headers(etag: str) -> Dict[str, str]:
+    # Browsers may keep the page but must revalidate; unchanged pages get a 304
+    return {"ETag": etag, "Cache-Control": "no-cache"}
 
 @app.get('/', response_class=HTMLResponse)
-async def home(request: Request):
+async def home(request: Request, cursor: Optional[str] = None, sort: str = 'newest'):
     """Main homepage with property listings"""
-    properties = get_all_properties()
+    etag = page_etag((await run_db(get_change_bounds))['latest'], 'home', cursor, sort)
+    if not_modified(request, etag):
+        return Response(status_code=304, headers=page_cache_headers(etag))
+    try:
+        properties, next_cursor = await run_db(list_properties, limit=DEFAULT_PAGE_SIZE, cursor=cursor, sort=sort)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    await run_db(annotate_valuations, properties)
+    total_properties = await run_db(count_properties)
     return templates.TemplateResponse("index.html", {
         "request": request, 
-        "properties": properties,
-        "total_properties": len(properties)
-    })
+        "cards": await run_db(render_cards, templates.env, properties),
+        "total_properties": total_properties,
+        "next_cursor": next_cursor,
+        "sort": sort
+    }, headers=page_cache_headers(etag))
 
 @app.get('/property/{property_id}', response_class=HTMLResponse)
 async def property_detail(request: Request, property_id: int):
     """Individual property detail page"""
-    property_data = get_property_by_id(property_id)
+    etag = page_etag((await run_db(get_change_bounds))['latest'], 'property', property_id)
+    if not_modified(request, etag):
+        return Response(status_code=304, headers=page_cache_headers(etag))
+    property_data = await run_db(get_property_by_id, property_id)
     if not property_data:
         raise HTTPException(status_code=404, detail="Property not found")
     
-    # Get nearby landmarks
-    try:
-        landmarks = get_nearby_landmarks(property_data['location'])
-        property_data['landmarks'] = landmarks
-    except:
-        property_data['landmarks'] = []
+    # Precomputed nearby landmarks (computed now if missing or stale)
+    property_data['landmarks'] = await run_db(get_property_landmarks, property_data)
     
     return templates.TemplateResponse("property_detail.html", {
         "request": request,
         "property": property_data
-    })
+    }, headers=page_cache_headers(etag))
 
 @app.get('/chat', response_class=HTMLResponse)
 async def chat_page(request: Request):
@@ -82,74 +244,211 @@ async def chat_page(request: Request):
     return templates.TemplateResponse("chat.html", {"request": request})
 
 @app.get('/admin', response_class=HTMLResponse)
-async def admin_page(request: Request):
+async def admin_page(request: Request, cursor: Optional[str] = None):
     """Admin panel for property management"""
-    properties = get_all_properties()
+    try:
+        properties, next_cursor = await run_db(list_properties, limit=DEFAULT_PAGE_SIZE, cursor=cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    type_counts = await run_db(count_properties_by_type)
     return templates.TemplateResponse("admin.html", {
         "request": request,
-        "properties": properties
+        "properties": properties,
+        "total_properties": sum(type_counts.values()),
+        "type_counts": type_counts,
+        "next_cursor": next_cursor
     })
 
 # API Endpoints
 @app.get('/api/properties')
-async def get_properties():
-    """Get all properties"""
-    properties = get_all_properties()
+async def get_properties(
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=200),
+    cursor: Optional[str] = None,
+    sort: str = 'newest',
+    fields: Optional[str] = None,
+    min_price: Optional[int] = Query(None, ge=0),
+    max_price: Optional[int] = Query(None, ge=0),
+    bedrooms: Optional[int] = Query(None, ge=0),
+    property_type: Optional[str] = None,
+    location: Optional[str] = None,
+    valuation: bool = False,
+    with_total: bool = False,
+):
+    """Get a page of properties, optionally filtered, sorted and projected to selected fields.
+
+    Pages are followed with next_cursor. with_total=true adds the number of
+    matching listings, which costs a full count, so request it on the first
+    page only; it is ignored when a cursor is given. With valuation=true each
+    listing also gets an overpriced/underpriced/fair flag and estimated price
+    from the catalog valuation model.
+    """
+    with_total = with_total and cursor is None
+    filters = dict(min_price=min_price, max_price=max_price, bedrooms=bedrooms,
+                   property_type=property_type, location=location)
+    field_list = [f.strip() for f in fields.split(',') if f.strip()] if fields else None
+    if valuation:
+        try:
+            properties, next_cursor = await run_db(list_properties, limit=limit, cursor=cursor,
+                                                   sort=sort, **filters)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        await run_db(annotate_valuations, properties)
+        if field_list:
+            keep = set(field_list) | {'id', 'valuation', 'estimated_price'}
+            properties = [{k: v for k, v in p.items() if k in keep} for p in properties]
+        response = {"success": True, "data": properties, "next_cursor": next_cursor}
+        if with_total:
+            response["total"] = await run_db(count_properties, **filters)
+        return JSONResponse(response)
+    try:
+        body = await run_db(list_properties_json, limit=limit, cursor=cursor,
+                            fields=field_list, sort=sort, with_total=with_total, **filters)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return Response(content=body, media_type="application/json")
+
+@app.get('/api/valuations')
+async def get_valuations(flag: Optional[str] = Query(None, pattern='^(overpriced|underpriced|fair)$'),
+                         locality: Optional[str] = None):
+    """Valuation of the whole catalog plus fitted price per sqft by locality"""
+    valuations = await run_db(value_catalog)
+    if flag:
+        valuations = [v for v in valuations if v['valuation'] == flag]
+    if locality:
+        valuations = [v for v in valuations if v['locality'] == locality.strip().lower()]
+    model = await run_db(get_valuation_model)
     return JSONResponse({
         "success": True,
-        "data": properties,
-        "total": len(properties)
+        "data": valuations,
+        "localities": model.locality_summary(),
+        "total": len(valuations)
+    })
+
+@app.post('/api/valuations')
+async def create_valuations(request: Request):
+    """Value a batch of properties (a JSON list, or {"properties": [...]}) against the catalog"""
+    try:
+        data = await request.json()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid JSON")
+    properties = data.get('properties') if isinstance(data, dict) else data
+    if not isinstance(properties, list) or not all(isinstance(p, dict) for p in properties):
+        raise HTTPException(status_code=400, detail="Expected a list of property objects")
+    try:
+        valuations = await run_db(value_properties, properties)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return JSONResponse({"success": True, "data": valuations, "total": len(valuations)})
+
+@app.post('/api/properties/import')
+async def import_properties_api(file: UploadFile = File(...), format: Optional[str] = None):
+    """Bulk upsert properties from an uploaded CSV or JSONL feed"""
+    fmt = format or detect_format(file.filename)
+    stream = io.TextIOWrapper(file.file, encoding='utf-8-sig', newline='')
+    try:
+        report = await run_db(import_stream, stream, fmt)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    finally:
+        stream.detach()
+    if report['inserted'] or report['updated']:
+        change_feed.notify()
+    return JSONResponse({"success": report['failed'] == 0, "data": report})
+
+@app.get('/api/properties/export')
+async def export_properties_api(format: str = Query('jsonl', pattern='^(csv|jsonl)$')):
+    """Stream the whole catalog as CSV or JSONL"""
+    media_type = 'text/csv' if format == 'csv' else 'application/x-ndjson'
+    return StreamingResponse(export_properties(format), media_type=media_type, headers={
+        "Content-Disposition": f"attachment; filename=properties.{format}"
     })
 
 @app.get('/api/properties/{property_id}')
 async def get_property(property_id: int):
     """Get specific property by ID"""
-    property_data = get_property_by_id(property_id)
-    if not property_data:
+    body = await run_db(get_property_json, property_id)
+    if not body:
         raise HTTPException(status_code=404, detail="Property not found")
-    return JSONResponse({"success": True, "data": property_data})
+    return Response(content=body, media_type="application/json")
 
 @app.get('/api/properties/search/{query}')
-async def search_properties_api(query: str):
-    """Search properties"""
-    properties = search_properties(query)
-    return JSONResponse({
-        "success": True,
-        "data": properties,
-        "query": query,
-        "total": len(properties)
-    })
+async def search_properties_api(query: str, limit: int = Query(50, ge=1, le=200)):
+    """Full-text search properties, ranked by relevance with highlighted snippets"""
+    body = await run_db(search_properties_json, query, limit)
+    return Response(content=body, media_type="application/json")
 
 @app.post('/api/properties')
 async def create_property(request: Request):
     """Create new property"""
     try:
         data = await request.json()
-        success = add_property(data)
-        if success:
-            # Broadcast update to all connected clients
-            await manager.broadcast(json.dumps({
-                "type": "property_added",
-                "message": f"New property '{data['name']}' has been added"
-            }))
-            return JSONResponse({"success": True, "message": "Property added successfully"})
+        property_id = await run_db(add_property, data)
+        if property_id:
+            # Clients are notified, and enrichment jobs queued, by the change feed
+            change_feed.notify()
+            return JSONResponse({"success": True, "message": "Property added successfully", "id": property_id})
         else:
             raise HTTPException(status_code=400, detail="Failed to add property")
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
+@app.get('/api/properties/{property_id}/landmarks')
+async def get_property_landmarks_api(
+    property_id: int,
+    k: int = Query(5, ge=1, le=50),
+    radius_km: float = Query(5.0, gt=0, le=50),
+    category: Optional[str] = None,
+):
+    """Nearest landmarks to a property within a radius, optionally of one category"""
+    property_data = await run_db(get_property_by_id, property_id)
+    if not property_data:
+        raise HTTPException(status_code=404, detail="Property not found")
+    coords = landmark_store.geocode(property_data['location'])
+    landmarks = landmark_store.nearest(coords[0], coords[1], k, radius_km, category) if coords else []
+    return JSONResponse({
+        "success": True,
+        "data": landmarks,
+        "categories": landmark_store.categories,
+        "location": property_data['location']
+    })
+
+@app.get('/images/{property_id}/{size}')
+async def property_image(request: Request, property_id: int, size: str, v: Optional[str] = None):
+    """Listing image resized to thumb, card or full, served from the local image cache.
+
+    Links carry ?v=<hash of image_url> (see web.images.thumbnail_url), so a
+    response for the current version can be cached forever; if the origin is
+    unavailable the client is redirected to it.
+    """
+    if size not in IMAGE_SIZES:
+        raise HTTPException(status_code=404, detail="Unknown image size")
+    property_data = await run_db(get_property_by_id, property_id)
+    if not property_data or not property_data.get('image_url'):
+        raise HTTPException(status_code=404, detail="Property image not found")
+    image_url = property_data['image_url']
+    try:
+        image = await image_cache.variant(image_url, size, preferred_format(request.headers.get('accept', '')))
+    except ImageUnavailable:
+        return RedirectResponse(image_url, status_code=302)
+    current = v == image_version(image_url)
+    headers = {
+        "Cache-Control": "public, max-age=31536000, immutable" if current else "public, max-age=300",
+        "Vary": "Accept",
+        "ETag": image.etag,
+    }
+    if request.headers.get('if-none-match') == image.etag:
+        return Response(status_code=304, headers=headers)
+    return FileResponse(image.path, media_type=image.media_type, headers=headers)
+
 @app.put('/api/properties/{property_id}')
 async def update_property_api(property_id: int, request: Request):
     """Update existing property"""
     try:
         data = await request.json()
-        success = update_property(property_id, data)
+        success = await run_db(update_property, property_id, data)
         if success:
-            # Broadcast update to all connected clients
-            await manager.broadcast(json.dumps({
-                "type": "property_updated",
-                "message": f"Property '{data['name']}' has been updated"
-            }))
+            # Clients are notified, and enrichment jobs queued, by the change feed
+            change_feed.notify()
             return JSONResponse({"success": True, "message": "Property updated successfully"})
         else:
             raise HTTPException(status_code=400, detail="Failed to update property")
@@ -159,35 +458,107 @@ async def update_property_api(property_id: int, request: Request):
 @app.delete('/api/properties/{property_id}')
 async def delete_property_api(property_id: int):
     """Delete property"""
-    success = delete_property(property_id)
+    success = await run_db(delete_property, property_id)
     if success:
-        # Broadcast update to all connected clients
-        await manager.broadcast(json.dumps({
-            "type": "property_deleted",
-            "message": f"Property has been deleted"
-        }))
+        # Clients are notified by the change feed
+        change_feed.notify()
         return JSONResponse({"success": True, "message": "Property deleted successfully"})
     else:
         raise HTTPException(status_code=400, detail="Failed to delete property")
 
+def parse_property_id(value) -> Optional[int]:
+    # Only convert to int if property_id is a string of digits
+    if isinstance(value, str) and value.isdigit():
+        return int(value)
+    return None
+
+async def resolve_chat_property(message: str, property_id: Optional[int]) -> Optional[int]:
+    """Property a chat message is about: the given one, else the first one it mentions by name"""
+    # Resolve context from the retrieval index instead of scanning the table
+    if property_id is None:
+        mentioned = await run_db(property_index.mentions, message)
+        if mentioned:
+            property_id = mentioned[0]['id']
+    return property_id
+
 @app.post('/api/chat')
 async def chat_endpoint(request: Request):
     form = await request.form()
-    message = form.get('message')
-    property_id = form.get('property_id')
-    # Only convert to int if property_id is a string of digits
-    if isinstance(property_id, str) and property_id.isdigit():
-        property_id = int(property_id)
-    else:
-        property_id = None
-    response = get_chatbot_response(str(message), property_id=property_id)
-    return JSONResponse({'success': True, 'response': response, 'user_message': message})
+    message = str(form.get('message'))
+    property_id = await resolve_chat_property(message, parse_property_id(form.get('property_id')))
+    version = await run_db(get_property_version, property_id)
+    response = await run_db(chat_cache.get, message, property_id, version)
+    cached = response is not None
+    if not cached:
+        # The agent blocks on the LLM; keep it off the event loop
+        response = await asyncio.to_thread(get_chatbot_response, message, property_id=property_id)
+        await run_db(chat_cache.set, message, property_id, version, response)
+    return JSONResponse({
+        'success': True,
+        'response': response,
+        'cached': cached,
+        'user_message': message,
+        'property_id': property_id
+    })
+
+async def chat_events(message: str, property_id: Optional[int]):
+    """Reply events for a chat message, replayed from the response cache when possible"""
+    version = await run_db(get_property_version, property_id)
+    cached = await run_db(chat_cache.get, message, property_id, version)
+    if cached is not None:
+        yield {"type": "start", "property_id": property_id, "cached": True}
+        yield {"type": "token", "text": cached}
+        yield {"type": "done", "tokens": 1, "ttft_ms": 0.0, "total_ms": 0.0, "cached": True}
+        return
+    text = []
+    stream = chat_streamer.stream(message, property_id)
+    try:
+        async for event in stream:
+            if event['type'] == 'token':
+                text.append(event['text'])
+            elif event['type'] == 'done':
+                # Only complete replies are cached
+                await run_db(chat_cache.set, message, property_id, version, ''.join(text))
+            yield event
+    finally:
+        await stream.aclose()
+
+async def chat_sse(message: str, property_id: Optional[int]):
+    async for event in chat_events(message, property_id):
+        yield sse_event(event)
+
+async def chat_stream_response(message: Optional[str], property_id: Optional[int]) -> StreamingResponse:
+    if not message or not message.strip():
+        raise HTTPException(status_code=400, detail="Message is required")
+    property_id = await resolve_chat_property(message, property_id)
+    # Starlette cancels the body iterator when the client disconnects, which
+    # closes the stream and stops the model at its next token
+    return StreamingResponse(chat_sse(message, property_id), media_type="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no"
+    })
+
+@app.get('/api/chat/stream')
+async def chat_stream_get(message: str, property_id: Optional[str] = None):
+    """Stream a chat reply as Server-Sent Events (for EventSource clients)"""
+    return await chat_stream_response(message, parse_property_id(property_id))
+
+@app.post('/api/chat/stream')
+async def chat_stream_post(request: Request):
+    """Stream a chat reply as Server-Sent Events: start, token..., then done (with ttft_ms) or error"""
+    form = await request.form()
+    return await chat_stream_response(form.get('message'), parse_property_id(form.get('property_id')))
+
+@app.get('/api/chat/stats')
+async def chat_stats():
+    """Streaming chat counters, time-to-first-token and response cache hits"""
+    return JSONResponse({"success": True, "data": dict(chat_streamer.stats(), cache=chat_cache.stats())})
 
 @app.get('/api/market-info/{location}')
 async def get_market_info(location: str):
     """Get market information for a location"""
     try:
-        market_info = web_search.search_property_market_info(location)
+        market_info = await async_web_search.search_property_market_info(location)
         return JSONResponse({
             "success": True,
             "data": market_info
@@ -202,7 +573,7 @@ async def get_market_info(location: str):
 async def get_amenities(location: str):
     """Get nearby amenities for a location"""
     try:
-        amenities_info = web_search.search_nearby_amenities(location)
+        amenities_info = await async_web_search.search_nearby_amenities(location)
         return JSONResponse({
             "success": True,
             "data": amenities_info
@@ -217,7 +588,7 @@ async def get_amenities(location: str):
 async def get_news():
     """Get latest real estate news"""
     try:
-        news_info = web_search.search_property_news()
+        news_info = await async_web_search.search_property_news()
         return JSONResponse({
             "success": True,
             "data": news_info
@@ -229,16 +600,116 @@ async def get_news():
         })
 
 # WebSocket endpoint for real-time updates
+async def replay_changes(subscriber, since: int):
+    """Send a reconnecting client the changes it missed after `since`, or ask it to reload"""
+    bounds = await run_db(get_change_bounds)
+    changes = await run_db(get_changes_since, since, MAX_REPLAY + 1)
+    if (since < bounds['oldest'] - 1) or len(changes) > MAX_REPLAY:
+        hub.send(subscriber, {
+            "type": "resync",
+            "seq": bounds['latest'],
+            "message": "Listings changed while you were away"
+        })
+        return
+    for change in changes:
+        topics = {DEFAULT_TOPIC, property_topic(change['property_id'])}
+        if not subscriber.topics.isdisjoint(topics):
+            hub.send(subscriber, change_event(change))
+
 @app.websocket("/ws")
-async def websocket_endpoint(websocket: WebSocket):
-    await manager.connect(websocket)
+async def websocket_endpoint(websocket: WebSocket, topics: Optional[str] = None, since: Optional[int] = None):
+    topic_list = [t.strip() for t in topics.split(',') if t.strip()] if topics else None
+    subscriber = await hub.connect(websocket, topic_list)
+    if since is not None:
+        await replay_changes(subscriber, since)
+    else:
+        hub.send(subscriber, {"type": "hello", "seq": change_feed.last_seq})
     try:
         while True:
             data = await websocket.receive_text()
-            # Handle incoming messages if needed
-            await websocket.send_text(f"Message received: {data}")
+            # Subscribe/unsubscribe/ping control messages
+            hub.handle_message(subscriber, data)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        hub.disconnect(subscriber)
+
+@app.get('/api/jobs')
+async def list_jobs_api(status: Optional[str] = Query(None, pattern=f"^({'|'.join(JOB_STATUSES)})$"),
+                        kind: Optional[str] = None, limit: int = Query(50, ge=1, le=500)):
+    """Recent background jobs with per-status totals"""
+    return JSONResponse({
+        "success": True,
+        "data": await run_db(list_jobs, status=status, kind=kind, limit=limit),
+        "counts": await run_db(count_jobs),
+        "worker": job_queue.stats()
+    })
+
+@app.get('/api/jobs/{job_id}')
+async def get_job_api(job_id: int):
+    """Status, attempts and last error of one background job"""
+    job_data = await run_db(get_job, job_id)
+    if not job_data:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return JSONResponse({"success": True, "data": job_data})
+
+@app.get('/metrics')
+async def metrics_endpoint():
+    """Prometheus scrape endpoint"""
+    # Collectors such as background_jobs query SQLite, so render off the event loop
+    return Response(content=await run_db(registry.render), media_type=METRICS_CONTENT_TYPE)
+
+@app.websocket("/ws/chat")
+async def chat_websocket(websocket: WebSocket):
+    """Chat over a WebSocket: send {"message": ..., "property_id": ...} and receive
+    start/token/done events; {"action": "cancel"} or a new message stops the current reply"""
+    await websocket.accept()
+    current: Optional[asyncio.Task] = None
+
+    async def reply(message: str, property_id: Optional[int]):
+        # Each message is admitted like a POST /api/chat
+        try:
+            async with admission.admit('chat', client_key(websocket.scope)):
+                property_id = await resolve_chat_property(message, property_id)
+                stream = chat_events(message, property_id)
+                try:
+                    async for event in stream:
+                        await websocket.send_json(event)
+                finally:
+                    await stream.aclose()
+        except Rejected as e:
+            await websocket.send_json({"type": "error", "message": e.message, "retry_after": e.retry_after})
+
+    async def cancel_current():
+        if current is not None and not current.done():
+            current.cancel()
+            try:
+                await current
+            except (asyncio.CancelledError, Exception):
+                pass
+
+    try:
+        while True:
+            data = await websocket.receive_text()
+            try:
+                request = json.loads(data)
+            except ValueError:
+                request = {"message": data}
+            if not isinstance(request, dict):
+                request = {"message": data}
+            await cancel_current()
+            if request.get('action') == 'cancel':
+                await websocket.send_json({"type": "cancelled"})
+                continue
+            message = str(request.get('message') or '').strip()
+            if not message:
+                await websocket.send_json({"type": "error", "message": "Message is required"})
+                continue
+            current = asyncio.create_task(reply(message, parse_property_id(str(request.get('property_id') or ''))))
     except WebSocketDisconnect:
-        manager.disconnect(websocket)
+        pass
+    finally:
+        await cancel_current()
 
 if __name__ == "__main__":
     import uvicorn
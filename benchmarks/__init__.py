@@ -0,0 +1,25 @@
+"""Benchmark suite for the DB layer and the API.
+
+Each run works on a private copy of a seeded synthetic catalog, with the LLM
+and web search replaced by local stubs, and reports p50/p95/p99 latency and
+throughput per operation. Load suites run --repeat times (default 3) and
+report the median of each figure. Results can be saved as a baseline and
+later runs compared against it; a regression makes the run exit non-zero.
+The baseline records the machine it was measured on (CPU, core count,
+Python, SQLite) and is only meaningful on the same kind of machine;
+regenerate it with the default seed when moving the gate elsewhere.
+Load latencies include queueing behind the other --concurrency requests on
+the one event loop, so on a small machine chat takes several times the
+stub model's ~25 ms.
+
+Usage:
+    python -m benchmarks --rows 1k --suite micro,asgi
+    python -m benchmarks --rows 100k --suite micro,asgi,uvicorn --requests 5000 --concurrency 32
+    python -m benchmarks --rows 1k --save-baseline            # write benchmarks/baseline.json
+    python -m benchmarks --rows 1k --tolerance 0.3            # compare against it
+
+Seeded catalogs are cached under benchmarks/.data (1M rows takes a few
+minutes to generate the first time). The load suites need httpx; the
+uvicorn suite also needs uvicorn. Admission control is off unless
+ADMISSION_ENABLED=1 is set, since all the load comes from one client.
+"""
@@ -0,0 +1,145 @@
+"""Command line entry point; see the benchmarks package docstring for usage."""
+import argparse
+import json
+import os
+import platform
+import shutil
+import sqlite3
+import sys
+import tempfile
+from typing import Dict, List
+
+from benchmarks.seed import parse_size, ensure_catalog, copy_catalog, DEFAULT_SEED
+from benchmarks.stats import format_table
+
+SUITES = ('micro', 'asgi', 'uvicorn')
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), 'baseline.json')
+# p95 differences smaller than this are noise, not regressions. End-to-end
+# requests share the event loop, the executor and the stubbed model's timers,
+# so their p95 moves by several milliseconds between identical runs.
+MIN_REGRESSION_MS = {'db': 0.5, 'asgi': 10.0, 'uvicorn': 10.0}
+
+def machine_info() -> Dict[str, str]:
+    """What a baseline was measured on; latencies only compare on the same kind of machine"""
+    cpu = platform.processor()
+    try:
+        with open('/proc/cpuinfo') as f:
+            cpu = next((line.split(':', 1)[1].strip() for line in f if line.startswith('model name')), cpu)
+    except OSError:
+        pass
+    return {
+        'cpu': cpu or platform.machine(),
+        'cpus': str(os.cpu_count()),
+        'platform': f'{platform.system()} {platform.machine()}',
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+    }
+
+def compare(results: Dict[str, Dict], baseline: Dict[str, Dict], tolerance: float) -> List[str]:
+    """Regressions beyond the tolerance, as messages.
+
+    Every operation is checked for p95 latency and failures; throughput is
+    only checked for a load suite as a whole (``<suite>.all``), since per
+    operation it just mirrors the mix and the mean latency.
+    """
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            continue
+        floor = MIN_REGRESSION_MS.get(name.split('.')[0], max(MIN_REGRESSION_MS.values()))
+        p95_limit = max(previous['p95_ms'] * (1 + tolerance), previous['p95_ms'] + floor)
+        if current['p95_ms'] > p95_limit:
+            regressions.append(f"{name}: p95 {current['p95_ms']:.3f} ms > {previous['p95_ms']:.3f} ms baseline")
+        if name.endswith('.all') and current['ops_per_sec'] < previous['ops_per_sec'] * (1 - tolerance):
+            regressions.append(f"{name}: {current['ops_per_sec']:.1f} ops/s < "
+                               f"{previous['ops_per_sec']:.1f} ops/s baseline")
+        if current['failures'] > previous['failures']:
+            regressions.append(f"{name}: {current['failures']} failures (baseline {previous['failures']})")
+    return regressions
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog='python -m benchmarks', description='Benchmark the DB layer and the API')
+    parser.add_argument('--rows', default='1k', help='catalog size: 1k, 10k, 100k, 1m or a number')
+    parser.add_argument('--suite', default='micro,asgi', help=f"comma-separated: {', '.join(SUITES)}")
+    parser.add_argument('--requests', type=int, default=2000, help='requests per load suite')
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED)
+    parser.add_argument('--max-seconds', type=float, default=2.0, help='time budget per microbenchmark')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='runs per load suite; the median of each figure is reported')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+    parser.add_argument('--save-baseline', action='store_true', help='write the results as the new baseline')
+    parser.add_argument('--tolerance', type=float, default=0.3, help='allowed relative slowdown')
+    parser.add_argument('--json', help='also write the results to this file')
+    args = parser.parse_args(argv)
+
+    suites = [s.strip() for s in args.suite.split(',') if s.strip()]
+    unknown = set(suites) - set(SUITES)
+    if unknown:
+        parser.error(f"unknown suite: {', '.join(sorted(unknown))}")
+    rows = parse_size(args.rows)
+    catalog = ensure_catalog(rows, args.seed)
+
+    # The DB layer and caches bind their paths at import time, so everything
+    # is pointed at a scratch directory before db or app is imported
+    workdir = tempfile.mkdtemp(prefix='benchmarks-')
+    db_path = os.path.join(workdir, 'properties.db')
+    copy_catalog(catalog, db_path)
+    os.environ.update({
+        'PROPERTIES_DB_PATH': db_path,
+        'CHAT_CACHE_DB': os.path.join(workdir, 'chat_cache.db'),
+        'WEB_SEARCH_CACHE_DB': os.path.join(workdir, 'web_search.db'),
+        'CHAT_STREAM_BACKEND': 'agent',
+        'SLOW_QUERY_MS': os.environ.get('SLOW_QUERY_MS', '1000000'),
+        # One client drives all the load, so per-client rate limits would reject most of it
+        'ADMISSION_ENABLED': os.environ.get('ADMISSION_ENABLED', '0'),
+    })
+    profile = f'{rows}'
+    results: Dict[str, Dict] = {}
+    try:
+        if 'micro' in suites:
+            from benchmarks import micro
+            results.update(micro.run(rows, args.seed, args.max_seconds))
+        # Suites share the working copy; the micro suite deletes the rows it adds
+        if 'asgi' in suites:
+            from benchmarks import load
+            results.update(load.run_asgi(args.requests, args.concurrency, args.seed, args.repeat))
+        if 'uvicorn' in suites:
+            from benchmarks import load
+            results.update(load.run_uvicorn(args.requests, args.concurrency, args.seed, repeat=args.repeat))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print(format_table(f'{rows} rows', results))
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'rows': rows, 'results': results}, f, indent=2)
+
+    baselines = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baselines = json.load(f)
+    if args.save_baseline:
+        baselines[profile] = dict(baselines.get(profile, {}), **results, machine=machine_info())
+        with open(args.baseline, 'w') as f:
+            json.dump(baselines, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print(f'Saved baseline for {rows} rows to {args.baseline}')
+        return 0
+    if profile not in baselines:
+        print(f'No baseline for {rows} rows in {args.baseline}; not comparing')
+        return 0
+    recorded_on = baselines[profile].get('machine')
+    if recorded_on != machine_info():
+        print(f'Note: the baseline was recorded on a different machine ({recorded_on}); '
+              f'expect differences that are not regressions')
+    regressions = compare(results, baselines[profile], args.tolerance)
+    for message in regressions:
+        print(f'REGRESSION {message}', file=sys.stderr)
+    if not regressions:
+        print(f'No regressions against the baseline (tolerance {args.tolerance:.0%})')
+    return 1 if regressions else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,206 @@
+"""Mixed-workload load generator for the HTTP API.
+
+A fixed number of requests is spread over ``concurrency`` workers; each
+request is drawn from WORKLOAD by weight with a seeded RNG, so two runs with
+the same arguments send the same requests. The app is driven either
+in-process through httpx's ASGI transport (no sockets, measures the app and
+DB layer) or over HTTP against a real uvicorn server started from
+benchmarks.serve.
+"""
+import asyncio
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+import httpx
+
+from benchmarks.stats import summarize, median_results
+
+# Operation -> relative weight in the mix
+WORKLOAD = {
+    'list': 25,
+    'detail': 20,
+    'detail_page': 10,
+    'home_page': 10,
+    'search': 15,
+    'write': 10,
+    'chat': 5,
+    'chat_stream': 5,
+}
+
+SORTS = ('newest', 'price_asc', 'price_desc')
+SEARCHES = ('villa kokapet', 'lake view', 'gated community', '3 bhk', 'swimming pool gachibowli', 'near metro')
+CHAT_MESSAGES = (
+    'Show me 3 bhk apartments under 80 lakhs in Kondapur',
+    'Which villas have a swimming pool?',
+    'Is this property a good deal?',
+    'What is near this property?',
+    'Compare prices in Gachibowli and Madhapur',
+)
+
+class Workload:
+    """Builds the requests for each operation from a seeded RNG"""
+
+    def __init__(self, property_ids: List[int], seed: int = 0):
+        self.property_ids = property_ids
+        self.rng = random.Random(seed)
+        operations, weights = zip(*WORKLOAD.items())
+        self._operations = operations
+        self._weights = weights
+
+    def next_operation(self) -> str:
+        return self.rng.choices(self._operations, self._weights)[0]
+
+    def request(self, operation: str) -> Tuple[str, str, Dict]:
+        """(method, url, httpx keyword arguments) for one operation"""
+        rng = self.rng
+        property_id = rng.choice(self.property_ids)
+        if operation == 'list':
+            params = {'limit': 20, 'sort': rng.choice(SORTS)}
+            if rng.random() < 0.3:
+                params['bedrooms'] = rng.randint(1, 4)
+            return 'GET', '/api/properties', {'params': params}
+        if operation == 'detail':
+            return 'GET', f'/api/properties/{property_id}', {}
+        if operation == 'detail_page':
+            return 'GET', f'/property/{property_id}', {}
+        if operation == 'home_page':
+            return 'GET', '/', {}
+        if operation == 'search':
+            return 'GET', f'/api/properties/search/{rng.choice(SEARCHES)}', {'params': {'limit': 20}}
+        if operation == 'write':
+            return 'PUT', f'/api/properties/{property_id}', {'json': {
+                'name': f'Load Test Residency {property_id}',
+                'price': f'₹{rng.randint(40, 250)} Lakhs',
+                'location': 'Gachibowli, Hyderabad',
+                'description': '3 BHK apartment with clubhouse and park view.',
+                'bedrooms': 3,
+                'bathrooms': 2,
+                'area_sqft': 1500,
+                'property_type': 'Apartment',
+                'image_url': f'https://example.com/images/{property_id}.jpg',
+                'contact_info': '+91 9000000000',
+            }}
+        if operation in ('chat', 'chat_stream'):
+            data = {'message': rng.choice(CHAT_MESSAGES)}
+            if rng.random() < 0.5:
+                data['property_id'] = str(property_id)
+            return 'POST', '/api/chat' if operation == 'chat' else '/api/chat/stream', {'data': data}
+        raise ValueError(f'Unknown operation: {operation}')
+
+async def drive(client: httpx.AsyncClient, workload: Workload, requests: int, concurrency: int) -> Dict[str, Dict]:
+    """Send the mixed workload and summarize latency per operation and overall (``all``)"""
+    latencies: Dict[str, List[float]] = defaultdict(list)
+    failures: Dict[str, int] = defaultdict(int)
+    plan = [(op,) + workload.request(op) for op in (workload.next_operation() for _ in range(requests))]
+    queue: asyncio.Queue = asyncio.Queue()
+    for item in plan:
+        queue.put_nowait(item)
+
+    async def worker():
+        while True:
+            try:
+                operation, method, url, kwargs = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            started = time.perf_counter()
+            try:
+                response = await client.request(method, url, **kwargs)
+                failed = response.status_code >= 400
+            except httpx.HTTPError:
+                failed = True
+            elapsed = time.perf_counter() - started
+            latencies[operation].append(elapsed)
+            latencies['all'].append(elapsed)
+            if failed:
+                failures[operation] += 1
+                failures['all'] += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    return {op: summarize(values, elapsed, failures[op]) for op, values in sorted(latencies.items())}
+
+async def _repeat(client: httpx.AsyncClient, property_ids: List[int], seed: int, requests: int,
+                  concurrency: int, repeat: int) -> Dict[str, Dict]:
+    # The same request mix each time; the median of the runs smooths out scheduling noise
+    runs = [await drive(client, Workload(property_ids, seed), requests, concurrency)
+            for _ in range(max(1, repeat))]
+    return median_results(runs)
+
+def _property_ids(sample: int, seed: int) -> List[int]:
+    from db.query import pool
+    with pool.reader() as conn:
+        low, high = conn.execute('SELECT MIN(id), MAX(id) FROM properties').fetchone()
+    rng = random.Random(seed)
+    return [rng.randint(low, high) for _ in range(sample)]
+
+async def _run_asgi(requests: int, concurrency: int, seed: int, repeat: int) -> Dict[str, Dict]:
+    from benchmarks.stubs import install_stubs, install_app_stubs
+    install_stubs()
+    import app as app_module
+    install_app_stubs()
+
+    workload = Workload(_property_ids(1024, seed), seed)
+    # httpx's ASGI transport does not send lifespan events; start the change feed by hand
+    await app_module.app.router.startup()
+    try:
+        transport = httpx.ASGITransport(app=app_module.app)
+        async with httpx.AsyncClient(transport=transport, base_url='http://bench') as client:
+            await drive(client, Workload(workload.property_ids, seed + 1), min(requests, 50), concurrency)
+            return await _repeat(client, workload.property_ids, seed, requests, concurrency, repeat)
+    finally:
+        await app_module.app.router.shutdown()
+
+def run_asgi(requests: int = 2000, concurrency: int = 16, seed: int = 0, repeat: int = 1) -> Dict[str, Dict]:
+    """Drive the app in-process; results are keyed by ``asgi.<operation>``"""
+    results = asyncio.run(_run_asgi(requests, concurrency, seed, repeat))
+    return {f'asgi.{op}': summary for op, summary in results.items()}
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+async def _wait_until_ready(base_url: str, server: subprocess.Popen, timeout: float = 60.0):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient(base_url=base_url) as client:
+        while time.monotonic() < deadline:
+            if server.poll() is not None:
+                raise RuntimeError(f'uvicorn exited with status {server.returncode}')
+            try:
+                if (await client.get('/api/chat/stats')).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError('uvicorn did not become ready in time')
+
+async def _run_uvicorn(requests: int, concurrency: int, seed: int, repeat: int) -> Dict[str, Dict]:
+    port = _free_port()
+    base_url = f'http://127.0.0.1:{port}'
+    server = subprocess.Popen([sys.executable, '-m', 'benchmarks.serve', '--port', str(port)],
+                              cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))), env=os.environ.copy())
+    try:
+        await _wait_until_ready(base_url, server)
+        workload = Workload(_property_ids(1024, seed), seed)
+        limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+        async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60.0) as client:
+            await drive(client, Workload(workload.property_ids, seed + 1), min(requests, 50), concurrency)
+            return await _repeat(client, workload.property_ids, seed, requests, concurrency, repeat)
+    finally:
+        server.terminate()
+        try:
+            server.wait(10)
+        except subprocess.TimeoutExpired:
+            server.kill()
+
+def run_uvicorn(requests: int = 2000, concurrency: int = 16, seed: int = 0, repeat: int = 1) -> Dict[str, Dict]:
+    """Drive a real uvicorn server over HTTP; results are keyed by ``uvicorn.<operation>``"""
+    results = asyncio.run(_run_uvicorn(requests, concurrency, seed, repeat))
+    return {f'uvicorn.{op}': summary for op, summary in results.items()}
@@ -0,0 +1,126 @@
+"""Microbenchmarks for the functions in db/query.py.
+
+Each case is called repeatedly in-process (no executor, no HTTP) until it
+reaches its iteration count or the time budget. Cases named ``cold`` clear
+the query caches before every call, so they measure SQLite and row mapping;
+the others run against warm caches the way the API mostly does.
+"""
+import itertools
+import random
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from benchmarks.stats import summarize
+
+# (name, function taking the iteration number, iterations)
+Case = Tuple[str, Callable[[int], object], int]
+
+def _property_ids(sample: int, seed: int) -> List[int]:
+    from db.query import pool
+    with pool.reader() as conn:
+        low, high = conn.execute('SELECT MIN(id), MAX(id) FROM properties').fetchone()
+    rng = random.Random(seed)
+    return [rng.randint(low, high) for _ in range(sample)]
+
+def _listing(property_id: int, suffix: str) -> Dict:
+    return {
+        'name': f'Benchmark Residency {suffix}',
+        'price': '₹85 Lakhs',
+        'location': 'Gachibowli, Hyderabad',
+        'description': '3 BHK apartment with clubhouse and park view.',
+        'bedrooms': 3,
+        'bathrooms': 3,
+        'area_sqft': 1650,
+        'property_type': 'Apartment',
+        'image_url': f'https://example.com/images/{property_id}.jpg',
+        'contact_info': '+91 9000000000',
+    }
+
+def cases(rows: int, seed: int = 0) -> List[Case]:
+    import db.query as q
+
+    ids = _property_ids(1024, seed)
+    pick = lambda i: ids[i % len(ids)]
+    # Bigger catalogs make the whole-table reads slow; keep their runs short
+    full_scan_iterations = max(3, min(50, 200_000 // max(rows, 1)))
+    first_page, cursor = q.list_properties(limit=q.DEFAULT_PAGE_SIZE)
+    geo_landmarks = [{'name': 'Benchmark Park', 'category': 'park', 'distance_km': 1.2}]
+    added: List[int] = []
+    serial = itertools.count()
+
+    def cold(fn: Callable[[int], object]) -> Callable[[int], object]:
+        def run(i):
+            q.clear_caches()
+            return fn(i)
+        return run
+
+    def add(i):
+        property_id = q.add_property(_listing(i, f'{seed}-{next(serial)}'))
+        if property_id is not None:
+            added.append(property_id)
+
+    def delete(i):
+        if added:
+            q.delete_property(added.pop())
+
+    return [
+        ('parse_price_inr', lambda i: q.parse_price_inr(('₹85 Lakhs', '₹1.2 Crores', '4500000')[i % 3]), 20000),
+        ('encode_cursor', lambda i: q.encode_cursor('2024-01-01 00:00:00', i), 20000),
+        ('decode_cursor', lambda i: q.decode_cursor(cursor), 20000) if cursor else None,
+        ('build_fts_query', lambda i: q.build_fts_query('3 bhk villa gachibowli'), 20000),
+        ('get_all_properties', lambda i: q.get_all_properties(), full_scan_iterations),
+        ('get_property_by_id', lambda i: q.get_property_by_id(pick(i)), 5000),
+        ('get_property_by_id cold', cold(lambda i: q.get_property_by_id(pick(i))), 2000),
+        ('get_property_json', lambda i: q.get_property_json(pick(i)), 5000),
+        ('get_property_json cold', cold(lambda i: q.get_property_json(pick(i))), 2000),
+        ('list_properties', lambda i: q.list_properties(), 5000),
+        ('list_properties cold', cold(lambda i: q.list_properties()), 500),
+        ('list_properties cursor cold', cold(lambda i: q.list_properties(cursor=cursor)), 500) if cursor else None,
+        ('list_properties price_asc cold', cold(lambda i: q.list_properties(sort='price_asc')), 500),
+        ('list_properties filtered cold', cold(lambda i: q.list_properties(
+            min_price=5_000_000, max_price=15_000_000, bedrooms=3, property_type='Apartment')), 500),
+        ('list_properties location cold', cold(lambda i: q.list_properties(location='Kondapur')), 200),
+        ('list_properties fields cold', cold(lambda i: q.list_properties(fields=['name', 'price'])), 500),
+        ('list_properties_json', lambda i: q.list_properties_json(), 5000),
+        ('list_properties_json cold', cold(lambda i: q.list_properties_json()), 200),
+        ('count_properties cold', cold(lambda i: q.count_properties()), 200),
+        ('count_properties filtered cold', cold(lambda i: q.count_properties(bedrooms=3)), 100),
+        ('count_properties_by_type cold', cold(lambda i: q.count_properties_by_type()), 100),
+        ('search_properties cold', cold(lambda i: q.search_properties(
+            ('villa kokapet', 'lake view', 'gated community', '3 bhk')[i % 4])), 500),
+        ('search_properties_json', lambda i: q.search_properties_json('villa kokapet'), 5000),
+        ('search_properties_json cold', cold(lambda i: q.search_properties_json('villa kokapet')), 500),
+        ('get_property_info', lambda i: q.get_property_info(f'what is the price of {first_page[0]["name"]}'),
+         2000) if first_page else None,
+        ('update_property', lambda i: q.update_property(pick(i), _listing(pick(i), f'{seed}-u{pick(i)}')), 500),
+        ('add_property', add, 500),
+        ('delete_property', delete, 500),
+        ('save_property_geo', lambda i: q.save_property_geo(
+            pick(i), 'Gachibowli, Hyderabad', 17.44, 78.35, geo_landmarks), 500),
+        ('get_property_geo', lambda i: q.get_property_geo(pick(i)), 5000),
+    ]
+
+def run(rows: int, seed: int = 0, max_seconds: float = 2.0, only: Optional[List[str]] = None) -> Dict[str, Dict]:
+    """Run every case and return summaries keyed by ``db.<case>``"""
+    results = {}
+    for case in cases(rows, seed):
+        if case is None:
+            continue
+        name, fn, iterations = case
+        if only and not any(name.startswith(prefix) for prefix in only):
+            continue
+        fn(0)  # warm up: connections, statement cache, lazy indexes
+        latencies = []
+        failures = 0
+        started = time.perf_counter()
+        for i in range(iterations):
+            call_started = time.perf_counter()
+            try:
+                fn(i)
+            except Exception:
+                failures += 1
+            latencies.append(time.perf_counter() - call_started)
+            if call_started - started > max_seconds:
+                break
+        results[f'db.{name}'] = summarize(latencies, time.perf_counter() - started, failures)
+    return results
@@ -0,0 +1,105 @@
+"""Synthetic catalogs for benchmarking.
+
+Run as a module to build a catalog file; it must be its own process because
+the DB layer binds its database path at import time:
+
+    python -m benchmarks.seed --rows 100k --output /tmp/catalog.db
+"""
+import argparse
+import os
+import random
+import shutil
+import subprocess
+import sys
+from typing import Dict, Iterator, Optional
+
+SIZES = {'1k': 1_000, '10k': 10_000, '100k': 100_000, '1m': 1_000_000}
+DATA_DIR = os.path.join(os.path.dirname(__file__), '.data')
+DEFAULT_SEED = 42
+
+LOCALITIES = ('Gachibowli', 'Kondapur', 'Madhapur', 'Hitech City', 'Banjara Hills', 'Jubilee Hills',
+              'Miyapur', 'Kukatpally', 'Manikonda', 'Nanakramguda', 'Kokapet', 'Begumpet',
+              'Secunderabad', 'Ameerpet', 'Tellapur', 'Narsingi')
+PREFIXES = ('Lotus', 'Pearl', 'Royal', 'Green', 'Sunset', 'Silver', 'Emerald', 'Skyline', 'Palm', 'Lake',
+            'Golden', 'Orchid', 'Cedar', 'Maple', 'Harmony', 'Serene')
+SUFFIXES = ('Villa', 'Heights', 'Residency', 'Gardens', 'Towers', 'Enclave', 'Apartments', 'Meadows',
+            'Homes', 'Court')
+FEATURES = ('spacious', 'modern', 'gated community', 'swimming pool', 'clubhouse', 'park view',
+            'near metro', 'power backup', 'covered parking', 'lake view', 'east facing', 'vaastu compliant',
+            'gym', 'children play area', 'close to IT corridor', 'premium fittings', 'balcony', 'security')
+TYPES = (('Apartment', 0.7), ('Villa', 0.2), ('Independent House', 0.1))
+
+def parse_size(value: str) -> int:
+    """Row count from '1k', '100k', '1m' or a plain integer"""
+    return SIZES.get(value.lower()) or int(value)
+
+def generate_rows(count: int, seed: int = DEFAULT_SEED) -> Iterator[Dict]:
+    """Deterministic synthetic listings in the bulk import format"""
+    rng = random.Random(seed)
+    types, weights = zip(*TYPES)
+    for i in range(count):
+        property_type = rng.choices(types, weights)[0]
+        bedrooms = rng.randint(1, 3) if property_type == 'Apartment' else rng.randint(3, 6)
+        area = bedrooms * rng.randint(450, 800)
+        rupees = area * rng.randint(4500, 16000) * (1.3 if property_type == 'Villa' else 1.0)
+        price = f'₹{rupees / 10_000_000:.2f} Crores' if rupees >= 10_000_000 else f'₹{rupees / 100_000:.0f} Lakhs'
+        locality = rng.choice(LOCALITIES)
+        yield {
+            'name': f'{rng.choice(PREFIXES)} {rng.choice(SUFFIXES)} {i + 1}',
+            'price': price,
+            'location': f'{locality}, Hyderabad',
+            'description': f"{bedrooms} BHK {property_type.lower()} in {locality} with "
+                           + ', '.join(rng.sample(FEATURES, 4)) + '.',
+            'bedrooms': bedrooms,
+            'bathrooms': max(1, bedrooms - rng.randint(0, 1)),
+            'area_sqft': area,
+            'property_type': property_type,
+            'image_url': f'https://example.com/images/{i + 1}.jpg',
+            'contact_info': f'+91 9{rng.randint(100000000, 999999999)}',
+        }
+
+def catalog_path(rows: int, seed: int = DEFAULT_SEED, data_dir: str = DATA_DIR) -> str:
+    return os.path.join(data_dir, f'catalog-{rows}-{seed}.db')
+
+def ensure_catalog(rows: int, seed: int = DEFAULT_SEED, data_dir: str = DATA_DIR) -> str:
+    """Path of a cached seeded catalog, building it in a subprocess if needed"""
+    path = catalog_path(rows, seed, data_dir)
+    if not os.path.exists(path):
+        os.makedirs(data_dir, exist_ok=True)
+        partial = path + '.partial'
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(partial + suffix):
+                os.remove(partial + suffix)
+        subprocess.run([sys.executable, '-m', 'benchmarks.seed', '--rows', str(rows), '--seed', str(seed),
+                        '--output', partial], check=True, cwd=os.path.dirname(os.path.dirname(__file__)))
+        os.replace(partial, path)
+    return path
+
+def copy_catalog(source: str, destination: str):
+    """Private working copy of a seeded catalog"""
+    shutil.copyfile(source, destination)
+
+def main(argv: Optional[list] = None):
+    parser = argparse.ArgumentParser(description='Build a synthetic property catalog')
+    parser.add_argument('--rows', default='1k', help='1k, 10k, 100k, 1m or a number')
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED)
+    parser.add_argument('--output', required=True)
+    args = parser.parse_args(argv)
+
+    os.environ['PROPERTIES_DB_PATH'] = args.output
+    from db.bulk import import_properties
+    from db.query import pool
+
+    rows = parse_size(args.rows)
+    report = import_properties(generate_rows(rows, args.seed), chunk_size=5000)
+    with pool.writer() as conn:
+        # The import's change log is not part of the catalog
+        conn.execute('DELETE FROM property_changes')
+    with pool.writer() as conn:
+        conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+    pool.close()
+    print(f"Seeded {report['inserted']} properties into {args.output}", file=sys.stderr)
+    return 0 if not report['failed'] else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
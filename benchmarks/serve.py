@@ -0,0 +1,24 @@
+"""uvicorn server for the uvicorn load suite: the app with the LLM and web search stubbed.
+
+The database and cache paths come from the environment set by the runner.
+"""
+import argparse
+
+import uvicorn
+
+from benchmarks.stubs import install_stubs, install_app_stubs
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Serve the app with stubbed upstreams for benchmarking')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    args = parser.parse_args(argv)
+
+    install_stubs()
+    import app as app_module
+    # One process: worker processes would import the app themselves and miss the stubs
+    install_app_stubs()
+    uvicorn.run(app_module.app, host=args.host, port=args.port, log_level='warning', access_log=False)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,39 @@
+import math
+import statistics
+from typing import Dict, List
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(fraction * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+def summarize(latencies: List[float], elapsed: float, failures: int = 0) -> Dict[str, float]:
+    """Latency percentiles in milliseconds plus throughput for one operation"""
+    values = sorted(latencies)
+    return {
+        'count': len(values),
+        'failures': failures,
+        'p50_ms': round(percentile(values, 0.50) * 1000, 3),
+        'p95_ms': round(percentile(values, 0.95) * 1000, 3),
+        'p99_ms': round(percentile(values, 0.99) * 1000, 3),
+        'mean_ms': round(sum(values) / len(values) * 1000, 3) if values else 0.0,
+        'ops_per_sec': round(len(values) / elapsed, 1) if elapsed > 0 else 0.0,
+    }
+
+def median_results(runs: List[Dict[str, Dict[str, float]]]) -> Dict[str, Dict[str, float]]:
+    """Combine repeated runs of a suite: the median of every figure, per operation"""
+    combined = {}
+    for name in runs[0]:
+        summaries = [run[name] for run in runs if name in run]
+        combined[name] = {key: type(summaries[0][key])(statistics.median(s[key] for s in summaries))
+                          for key in summaries[0]}
+    return combined
+
+def format_table(title: str, results: Dict[str, Dict[str, float]]) -> str:
+    lines = [title, f"{'operation':<34}{'count':>8}{'fail':>6}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'ops/s':>11}"]
+    for name, r in results.items():
+        lines.append(f"{name:<34}{r['count']:>8}{r['failures']:>6}{r['p50_ms']:>10.3f}{r['p95_ms']:>10.3f}"
+                     f"{r['p99_ms']:>10.3f}{r['ops_per_sec']:>11.1f}")
+    return '\n'.join(lines)
@@ -0,0 +1,38 @@
+"""Local stand-ins for the LLM and web search so benchmarks measure this service only"""
+import sys
+import time
+import types
+from typing import Iterator, List, Optional
+
+# Simulated model latency: time to first token and time per token
+LLM_FIRST_TOKEN_DELAY = 0.005
+LLM_TOKEN_DELAY = 0.0005
+LLM_TOKENS = 40
+
+def stream_chatbot_response(message: str, property_id: Optional[int] = None) -> Iterator[str]:
+    time.sleep(LLM_FIRST_TOKEN_DELAY)
+    for i in range(LLM_TOKENS):
+        if i:
+            time.sleep(LLM_TOKEN_DELAY)
+        yield f'word{i} '
+
+def get_chatbot_response(message: str, property_id: Optional[int] = None) -> str:
+    return ''.join(stream_chatbot_response(message, property_id=property_id))
+
+def search_backend(query: str, num_results: int) -> List[str]:
+    return [f'https://example.com/search/{i}' for i in range(num_results)]
+
+def install_stubs():
+    """Replace chat.agent with the fake model; call before importing app"""
+    agent = types.ModuleType('chat.agent')
+    agent.get_chatbot_response = get_chatbot_response
+    agent.stream_chatbot_response = stream_chatbot_response
+    package = sys.modules.get('chat') or types.ModuleType('chat')
+    package.agent = agent
+    sys.modules['chat'] = package
+    sys.modules['chat.agent'] = agent
+
+def install_app_stubs():
+    """Point the imported app's web search at the fake backend"""
+    from web.web_search import web_search
+    web_search.search_backend = search_backend
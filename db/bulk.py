@@ -0,0 +1,205 @@
+"""Bulk import/export of properties.
+
+Feeds are streamed in chunks; each chunk is upserted (keyed on the UNIQUE
+name column) with a single executemany inside one transaction.
+
+Usage:
+    python -m db.bulk import listings.csv [--format csv|jsonl] [--chunk-size 1000]
+    python -m db.bulk export [--format csv|jsonl] [--output listings.jsonl]
+"""
+import argparse
+import csv
+import io
+import json
+import math
+import sys
+from itertools import islice
+from typing import Dict, IO, Iterable, Iterator, List, Optional
+
+from db.query import pool, parse_price_inr, clear_caches, PROPERTY_FIELDS
+from db.records import row_mapper, encode_lines
+
+IMPORT_COLUMNS = ('name', 'price', 'location', 'description', 'bedrooms', 'bathrooms',
+                  'area_sqft', 'property_type', 'image_url', 'contact_info')
+INTEGER_COLUMNS = ('bedrooms', 'bathrooms', 'area_sqft')
+SCALAR_TYPES = (str, int, float, type(None))
+# SQLite INTEGER is a signed 64-bit value; larger Python ints cannot be bound
+SQLITE_INT_MIN, SQLITE_INT_MAX = -2 ** 63, 2 ** 63 - 1
+DEFAULT_CHUNK_SIZE = 1000
+MAX_REPORTED_ERRORS = 1000
+
+# Columns missing from a feed row leave an existing listing's value alone;
+# new listings get '' for missing text so templates can treat them as strings.
+_UPSERT_SQL = f'''INSERT INTO properties ({', '.join(IMPORT_COLUMNS)}, price_inr)
+                  VALUES ({', '.join(f':{col}' if col in INTEGER_COLUMNS + ('name',) else f"COALESCE(:{col}, '')"
+                                     for col in IMPORT_COLUMNS)}, :price_inr)
+                  ON CONFLICT(name) DO UPDATE SET
+                  {', '.join(f'{col}=COALESCE(:{col}, {col})' for col in IMPORT_COLUMNS if col != 'name')},
+                  price_inr=COALESCE(:price_inr, price_inr), updated_at=CURRENT_TIMESTAMP'''
+
+def iter_csv(stream: IO[str]) -> Iterator[Dict]:
+    """Yield one dict per CSV data row, using the header row as keys"""
+    yield from csv.DictReader(stream)
+
+def iter_jsonl(stream: IO[str]) -> Iterator[Dict]:
+    """Yield one dict per non-blank JSON line; malformed lines yield an error marker"""
+    for line in stream:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except json.JSONDecodeError as e:
+            yield {'__error__': f'Invalid JSON: {e}'}
+
+def detect_format(filename: Optional[str]) -> str:
+    """Guess the feed format from a file name, defaulting to jsonl"""
+    if filename and filename.lower().endswith('.csv'):
+        return 'csv'
+    return 'jsonl'
+
+def _prepare_row(raw: Dict) -> Dict:
+    """Validate one feed record and return the upsert parameters; raises ValueError"""
+    if not isinstance(raw, dict):
+        raise ValueError('Row is not an object')
+    if '__error__' in raw:
+        raise ValueError(raw['__error__'])
+    for col in IMPORT_COLUMNS:
+        # SQLite can only bind scalars; anything else would fail the whole chunk
+        value = raw.get(col)
+        if not isinstance(value, SCALAR_TYPES):
+            raise ValueError(f'Invalid {col}: expected a string or number, got {type(value).__name__}')
+        if isinstance(value, int) and not SQLITE_INT_MIN <= value <= SQLITE_INT_MAX \
+                or isinstance(value, float) and not math.isfinite(value):
+            raise ValueError(f'Invalid {col}: {value!r} is out of range')
+    name = str(raw.get('name') or '').strip()
+    if not name:
+        raise ValueError('Missing name')
+    values = {}
+    for col in IMPORT_COLUMNS:
+        value = raw.get(col)
+        if isinstance(value, str):
+            value = value.strip()
+        if col == 'name':
+            value = name
+        elif col in INTEGER_COLUMNS:
+            if value in (None, ''):
+                value = None
+            else:
+                try:
+                    value = int(float(value))
+                except (TypeError, ValueError, OverflowError):
+                    raise ValueError(f'Invalid {col}: {value!r}')
+                if not SQLITE_INT_MIN <= value <= SQLITE_INT_MAX:
+                    raise ValueError(f'Invalid {col}: {raw[col]!r} is out of range')
+        elif value == '':
+            value = None
+        values[col] = value
+    values['price_inr'] = parse_price_inr(values['price'])
+    return values
+
+def import_properties(rows: Iterable[Dict], chunk_size: int = DEFAULT_CHUNK_SIZE) -> Dict:
+    """Upsert properties from an iterable of dicts in batched transactions.
+
+    Returns counts of processed, inserted, updated and failed rows plus the
+    first MAX_REPORTED_ERRORS per-row errors (row numbers are 1-based).
+    """
+    report = {'processed': 0, 'inserted': 0, 'updated': 0, 'failed': 0, 'errors': []}
+    iterator = iter(rows)
+    row_number = 0
+    while True:
+        chunk = list(islice(iterator, chunk_size))
+        if not chunk:
+            break
+        params = {}
+        for raw in chunk:
+            row_number += 1
+            try:
+                prepared = _prepare_row(raw)
+            except ValueError as e:
+                report['failed'] += 1
+                if len(report['errors']) < MAX_REPORTED_ERRORS:
+                    report['errors'].append({'row': row_number, 'error': str(e)})
+                continue
+            # Later duplicates of a name within a chunk win, as they would row by row
+            params[prepared['name']] = prepared
+        report['processed'] += len(chunk)
+        if not params:
+            continue
+        names = list(params)
+        with pool.writer() as conn:
+            existing = set()
+            for start in range(0, len(names), 500):
+                batch = names[start:start + 500]
+                existing.update(name for (name,) in conn.execute(
+                    f"SELECT name FROM properties WHERE name IN ({', '.join('?' for _ in batch)})", batch))
+            conn.executemany(_UPSERT_SQL, params.values())
+        report['updated'] += len(existing)
+        report['inserted'] += len(params) - len(existing)
+        clear_caches()
+    return report
+
+def import_stream(stream: IO[str], fmt: str = 'jsonl', chunk_size: int = DEFAULT_CHUNK_SIZE) -> Dict:
+    """Import a text stream in the given format ('csv' or 'jsonl')"""
+    if fmt not in ('csv', 'jsonl'):
+        raise ValueError(f'Unsupported format: {fmt}')
+    rows = iter_csv(stream) if fmt == 'csv' else iter_jsonl(stream)
+    return import_properties(rows, chunk_size=chunk_size)
+
+def export_properties(fmt: str = 'jsonl', chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[str]:
+    """Yield the whole catalog as CSV or JSONL text, reading chunk_size rows at a time"""
+    if fmt not in ('csv', 'jsonl'):
+        raise ValueError(f'Unsupported format: {fmt}')
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if fmt == 'csv':
+        writer.writerow(PROPERTY_FIELDS)
+        yield buffer.getvalue()
+    record = row_mapper(PROPERTY_FIELDS)
+    last_id = 0
+    while True:
+        with pool.reader() as conn:
+            rows = conn.execute(f'''SELECT {', '.join(PROPERTY_FIELDS)} FROM properties
+                                    WHERE id > ? ORDER BY id LIMIT ?''', (last_id, chunk_size)).fetchall()
+        if not rows:
+            break
+        last_id = rows[-1][0]
+        if fmt == 'csv':
+            buffer.seek(0)
+            buffer.truncate()
+            writer.writerows(rows)
+            yield buffer.getvalue()
+        else:
+            yield encode_lines(map(record, rows)).decode('utf-8')
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description='Bulk import/export properties')
+    sub = parser.add_subparsers(dest='command', required=True)
+    imp = sub.add_parser('import', help='Upsert properties from a CSV or JSONL file')
+    imp.add_argument('path')
+    imp.add_argument('--format', choices=('csv', 'jsonl'))
+    imp.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+    exp = sub.add_parser('export', help='Write all properties as CSV or JSONL')
+    exp.add_argument('--format', choices=('csv', 'jsonl'), default='jsonl')
+    exp.add_argument('--output', help='Output file (default: stdout)')
+    exp.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+    args = parser.parse_args(argv)
+
+    if args.command == 'import':
+        fmt = args.format or detect_format(args.path)
+        with open(args.path, newline='', encoding='utf-8-sig') as stream:
+            report = import_stream(stream, fmt, args.chunk_size)
+        print(json.dumps(report, indent=2))
+        return 1 if report['failed'] else 0
+
+    out = open(args.output, 'w', newline='', encoding='utf-8') if args.output else sys.stdout
+    try:
+        for text in export_properties(args.format, args.chunk_size):
+            out.write(text)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,124 @@
+import asyncio
+import inspect
+from typing import Callable, Dict, List, Optional
+
+from db.query import pool
+
+# How many log rows to keep for reconnecting clients to resume from
+CHANGE_RETENTION = 10000
+
+def _change_dict(row) -> Dict:
+    return {
+        'seq': row[0],
+        'property_id': row[1],
+        'op': row[2],
+        'name': row[3],
+        'changed_at': row[4]
+    }
+
+def get_changes_since(seq: int, limit: int = 500) -> List[Dict]:
+    """Get logged changes with a sequence number greater than seq, oldest first"""
+    with pool.reader() as conn:
+        rows = conn.execute('''SELECT seq, property_id, op, name, changed_at FROM property_changes
+                               WHERE seq > ? ORDER BY seq LIMIT ?''', (seq, limit)).fetchall()
+    return [_change_dict(row) for row in rows]
+
+def get_change_bounds() -> Dict[str, int]:
+    """Oldest retained and latest sequence numbers (0 when the log is empty)"""
+    with pool.reader() as conn:
+        oldest, latest = conn.execute('SELECT MIN(seq), MAX(seq) FROM property_changes').fetchone()
+    return {'oldest': oldest or 0, 'latest': latest or 0}
+
+def prune_changes(keep: int = CHANGE_RETENTION) -> int:
+    """Delete all but the newest `keep` log rows; returns the number removed"""
+    with pool.writer() as conn:
+        cursor = conn.execute('DELETE FROM property_changes WHERE seq <= (SELECT MAX(seq) FROM property_changes) - ?',
+                              (keep,))
+        return cursor.rowcount
+
+class ChangeFeed:
+    """Tails property_changes and hands new rows to listeners.
+
+    Every worker process runs its own feed, so writes made by any process
+    (or by the bulk CLI) reach every worker's WebSocket clients and caches.
+    Polling is cheap: PRAGMA data_version only changes when another
+    connection has committed, and the log is read only then. In snapshot
+    mode the log is read from the snapshot, so changes are relayed once a
+    snapshot containing them is published and caches are purged as readers
+    switch to it.
+    """
+
+    def __init__(self, poll_interval: float = 0.2, batch_size: int = 500,
+                 prune_every: float = 300.0):
+        self.poll_interval = poll_interval
+        self.batch_size = batch_size
+        self.prune_every = prune_every
+        self.last_seq = 0
+        self._listeners: List[Callable] = []
+        self._task: Optional[asyncio.Task] = None
+        self._conn = None
+        self._wakeup = asyncio.Event()
+
+    def add_listener(self, callback: Callable[[List[Dict]], None]):
+        """Register a callback (sync or async) receiving each batch of changes"""
+        self._listeners.append(callback)
+
+    def notify(self):
+        """Poll now instead of waiting for the next interval (call after a local write)"""
+        self._wakeup.set()
+
+    async def start(self):
+        """Start tailing from the current end of the log"""
+        if self._task is not None:
+            return
+        self._conn = pool.connect()
+        self.last_seq = (await pool.run(get_change_bounds))['latest']
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        self._conn.close()
+        self._conn = None
+
+    async def _run(self):
+        data_version = None
+        loop = asyncio.get_running_loop()
+        next_prune = loop.time() + self.prune_every
+        while True:
+            try:
+                version = (self._conn.execute('PRAGMA data_version').fetchone()[0], pool.snapshot_key())
+                if version != data_version:
+                    data_version = version
+                    await self._drain()
+                if loop.time() >= next_prune:
+                    next_prune = loop.time() + self.prune_every
+                    await pool.run(prune_changes)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Error tailing property changes: {e}")
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    async def _drain(self):
+        while True:
+            changes = await pool.run(get_changes_since, self.last_seq, self.batch_size)
+            if not changes:
+                return
+            self.last_seq = changes[-1]['seq']
+            for listener in self._listeners:
+                result = listener(changes)
+                if inspect.isawaitable(result):
+                    await result
+            if len(changes) < self.batch_size:
+                return
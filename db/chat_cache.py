@@ -0,0 +1,181 @@
+"""Response cache for chat answers.
+
+Answers are keyed by the normalized message, the property the message is
+about and that property's version (its updated_at). Normalizing only drops
+case, punctuation and a few words that never change the question (articles,
+greetings, "please"), so "Is there a gym?" and "is there a gym" share an
+answer but "no swimming pool" and "a swimming pool", or "schools close to"
+and "hospitals close to", do not. There is no fuzzy matching: an answer to
+a different question is worse than a miss. Entries live in a bounded
+in-memory LRU with a TTL and are written through to a SQLite file so they
+survive restarts.
+"""
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from typing import Dict, Iterable, Optional, Set, Tuple
+
+from db.query import pool
+from db.retrieval import tokenize
+
+DEFAULT_PATH = os.environ.get('CHAT_CACHE_DB', os.path.join(os.path.dirname(__file__), 'chat_cache.db'))
+# Words a message can gain or lose without becoming a different question. Unlike
+# the retrieval stopwords this keeps negations, prepositions and "or"/"and".
+_TRIVIAL_WORDS = frozenset('a an the please pls kindly hi hello hey thanks thank'.split())
+
+Key = Tuple[Optional[int], str, str]
+
+# On disk, answers not tied to a property are stored under id 0
+def _disk_key(key: Key) -> Tuple[int, str, str]:
+    return (key[0] or 0, key[1], key[2])
+
+def normalize_message(message: str) -> str:
+    """Canonical form of a chat message used as the cache key"""
+    return ' '.join(tokenize(message, stopwords=_TRIVIAL_WORDS))
+
+def get_property_version(property_id: Optional[int]) -> Optional[str]:
+    """Version that cached answers about a property are tied to.
+
+    A property's version is its updated_at; answers not tied to a property
+    are versioned by the latest catalog change. None if the property is gone.
+    """
+    with pool.reader() as conn:
+        if property_id is None:
+            latest = conn.execute('SELECT MAX(seq) FROM property_changes').fetchone()[0]
+            return f'catalog:{latest or 0}'
+        row = conn.execute('SELECT updated_at FROM properties WHERE id = ?', (property_id,)).fetchone()
+    return str(row[0]) if row else None
+
+class ChatResponseCache:
+    """LRU/TTL cache of chat answers with SQLite persistence"""
+
+    def __init__(self, maxsize: int = 2048, ttl: Optional[float] = 86400.0, path: Optional[str] = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.path = path
+        self._entries: 'OrderedDict[Key, Tuple[str, float]]' = OrderedDict()
+        # (property_id, version) -> keys, so a property's answers can be dropped together
+        self._scopes: Dict[Tuple[Optional[int], str], Set[Key]] = defaultdict(set)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        if path:
+            with sqlite3.connect(path) as conn:
+                conn.execute('''CREATE TABLE IF NOT EXISTS chat_cache (
+                    property_id INTEGER NOT NULL,
+                    version TEXT NOT NULL,
+                    normalized TEXT NOT NULL,
+                    response TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    PRIMARY KEY (property_id, version, normalized)
+                )''')
+                conn.execute('CREATE INDEX IF NOT EXISTS idx_chat_cache_created ON chat_cache(created_at)')
+            self._load()
+
+    def _expired(self, created_at: float) -> bool:
+        return bool(self.ttl) and created_at + self.ttl <= time.time()
+
+    def _load(self):
+        # Warm memory with the newest unexpired answers from disk
+        with sqlite3.connect(self.path) as conn:
+            if self.ttl:
+                conn.execute('DELETE FROM chat_cache WHERE created_at <= ?', (time.time() - self.ttl,))
+            rows = conn.execute('''SELECT property_id, version, normalized, response, created_at FROM chat_cache
+                                   ORDER BY created_at DESC LIMIT ?''', (self.maxsize,)).fetchall()
+        with self._lock:
+            for property_id, version, normalized, response, created_at in reversed(rows):
+                self._remember((property_id or None, version, normalized), response, created_at)
+
+    def get(self, message: str, property_id: Optional[int], version: Optional[str]) -> Optional[str]:
+        """Cached answer for the message about this property version"""
+        if version is None:
+            return None
+        normalized = normalize_message(message)
+        key = (property_id, version, normalized)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and not self._expired(entry[1]):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+        if self.path:
+            with sqlite3.connect(self.path) as conn:
+                row = conn.execute('''SELECT response, created_at FROM chat_cache
+                                      WHERE property_id = ? AND version = ? AND normalized = ?''',
+                                   _disk_key(key)).fetchone()
+            if row is not None and not self._expired(row[1]):
+                with self._lock:
+                    self._remember(key, row[0], row[1])
+                    self.hits += 1
+                return row[0]
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def set(self, message: str, property_id: Optional[int], version: Optional[str], response: str):
+        """Store an answer for the message about this property version"""
+        if version is None or not response:
+            return
+        key = (property_id, version, normalize_message(message))
+        created_at = time.time()
+        with self._lock:
+            self._remember(key, response, created_at)
+        if self.path:
+            with sqlite3.connect(self.path) as conn:
+                conn.execute('INSERT OR REPLACE INTO chat_cache VALUES (?, ?, ?, ?, ?)',
+                             _disk_key(key) + (response, created_at))
+
+    def invalidate_properties(self, property_ids: Iterable[int]):
+        """Drop every answer about the given properties (call when their rows change)"""
+        ids = set(property_ids)
+        if not ids:
+            return
+        with self._lock:
+            for scope in [s for s in self._scopes if s[0] in ids]:
+                for key in self._scopes.pop(scope):
+                    self._entries.pop(key, None)
+        if self.path:
+            ids = list(ids)
+            with sqlite3.connect(self.path) as conn:
+                for start in range(0, len(ids), 500):
+                    batch = ids[start:start + 500]
+                    conn.execute(f"DELETE FROM chat_cache WHERE property_id IN ({', '.join('?' for _ in batch)})",
+                                 batch)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._scopes.clear()
+        if self.path:
+            with sqlite3.connect(self.path) as conn:
+                conn.execute('DELETE FROM chat_cache')
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+            }
+
+    def _remember(self, key: Key, response: str, created_at: float):
+        self._entries[key] = (response, created_at)
+        self._entries.move_to_end(key)
+        self._scopes[key[:2]].add(key)
+        while len(self._entries) > self.maxsize:
+            old, _ = self._entries.popitem(last=False)
+            scope = self._scopes.get(old[:2])
+            if scope is not None:
+                scope.discard(old)
+                if not scope:
+                    del self._scopes[old[:2]]
+
+# Global instance
+chat_cache = ChatResponseCache(maxsize=int(os.environ.get('CHAT_CACHE_SIZE', 2048)),
+                               ttl=float(os.environ.get('CHAT_CACHE_TTL', 86400)), path=DEFAULT_PATH)
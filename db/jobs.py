@@ -0,0 +1,292 @@
+"""Durable background jobs for the slow side effects of property writes.
+
+Jobs are rows in the ``jobs`` table of the properties database (created
+with the rest of the schema in db.query), so they survive restarts and
+every worker process can run them. A request handler enqueues work (one
+INSERT) and returns; JobQueue worker tasks claim queued
+jobs, run their handler and record the outcome. Failed jobs are retried with
+exponential backoff until max_attempts. A job enqueued with a dedup_key
+while an identical one is still queued is merged into it, so a burst of
+writes to one property refreshes it once.
+
+Handlers are registered per kind and receive the job's JSON payload as
+keyword arguments; plain functions run on a worker thread, coroutine
+functions on the event loop. Job state changes with every claim, so it is
+always read from the primary database, never from a snapshot.
+"""
+import asyncio
+import inspect
+import json
+import os
+import time
+import uuid
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from db.query import pool
+
+STATUSES = ('queued', 'running', 'done', 'failed')
+DEFAULT_MAX_ATTEMPTS = 5
+# Retry delays: RETRY_BASE * 2 ** (attempt - 1), capped at RETRY_MAX seconds
+RETRY_BASE = 2.0
+RETRY_MAX = 600.0
+# A running job not finished within this many seconds is assumed orphaned
+# (its worker died) and queued again
+LEASE_SECONDS = 300.0
+# Finished jobs are kept this long for status queries
+JOB_RETENTION = 86400.0
+
+# (kind, payload, dedup_key, max_attempts)
+JobSpec = Tuple[str, Dict, Optional[str], int]
+
+def job(kind: str, dedup_key: Optional[str] = None, max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+        **payload) -> JobSpec:
+    """Describe a job for enqueue()"""
+    return (kind, payload, dedup_key, max_attempts)
+
+def _job_dict(row) -> Dict:
+    return {
+        'id': row[0],
+        'kind': row[1],
+        'payload': json.loads(row[2]),
+        'dedup_key': row[3],
+        'status': row[4],
+        'attempts': row[5],
+        'max_attempts': row[6],
+        'run_after': row[7],
+        'last_error': row[8],
+        'created_at': row[9],
+        'updated_at': row[10],
+        'finished_at': row[11]
+    }
+
+_JOB_COLUMNS = ('id, kind, payload, dedup_key, status, attempts, max_attempts, run_after, last_error, '
+                'created_at, updated_at, finished_at')
+
+def enqueue(jobs: Iterable[JobSpec], delay: float = 0.0) -> List[int]:
+    """Queue jobs in one transaction; returns their ids (an already queued duplicate's id when merged)"""
+    now = time.time()
+    ids = []
+    with pool.writer() as conn:
+        for kind, payload, dedup_key, max_attempts in jobs:
+            cursor = conn.execute('''INSERT OR IGNORE INTO jobs (kind, payload, dedup_key, max_attempts, run_after,
+                                                                 created_at, updated_at)
+                                     VALUES (?, ?, ?, ?, ?, ?, ?)''',
+                                  (kind, json.dumps(payload), dedup_key, max_attempts, now + delay, now, now))
+            if cursor.rowcount:
+                ids.append(cursor.lastrowid)
+            else:
+                ids.append(conn.execute("SELECT id FROM jobs WHERE dedup_key = ? AND status = 'queued'",
+                                        (dedup_key,)).fetchone()[0])
+    return ids
+
+def get_job(job_id: int) -> Optional[Dict]:
+    with pool.primary() as conn:
+        row = conn.execute(f'SELECT {_JOB_COLUMNS} FROM jobs WHERE id = ?', (job_id,)).fetchone()
+    return _job_dict(row) if row else None
+
+def list_jobs(status: Optional[str] = None, kind: Optional[str] = None, limit: int = 50) -> List[Dict]:
+    """Most recently updated jobs, optionally filtered by status and kind"""
+    conditions, params = [], []
+    if status:
+        conditions.append('status = ?')
+        params.append(status)
+    if kind:
+        conditions.append('kind = ?')
+        params.append(kind)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+    with pool.primary() as conn:
+        rows = conn.execute(f'SELECT {_JOB_COLUMNS} FROM jobs {where} ORDER BY updated_at DESC, id DESC LIMIT ?',
+                            params + [limit]).fetchall()
+    return [_job_dict(row) for row in rows]
+
+def count_jobs() -> Dict[str, int]:
+    """Number of jobs in each status"""
+    with pool.primary() as conn:
+        counts = dict(conn.execute('SELECT status, COUNT(*) FROM jobs GROUP BY status').fetchall())
+    return {status: counts.get(status, 0) for status in STATUSES}
+
+def retry_delay(attempts: int) -> float:
+    return min(RETRY_MAX, RETRY_BASE * 2 ** (attempts - 1))
+
+def _claim(worker_id: str, kinds: List[str]) -> Optional[Dict]:
+    now = time.time()
+    with pool.writer() as conn:
+        row = conn.execute(f'''UPDATE jobs SET status = 'running', attempts = attempts + 1,
+                                              locked_by = ?, locked_at = ?, updated_at = ?
+                               WHERE id = (SELECT id FROM jobs
+                                           WHERE status = 'queued' AND run_after <= ?
+                                             AND kind IN ({', '.join('?' for _ in kinds)})
+                                           ORDER BY run_after, id LIMIT 1)
+                               RETURNING {_JOB_COLUMNS}''',
+                           [worker_id, now, now, now] + kinds).fetchone()
+    return _job_dict(row) if row else None
+
+def _finish(job: Dict, worker_id: str, error: Optional[str] = None, retry: bool = False):
+    now = time.time()
+    with pool.writer() as conn:
+        if error is None:
+            conn.execute('''UPDATE jobs SET status = 'done', last_error = NULL, locked_by = NULL,
+                                            updated_at = ?, finished_at = ?
+                            WHERE id = ? AND locked_by = ?''', (now, now, job['id'], worker_id))
+            return
+        if retry:
+            # Ignored if a duplicate was queued while this job ran; that one covers the retry
+            if conn.execute('''UPDATE OR IGNORE jobs SET status = 'queued', last_error = ?, locked_by = NULL,
+                                                        run_after = ?, updated_at = ?
+                                 WHERE id = ? AND locked_by = ?''',
+                            (error, now + retry_delay(job['attempts']), now, job['id'], worker_id)).rowcount:
+                return
+            error += ' (superseded by a queued duplicate)'
+        conn.execute('''UPDATE jobs SET status = 'failed', last_error = ?, locked_by = NULL,
+                                        updated_at = ?, finished_at = ?
+                        WHERE id = ? AND locked_by = ?''', (error, now, now, job['id'], worker_id))
+
+def requeue_orphans(lease: float = LEASE_SECONDS) -> int:
+    """Queue again jobs whose worker stopped without finishing them; returns how many"""
+    now = time.time()
+    with pool.writer() as conn:
+        requeued = conn.execute('''UPDATE OR IGNORE jobs SET status = 'queued', locked_by = NULL, updated_at = ?,
+                                                             last_error = 'worker lease expired'
+                                   WHERE status = 'running' AND locked_at < ?''', (now, now - lease)).rowcount
+        # The rest have a queued duplicate that will do the work
+        conn.execute('''UPDATE jobs SET status = 'failed', locked_by = NULL, updated_at = ?, finished_at = ?,
+                                        last_error = 'worker lease expired (superseded by a queued duplicate)'
+                        WHERE status = 'running' AND locked_at < ?''', (now, now, now - lease))
+    return requeued
+
+def prune_jobs(retention: float = JOB_RETENTION) -> int:
+    """Delete finished jobs older than the retention period; returns how many"""
+    with pool.writer() as conn:
+        return conn.execute("DELETE FROM jobs WHERE status IN ('done', 'failed') AND finished_at < ?",
+                            (time.time() - retention,)).rowcount
+
+class JobQueue:
+    """Runs queued jobs on ``concurrency`` worker tasks in this process.
+
+    Workers sleep until notify() (called after enqueueing locally) or the
+    next poll, so jobs queued by other processes are picked up too.
+    """
+
+    def __init__(self, concurrency: int = 2, poll_interval: float = 1.0, maintenance_every: float = 60.0):
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.maintenance_every = maintenance_every
+        self.worker_id = f'{os.getpid()}-{uuid.uuid4().hex[:8]}'
+        self._handlers: Dict[str, Callable] = {}
+        self._tasks: List[asyncio.Task] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self.completed = 0
+        self.retried = 0
+        self.failed = 0
+
+    def register(self, kind: str, handler: Callable):
+        """Run ``handler(**payload)`` for jobs of this kind"""
+        self._handlers[kind] = handler
+
+    def handler(self, kind: str):
+        """Decorator form of register()"""
+        def decorator(fn):
+            self.register(kind, fn)
+            return fn
+        return decorator
+
+    def notify(self):
+        """Wake idle workers (call after enqueueing)"""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def enqueue(self, jobs: Iterable[JobSpec], delay: float = 0.0) -> List[int]:
+        """Queue jobs and wake the workers; returns the job ids"""
+        ids = await pool.run(enqueue, list(jobs), delay)
+        self.notify()
+        return ids
+
+    async def start(self):
+        if self._tasks:
+            return
+        self._wakeup = asyncio.Event()
+        await pool.run(requeue_orphans)
+        self._tasks = [asyncio.create_task(self._work()) for _ in range(self.concurrency)]
+        self._tasks.append(asyncio.create_task(self._maintain()))
+
+    async def stop(self):
+        """Stop the workers; a job interrupted mid-run is queued again once its lease expires"""
+        for task in self._tasks:
+            task.cancel()
+        for task in self._tasks:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._tasks = []
+
+    async def run_pending(self) -> int:
+        """Run queued jobs that are due until none are left; returns how many ran"""
+        count = 0
+        while await self._run_one():
+            count += 1
+        return count
+
+    async def _run_one(self) -> bool:
+        if not self._handlers:
+            return False
+        job = await pool.run(_claim, self.worker_id, list(self._handlers))
+        if job is None:
+            return False
+        handler = self._handlers[job['kind']]
+        try:
+            if inspect.iscoroutinefunction(handler):
+                await handler(**job['payload'])
+            else:
+                await asyncio.to_thread(handler, **job['payload'])
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            error = f'{type(e).__name__}: {e}'
+            retry = job['attempts'] < job['max_attempts']
+            await pool.run(_finish, job, self.worker_id, error, retry)
+            if retry:
+                self.retried += 1
+            else:
+                self.failed += 1
+            return True
+        await pool.run(_finish, job, self.worker_id)
+        self.completed += 1
+        return True
+
+    async def _work(self):
+        while True:
+            try:
+                if await self._run_one():
+                    continue
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Error running background jobs: {e}")
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    async def _maintain(self):
+        while True:
+            await asyncio.sleep(self.maintenance_every)
+            try:
+                if await pool.run(requeue_orphans):
+                    self.notify()
+                await pool.run(prune_jobs)
+            except Exception as e:
+                print(f"Error maintaining the job queue: {e}")
+
+    def stats(self) -> Dict[str, int]:
+        """This process's job counters"""
+        return {
+            'workers': self.concurrency,
+            'completed': self.completed,
+            'retried': self.retried,
+            'failed': self.failed,
+        }
+
+# Global instance; handlers are registered by the app
+job_queue = JobQueue(concurrency=int(os.environ.get('JOB_WORKERS', 2)))
@@ -0,0 +1,174 @@
+import os
+import sqlite3
+import threading
+import time
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import partial
+from typing import Callable, Iterator, List, Optional, Tuple
+from urllib.parse import quote
+
+# Pragmas applied to every connection. WAL lets readers proceed while the
+# writer commits; synchronous=NORMAL is durable enough under WAL and avoids an
+# fsync per transaction.
+CONNECTION_PRAGMAS = (
+    'PRAGMA journal_mode=WAL',
+    'PRAGMA synchronous=NORMAL',
+    'PRAGMA foreign_keys=ON',
+    'PRAGMA temp_store=MEMORY',
+    'PRAGMA cache_size=-16000',       # ~16 MB page cache per connection
+    'PRAGMA mmap_size=268435456',     # 256 MB memory-mapped I/O
+    'PRAGMA busy_timeout=5000',
+)
+
+# Pragmas for read-only snapshot connections. The file never changes while it
+# is open (immutable=1), so there is no journal, locking or busy handling.
+SNAPSHOT_PRAGMAS = (
+    'PRAGMA query_only=ON',
+    'PRAGMA temp_store=MEMORY',
+    'PRAGMA cache_size=-16000',
+    'PRAGMA mmap_size=1073741824',    # map up to 1 GB; pages are shared between processes
+)
+
+# Identifies one published snapshot file: a new publish replaces the path
+# with a new inode
+SnapshotKey = Tuple[int, int, int]
+
+class ConnectionPool:
+    """Per-thread read connections plus a single serialized writer connection.
+
+    Readers are cached in thread-local storage so each worker thread reuses its
+    own connection (and its prepared statement cache). All writes go through
+    one connection guarded by a lock, which avoids SQLITE_BUSY churn between
+    writers.
+
+    With a snapshot_path, readers open the published read-only snapshot of
+    the database (see db.snapshot) instead of the primary file, with
+    immutable=1 so reads take no locks and never see a WAL. Each reader
+    reopens when a newer snapshot has been published; until the first one
+    exists, readers use the primary. Writes always go to the primary, and
+    primary() gives a read connection for state that must not lag behind
+    them.
+    """
+
+    def __init__(self, db_path: str, max_workers: int = 8, statement_cache_size: int = 256,
+                 on_connect: Optional[Callable[[sqlite3.Connection], None]] = None,
+                 snapshot_path: Optional[str] = None, snapshot_check_interval: float = 0.5):
+        self.db_path = db_path
+        self.on_connect = on_connect
+        self.statement_cache_size = statement_cache_size
+        self.snapshot_path = snapshot_path
+        self.snapshot_check_interval = snapshot_check_interval
+        self._snapshot_key: Optional[SnapshotKey] = None
+        self._snapshot_checked = float('-inf')
+        self._local = threading.local()
+        self._readers: List[sqlite3.Connection] = []
+        self._readers_lock = threading.Lock()
+        self._writer: Optional[sqlite3.Connection] = None
+        self._write_lock = threading.RLock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='db')
+
+    def connect(self) -> sqlite3.Connection:
+        """Open a new, unpooled connection with the pool's pragmas and hooks"""
+        conn = sqlite3.connect(
+            self.db_path,
+            check_same_thread=False,
+            cached_statements=self.statement_cache_size,
+        )
+        for pragma in CONNECTION_PRAGMAS:
+            conn.execute(pragma)
+        if self.on_connect is not None:
+            self.on_connect(conn)
+        return conn
+
+    def connect_snapshot(self) -> sqlite3.Connection:
+        """Open a new, unpooled read-only connection to the published snapshot"""
+        conn = sqlite3.connect(
+            f'file:{quote(os.path.abspath(self.snapshot_path))}?mode=ro&immutable=1',
+            uri=True,
+            check_same_thread=False,
+            cached_statements=self.statement_cache_size,
+        )
+        for pragma in SNAPSHOT_PRAGMAS:
+            conn.execute(pragma)
+        if self.on_connect is not None:
+            self.on_connect(conn)
+        return conn
+
+    def snapshot_key(self) -> Optional[SnapshotKey]:
+        """The currently published snapshot, or None without one (checked at most every snapshot_check_interval)"""
+        if self.snapshot_path is None:
+            return None
+        now = time.monotonic()
+        if now - self._snapshot_checked >= self.snapshot_check_interval:
+            try:
+                st = os.stat(self.snapshot_path)
+                self._snapshot_key = (st.st_dev, st.st_ino, st.st_mtime_ns)
+            except FileNotFoundError:
+                self._snapshot_key = None
+            self._snapshot_checked = now
+        return self._snapshot_key
+
+    def _thread_conn(self, attr: str, key, open_conn: Callable[[], sqlite3.Connection]) -> sqlite3.Connection:
+        # One connection per thread and role, reopened when its key changes
+        current = getattr(self._local, attr, None)
+        if current is not None and current[0] == key:
+            return current[1]
+        conn = open_conn()
+        setattr(self._local, attr, (key, conn))
+        with self._readers_lock:
+            if current is not None:
+                current[1].close()
+                self._readers.remove(current[1])
+            self._readers.append(conn)
+        return conn
+
+    @contextmanager
+    def reader(self) -> Iterator[sqlite3.Connection]:
+        """Yield this thread's read connection, opening it on first use"""
+        key = self.snapshot_key()
+        if key is None:
+            yield self._thread_conn('conn', None, self.connect)
+        else:
+            yield self._thread_conn('conn', key, self.connect_snapshot)
+
+    @contextmanager
+    def primary(self) -> Iterator[sqlite3.Connection]:
+        """Yield this thread's read connection to the primary database, even in snapshot mode"""
+        if self.snapshot_path is None:
+            with self.reader() as conn:
+                yield conn
+        else:
+            yield self._thread_conn('primary_conn', None, self.connect)
+
+    @contextmanager
+    def writer(self) -> Iterator[sqlite3.Connection]:
+        """Yield the writer connection inside a transaction; commits on success, rolls back on error"""
+        with self._write_lock:
+            if self._writer is None:
+                self._writer = self.connect()
+            conn = self._writer
+            try:
+                yield conn
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+
+    async def run(self, fn: Callable, *args, **kwargs):
+        """Run a blocking DB function on the pool's executor without stalling the event loop"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, partial(fn, *args, **kwargs))
+
+    def close(self):
+        """Close every connection opened by this pool"""
+        with self._readers_lock:
+            for conn in self._readers:
+                conn.close()
+            self._readers.clear()
+        with self._write_lock:
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+        self._local = threading.local()
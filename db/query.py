@@ -1,14 +1,145 @@
 import sqlite3
 import os
+import re
 import json
-from typing import List, Dict, Optional
+import base64
+import html
+import math
+import functools
+import time
+from typing import List, Dict, Optional, Tuple
 from datetime import datetime
+from db.pool import ConnectionPool
+from db.cache import LRUCache
+from db.records import PROPERTY_COLUMNS, row_mapper, dumps, encode_records, json_body
+from metrics import observe_query
 
-DB_PATH = os.path.join(os.path.dirname(__file__), 'properties.db')
+DB_PATH = os.environ.get('PROPERTIES_DB_PATH', os.path.join(os.path.dirname(__file__), 'properties.db'))
+# Set to serve reads from published read-only snapshots (see db/snapshot.py)
+SNAPSHOT_PATH = os.environ.get('PROPERTIES_SNAPSHOT_PATH') or None
+
+PROPERTY_FIELDS = ('id', 'name', 'price', 'location', 'description', 'bedrooms', 'bathrooms',
+                   'area_sqft', 'property_type', 'image_url', 'contact_info', 'created_at', 'price_inr')
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+# Listing orders: sort name -> (keyset column, direction). Price orders skip
+# rows whose price could not be parsed.
+SORT_ORDERS = {
+    'newest': ('created_at', 'DESC'),
+    'price_asc': ('price_inr', 'ASC'),
+    'price_desc': ('price_inr', 'DESC'),
+}
+
+_PRICE_RE = re.compile(r'(\d+(?:\.\d+)?)\s*(crores?|cr|lakhs?|lacs?|l|thousand|k)?', re.IGNORECASE)
+_PRICE_UNITS = {'cr': 10_000_000, 'l': 100_000, 'thousand': 1_000, 'k': 1_000}
+
+def parse_price_inr(price) -> Optional[int]:
+    """Parse a display price like '₹80 Lakhs' or '₹1.2 Crores' into rupees"""
+    if price is None:
+        return None
+    if isinstance(price, (int, float)):
+        rupees = price
+    else:
+        match = _PRICE_RE.search(str(price).replace(',', ''))
+        if not match:
+            return None
+        unit = (match.group(2) or '').lower()
+        if unit.startswith('cr'):
+            multiplier = _PRICE_UNITS['cr']
+        elif unit.startswith('l'):
+            multiplier = _PRICE_UNITS['l']
+        else:
+            multiplier = _PRICE_UNITS.get(unit, 1)
+        rupees = float(match.group(1)) * multiplier
+    # Anything that does not fit an SQLite INTEGER is not a real price
+    if not math.isfinite(rupees) or abs(rupees) >= 2 ** 63:
+        return None
+    return int(rupees) if rupees is price else int(round(rupees))
+
+def _register_functions(conn: sqlite3.Connection):
+    conn.create_function('parse_price_inr', 1, parse_price_inr, deterministic=True)
+
+# Shared pool: per-thread readers, one serialized writer, WAL journal
+pool = ConnectionPool(DB_PATH, on_connect=_register_functions, snapshot_path=SNAPSHOT_PATH)
+
+# Read-through caches. property_cache holds single rows (their JSON and card HTML) keyed
+# by id and is purged per id on writes; listing_cache holds pages, counts and
+# search results, which any write can affect, so writes clear it wholesale.
+CACHE_TTL = float(os.environ.get('PROPERTY_CACHE_TTL', 300))
+property_cache = LRUCache(maxsize=int(os.environ.get('PROPERTY_CACHE_SIZE', 4096)), ttl=CACHE_TTL, name='property')
+listing_cache = LRUCache(maxsize=int(os.environ.get('LISTING_CACHE_SIZE', 512)), ttl=CACHE_TTL, name='listing')
+
+def _freeze(value):
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+def _copy(value):
+    # Callers get their own dicts so mutating a result never corrupts the cache;
+    # cached records (see db.records) are handed out as dicts
+    if isinstance(value, tuple) and hasattr(value, '_asdict'):
+        return value._asdict()
+    if isinstance(value, dict):
+        return dict(value)
+    if isinstance(value, list):
+        return [_copy(v) for v in value]
+    if isinstance(value, tuple):
+        return tuple(_copy(v) for v in value)
+    return value
+
+def _listing_cached(fn):
+    """Cache a read-only catalog query in listing_cache, keyed by its arguments"""
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        key = (fn.__name__, _freeze(args), _freeze(kwargs))
+        return _copy(listing_cache.get_or_set(key, lambda: fn(*args, **kwargs)))
+    return wrapper
+
+def invalidate_cache(property_id: Optional[int] = None):
+    """Drop cached reads affected by a write; property_id=None only drops listings"""
+    if property_id is not None:
+        property_cache.invalidate(('row', property_id))
+        property_cache.invalidate(('json', property_id))
+        property_cache.invalidate(('card', property_id))
+    listing_cache.clear()
+
+def clear_caches():
+    """Drop every cached read"""
+    property_cache.clear()
+    listing_cache.clear()
+
+def cache_stats() -> Dict[str, Dict[str, int]]:
+    """Hit/miss/eviction counters for each cache"""
+    return {cache.name: cache.stats() for cache in (property_cache, listing_cache)}
+
+# Full property rows as records; the SELECT list matches PROPERTY_COLUMNS
+_PROPERTY_SELECT = ', '.join(PROPERTY_COLUMNS)
+_property_record = row_mapper(PROPERTY_COLUMNS)
+
+# Stored in PRAGMA user_version once the schema is in place; bump it when
+# _create_schema changes so existing databases are migrated on next start
+SCHEMA_VERSION = 2
 
 # Initialize DB and sample data if not exists
 def init_db():
-    conn = sqlite3.connect(DB_PATH)
+    """Create or migrate the schema unless the database is already current.
+
+    The check reads through pool.reader(), so in snapshot mode a worker
+    starting against a current snapshot never touches the primary.
+    """
+    global fts_enabled
+    with pool.reader() as conn:
+        if conn.execute('PRAGMA user_version').fetchone()[0] >= SCHEMA_VERSION:
+            fts_enabled = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'properties_fts'").fetchone() is not None
+            return
+    with pool.writer() as conn:
+        _create_schema(conn)
+        conn.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+
+def _create_schema(conn: sqlite3.Connection):
     c = conn.cursor()
     c.execute('''CREATE TABLE IF NOT EXISTS properties (
         id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -23,7 +154,8 @@ def init_db():
         image_url TEXT,
         contact_info TEXT,
         created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        price_inr INTEGER
     )''')
     
     # Insert sample data if table is empty
@@ -36,119 +168,363 @@ def init_db():
             ('Sunset Gardens', '₹45 Lakhs', 'Hitech City, Hyderabad', 'Cozy 2BHK apartment near tech hub', 2, 2, 1100, 'Apartment', 'https://images.unsplash.com/photo-1560448204-e02f11c3d0e2?w=400', '+91-9876543213'),
             ('Royal Palace', '₹1.2 Crores', 'Banjara Hills, Hyderabad', 'Exclusive 4BHK villa with private pool', 4, 4, 3500, 'Villa', 'https://images.unsplash.com/photo-1613490493576-7fde63acd811?w=400', '+91-9876543214'),
         ])
-    conn.commit()
-    conn.close()
 
+    # Keyset pagination walks (created_at, id); filtered listings use the
+    # composite indexes so each page only touches the rows it returns.
+    c.execute('CREATE INDEX IF NOT EXISTS idx_properties_created ON properties(created_at, id)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_properties_type_created ON properties(property_type COLLATE NOCASE, created_at, id)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_properties_bedrooms_created ON properties(bedrooms, created_at, id)')
+
+    _migrate_price_inr(conn)
+    c.execute('CREATE INDEX IF NOT EXISTS idx_properties_price ON properties(price_inr, id)')
+
+    _create_fts(conn)
+    _create_change_log(conn)
+    _create_jobs_table(conn)
+
+    # Geocoded coordinates and precomputed nearby landmarks per property
+    c.execute('''CREATE TABLE IF NOT EXISTS property_geo (
+        property_id INTEGER PRIMARY KEY REFERENCES properties(id) ON DELETE CASCADE,
+        location TEXT,
+        latitude REAL,
+        longitude REAL,
+        landmarks TEXT,
+        computed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )''')
+
+def _migrate_price_inr(conn: sqlite3.Connection):
+    """Add the numeric price_inr column to older databases and backfill unparsed rows"""
+    columns = {row[1] for row in conn.execute('PRAGMA table_info(properties)')}
+    if 'price_inr' not in columns:
+        conn.execute('ALTER TABLE properties ADD COLUMN price_inr INTEGER')
+    conn.execute('''UPDATE properties SET price_inr = parse_price_inr(price)
+                    WHERE price_inr IS NULL AND parse_price_inr(price) IS NOT NULL''')
+
+# Full-text index over the searchable columns, kept in sync by triggers.
+# External content means the text itself is stored only once, in properties.
+_FTS_TRIGGERS = (
+    '''CREATE TRIGGER IF NOT EXISTS properties_fts_insert AFTER INSERT ON properties BEGIN
+           INSERT INTO properties_fts(rowid, name, location, description, property_type)
+           VALUES (new.id, new.name, new.location, new.description, new.property_type);
+       END''',
+    '''CREATE TRIGGER IF NOT EXISTS properties_fts_delete AFTER DELETE ON properties BEGIN
+           INSERT INTO properties_fts(properties_fts, rowid, name, location, description, property_type)
+           VALUES ('delete', old.id, old.name, old.location, old.description, old.property_type);
+       END''',
+    '''CREATE TRIGGER IF NOT EXISTS properties_fts_update
+       AFTER UPDATE OF name, location, description, property_type ON properties BEGIN
+           INSERT INTO properties_fts(properties_fts, rowid, name, location, description, property_type)
+           VALUES ('delete', old.id, old.name, old.location, old.description, old.property_type);
+           INSERT INTO properties_fts(rowid, name, location, description, property_type)
+           VALUES (new.id, new.name, new.location, new.description, new.property_type);
+       END''',
+)
+
+# bm25 column weights: name, location, description, property_type
+_FTS_WEIGHTS = (10.0, 5.0, 1.0, 3.0)
+
+fts_enabled = False
+
+def _create_fts(conn: sqlite3.Connection):
+    """Create the FTS5 table and triggers, rebuilding the index on first creation"""
+    global fts_enabled
+    exists = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'properties_fts'").fetchone()
+    try:
+        conn.execute('''CREATE VIRTUAL TABLE IF NOT EXISTS properties_fts USING fts5(
+            name, location, description, property_type,
+            content='properties', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+        )''')
+    except sqlite3.OperationalError as e:
+        # SQLite built without FTS5: search_properties falls back to LIKE
+        print(f"FTS5 unavailable, using LIKE search: {e}")
+        fts_enabled = False
+        return
+    for trigger in _FTS_TRIGGERS:
+        conn.execute(trigger)
+    if not exists:
+        conn.execute("INSERT INTO properties_fts(properties_fts) VALUES ('rebuild')")
+    fts_enabled = True
+
+# Append-only log of catalog writes. Triggers record every insert, update and
+# delete no matter which process or code path made it; db.changes tails it.
+_CHANGE_TRIGGERS = (
+    '''CREATE TRIGGER IF NOT EXISTS property_changes_insert AFTER INSERT ON properties BEGIN
+           INSERT INTO property_changes(property_id, op, name) VALUES (new.id, 'insert', new.name);
+       END''',
+    '''CREATE TRIGGER IF NOT EXISTS property_changes_update AFTER UPDATE ON properties BEGIN
+           INSERT INTO property_changes(property_id, op, name) VALUES (new.id, 'update', new.name);
+       END''',
+    '''CREATE TRIGGER IF NOT EXISTS property_changes_delete AFTER DELETE ON properties BEGIN
+           INSERT INTO property_changes(property_id, op, name) VALUES (old.id, 'delete', old.name);
+       END''',
+)
+
+def _create_change_log(conn: sqlite3.Connection):
+    conn.execute('''CREATE TABLE IF NOT EXISTS property_changes (
+        seq INTEGER PRIMARY KEY AUTOINCREMENT,
+        property_id INTEGER NOT NULL,
+        op TEXT NOT NULL,
+        name TEXT,
+        changed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )''')
+    for trigger in _CHANGE_TRIGGERS:
+        conn.execute(trigger)
+
+# Background job queue, see db/jobs.py
+def _create_jobs_table(conn: sqlite3.Connection):
+    conn.execute('''CREATE TABLE IF NOT EXISTS jobs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        kind TEXT NOT NULL,
+        payload TEXT NOT NULL,
+        dedup_key TEXT,
+        status TEXT NOT NULL DEFAULT 'queued',
+        attempts INTEGER NOT NULL DEFAULT 0,
+        max_attempts INTEGER NOT NULL,
+        run_after REAL NOT NULL,
+        last_error TEXT,
+        locked_by TEXT,
+        locked_at REAL,
+        created_at REAL NOT NULL,
+        updated_at REAL NOT NULL,
+        finished_at REAL
+    )''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_ready ON jobs(status, run_after) WHERE status = 'queued'")
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status, updated_at)')
+    # At most one queued job per dedup key; running ones do not count, since
+    # the data may have changed after they started
+    conn.execute('''CREATE UNIQUE INDEX IF NOT EXISTS idx_jobs_dedup ON jobs(dedup_key)
+                    WHERE status = 'queued' AND dedup_key IS NOT NULL''')
+
+@_listing_cached
 def get_all_properties() -> List[Dict]:
     """Get all properties from database"""
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute('''SELECT id, name, price, location, description, bedrooms, bathrooms, area_sqft, property_type, image_url, contact_info, created_at 
-                 FROM properties ORDER BY created_at DESC''')
-    properties = []
-    for row in c.fetchall():
-        properties.append({
-            'id': row[0],
-            'name': row[1],
-            'price': row[2],
-            'location': row[3],
-            'description': row[4],
-            'bedrooms': row[5],
-            'bathrooms': row[6],
-            'area_sqft': row[7],
-            'property_type': row[8],
-            'image_url': row[9],
-            'contact_info': row[10],
-            'created_at': row[11]
-        })
-    conn.close()
-    return properties
+    with pool.reader() as conn:
+        cursor = conn.execute(f'SELECT {_PROPERTY_SELECT} FROM properties ORDER BY created_at DESC')
+        return [_property_record(row)._asdict() for row in cursor]
 
 def get_property_by_id(property_id: int) -> Optional[Dict]:
     """Get property by ID"""
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute('''SELECT id, name, price, location, description, bedrooms, bathrooms, area_sqft, property_type, image_url, contact_info, created_at 
-                 FROM properties WHERE id = ?''', (property_id,))
-    row = c.fetchone()
-    conn.close()
-    
-    if row:
-        return {
-            'id': row[0],
-            'name': row[1],
-            'price': row[2],
-            'location': row[3],
-            'description': row[4],
-            'bedrooms': row[5],
-            'bathrooms': row[6],
-            'area_sqft': row[7],
-            'property_type': row[8],
-            'image_url': row[9],
-            'contact_info': row[10],
-            'created_at': row[11]
-        }
-    return None
+    return _copy(property_cache.get_or_set(('row', property_id), lambda: _fetch_property(property_id)))
 
-def search_properties(query: str) -> List[Dict]:
-    """Search properties by name, location, or type"""
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
+def get_property_json(property_id: int) -> Optional[bytes]:
+    """Serialized /api/properties/{id} response body, cached until the row changes"""
+    def build():
+        record = property_cache.get_or_set(('row', property_id), lambda: _fetch_property(property_id))
+        return json_body(dumps(record._asdict())) if record else None
+    return property_cache.get_or_set(('json', property_id), build)
+
+def _fetch_property(property_id: int):
+    with pool.reader() as conn:
+        row = conn.execute(f'SELECT {_PROPERTY_SELECT} FROM properties WHERE id = ?', (property_id,)).fetchone()
+    return _property_record(row) if row else None
+
+_FTS_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+_search_record = row_mapper(PROPERTY_COLUMNS + ('score', 'snippet', 'name_highlight'))
+
+# FTS marks matches with private-use characters; the text is HTML-escaped
+# before they become <mark> tags, so listing text cannot inject markup
+_MARK_OPEN, _MARK_CLOSE = '\ue000', '\ue001'
+
+def _highlight_html(text: Optional[str]) -> Optional[str]:
+    if text is None:
+        return None
+    return html.escape(text).replace(_MARK_OPEN, '<mark>').replace(_MARK_CLOSE, '</mark>')
+
+def build_fts_query(query: str) -> Optional[str]:
+    """Turn free text into an FTS5 query: every word must match, each as a prefix"""
+    tokens = _FTS_TOKEN_RE.findall(query)
+    if not tokens:
+        return None
+    return ' '.join(f'"{token}"*' for token in tokens)
+
+@_listing_cached
+def search_properties(query: str, limit: int = MAX_PAGE_SIZE) -> List[Dict]:
+    """Search properties by name, location, description or type, best matches first.
+
+    Each word is prefix-matched so partial input works for typeahead. Results
+    carry a bm25 ``score`` (lower is better) and ``snippet``/``name_highlight``
+    strings: HTML-escaped listing text with matches wrapped in <mark> tags.
+    """
+    if not fts_enabled:
+        return _search_properties_like(query, limit)
+    match = build_fts_query(query)
+    if match is None:
+        return []
+    weights = ', '.join(str(w) for w in _FTS_WEIGHTS)
+    with pool.reader() as conn:
+        rows = conn.execute(f'''SELECT {', '.join('p.' + column for column in PROPERTY_COLUMNS)},
+                                      bm25(properties_fts, {weights}) AS score,
+                                      snippet(properties_fts, 2, ?, ?, '…', 12),
+                                      highlight(properties_fts, 0, ?, ?)
+                               FROM properties_fts JOIN properties p ON p.id = properties_fts.rowid
+                               WHERE properties_fts MATCH ? ORDER BY score LIMIT ?''',
+                            (_MARK_OPEN, _MARK_CLOSE, _MARK_OPEN, _MARK_CLOSE, match, limit)).fetchall()
+    return [_search_record(row[:-2] + (_highlight_html(row[-2]), _highlight_html(row[-1]))) for row in rows]
+
+def _search_properties_like(query: str, limit: int) -> List:
+    """Substring search used when FTS5 is not compiled into SQLite"""
     search_term = f"%{query.lower()}%"
-    c.execute('''SELECT id, name, price, location, description, bedrooms, bathrooms, area_sqft, property_type, image_url, contact_info, created_at 
-                 FROM properties WHERE LOWER(name) LIKE ? OR LOWER(location) LIKE ? OR LOWER(property_type) LIKE ? ORDER BY created_at DESC''', 
-              (search_term, search_term, search_term))
-    properties = []
-    for row in c.fetchall():
-        properties.append({
-            'id': row[0],
-            'name': row[1],
-            'price': row[2],
-            'location': row[3],
-            'description': row[4],
-            'bedrooms': row[5],
-            'bathrooms': row[6],
-            'area_sqft': row[7],
-            'property_type': row[8],
-            'image_url': row[9],
-            'contact_info': row[10],
-            'created_at': row[11]
-        })
-    conn.close()
-    return properties
-
-def add_property(property_data: Dict) -> bool:
-    """Add new property to database"""
+    with pool.reader() as conn:
+        rows = conn.execute(f'''SELECT {_PROPERTY_SELECT}
+                               FROM properties WHERE LOWER(name) LIKE ? OR LOWER(location) LIKE ? OR LOWER(property_type) LIKE ? OR LOWER(description) LIKE ?
+                               ORDER BY created_at DESC LIMIT ?''', 
+                            (search_term, search_term, search_term, search_term, limit)).fetchall()
+    return [_property_record(row) for row in rows]
+
+def encode_cursor(sort_key, property_id: int) -> str:
+    """Encode a keyset position as an opaque URL-safe cursor"""
+    raw = json.dumps([sort_key, property_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+def decode_cursor(cursor: str) -> Tuple[object, int]:
+    """Decode a cursor produced by encode_cursor; raises ValueError if malformed"""
     try:
-        conn = sqlite3.connect(DB_PATH)
-        c = conn.cursor()
-        c.execute('''INSERT INTO properties (name, price, location, description, bedrooms, bathrooms, area_sqft, property_type, image_url, contact_info) 
-                     VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
-                  (property_data['name'], property_data['price'], property_data['location'], 
-                   property_data['description'], property_data['bedrooms'], property_data['bathrooms'],
-                   property_data['area_sqft'], property_data['property_type'], 
-                   property_data['image_url'], property_data['contact_info']))
-        conn.commit()
-        conn.close()
-        return True
+        padded = cursor + '=' * (-len(cursor) % 4)
+        sort_key, property_id = json.loads(base64.urlsafe_b64decode(padded))
+        if not isinstance(sort_key, (str, int)):
+            raise TypeError(sort_key)
+        return sort_key, int(property_id)
+    except Exception:
+        raise ValueError('Invalid cursor')
+
+def _filter_clause(min_price: Optional[int] = None, max_price: Optional[int] = None,
+                   bedrooms: Optional[int] = None, property_type: Optional[str] = None,
+                   location: Optional[str] = None) -> Tuple[List[str], List]:
+    """Build WHERE conditions and parameters for listing filters"""
+    conditions, params = [], []
+    if min_price is not None:
+        conditions.append('price_inr >= ?')
+        params.append(min_price)
+    if max_price is not None:
+        conditions.append('price_inr <= ?')
+        params.append(max_price)
+    if bedrooms is not None:
+        conditions.append('bedrooms = ?')
+        params.append(bedrooms)
+    if property_type:
+        conditions.append('property_type = ? COLLATE NOCASE')
+        params.append(property_type)
+    if location:
+        escaped = location.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+        conditions.append("location LIKE ? ESCAPE '\\'")
+        params.append(f'%{escaped}%')
+    return conditions, params
+
+@_listing_cached
+def list_properties(limit: int = DEFAULT_PAGE_SIZE, cursor: Optional[str] = None,
+                    fields: Optional[List[str]] = None, sort: str = 'newest',
+                    **filters) -> Tuple[List[Dict], Optional[str]]:
+    """Get one page of properties plus the cursor for the next page.
+
+    ``sort`` is one of SORT_ORDERS, ``fields`` restricts the returned keys
+    (``id`` is always included) and ``filters`` accepts min_price, max_price,
+    bedrooms, property_type and location.
+    """
+    if sort not in SORT_ORDERS:
+        raise ValueError(f"Unknown sort: {sort}")
+    sort_column, direction = SORT_ORDERS[sort]
+    if fields:
+        unknown = set(fields) - set(PROPERTY_FIELDS)
+        if unknown:
+            raise ValueError(f"Unknown fields: {', '.join(sorted(unknown))}")
+        output = ['id'] + [f for f in PROPERTY_FIELDS if f in fields and f != 'id']
+    else:
+        output = list(PROPERTY_FIELDS)
+    columns = output + [f for f in (sort_column,) if f not in output]
+    limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+
+    conditions, params = _filter_clause(**filters)
+    if sort_column == 'price_inr':
+        conditions.append('price_inr IS NOT NULL')
+    if cursor:
+        comparison = '<' if direction == 'DESC' else '>'
+        conditions.append(f'({sort_column}, id) {comparison} (?, ?)')
+        params.extend(decode_cursor(cursor))
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+    sql = f'''SELECT {', '.join(columns)} FROM properties {where}
+              ORDER BY {sort_column} {direction}, id {direction} LIMIT ?'''
+    with pool.reader() as conn:
+        rows = conn.execute(sql, params + [limit + 1]).fetchall()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = dict(zip(columns, rows[-1]))
+        next_cursor = encode_cursor(last[sort_column], last['id'])
+    width = len(output)
+    record = row_mapper(output)
+    return [record(row[:width]) for row in rows], next_cursor
+
+@_listing_cached
+def count_properties(**filters) -> int:
+    """Count properties matching the listing filters"""
+    conditions, params = _filter_clause(**filters)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+    with pool.reader() as conn:
+        return conn.execute(f'SELECT COUNT(*) FROM properties {where}', params).fetchone()[0]
+
+@_listing_cached
+def count_properties_by_type() -> Dict[str, int]:
+    """Count properties per property type"""
+    with pool.reader() as conn:
+        rows = conn.execute('SELECT property_type, COUNT(*) FROM properties GROUP BY property_type').fetchall()
+    return {property_type: count for property_type, count in rows}
+
+def list_properties_json(limit: int = DEFAULT_PAGE_SIZE, cursor: Optional[str] = None,
+                         fields: Optional[List[str]] = None, sort: str = 'newest', with_total: bool = False,
+                         **filters) -> bytes:
+    """Serialized /api/properties response body for one page, cached until the next write.
+
+    The total is a full COUNT over the filters, so it is only added when asked for.
+    """
+    def build():
+        # Encoded straight from the uncached records, without building dicts to copy
+        records, next_cursor = list_properties.__wrapped__(limit=limit, cursor=cursor, fields=fields,
+                                                           sort=sort, **filters)
+        if with_total:
+            return json_body(encode_records(records), total=count_properties(**filters), next_cursor=next_cursor)
+        return json_body(encode_records(records), next_cursor=next_cursor)
+    key = ('list_properties_json', limit, cursor, _freeze(fields), sort, with_total, _freeze(filters))
+    return listing_cache.get_or_set(key, build)
+
+def search_properties_json(query: str, limit: int = MAX_PAGE_SIZE) -> bytes:
+    """Serialized search endpoint response body, cached until the next write"""
+    def build():
+        records = search_properties.__wrapped__(query, limit)
+        return json_body(encode_records(records), query=query, total=len(records))
+    return listing_cache.get_or_set(('search_properties_json', query, limit), build)
+
+def add_property(property_data: Dict) -> Optional[int]:
+    """Add new property to database; returns its id, or None on failure"""
+    try:
+        with pool.writer() as conn:
+            cursor = conn.execute('''INSERT INTO properties (name, price, location, description, bedrooms, bathrooms, area_sqft, property_type, image_url, contact_info, price_inr) 
+                            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+                         (property_data['name'], property_data['price'], property_data['location'], 
+                          property_data['description'], property_data['bedrooms'], property_data['bathrooms'],
+                          property_data['area_sqft'], property_data['property_type'], 
+                          property_data['image_url'], property_data['contact_info'],
+                          parse_price_inr(property_data['price'])))
+        invalidate_cache()
+        return cursor.lastrowid
     except Exception as e:
         print(f"Error adding property: {e}")
-        return False
+        return None
 
 def update_property(property_id: int, property_data: Dict) -> bool:
     """Update existing property"""
     try:
-        conn = sqlite3.connect(DB_PATH)
-        c = conn.cursor()
-        c.execute('''UPDATE properties SET name=?, price=?, location=?, description=?, bedrooms=?, bathrooms=?, 
-                     area_sqft=?, property_type=?, image_url=?, contact_info=?, updated_at=CURRENT_TIMESTAMP 
-                     WHERE id=?''',
-                  (property_data['name'], property_data['price'], property_data['location'], 
-                   property_data['description'], property_data['bedrooms'], property_data['bathrooms'],
-                   property_data['area_sqft'], property_data['property_type'], 
-                   property_data['image_url'], property_data['contact_info'], property_id))
-        conn.commit()
-        conn.close()
+        with pool.writer() as conn:
+            conn.execute('''UPDATE properties SET name=?, price=?, location=?, description=?, bedrooms=?, bathrooms=?, 
+                            area_sqft=?, property_type=?, image_url=?, contact_info=?, price_inr=?, updated_at=CURRENT_TIMESTAMP 
+                            WHERE id=?''',
+                         (property_data['name'], property_data['price'], property_data['location'], 
+                          property_data['description'], property_data['bedrooms'], property_data['bathrooms'],
+                          property_data['area_sqft'], property_data['property_type'], 
+                          property_data['image_url'], property_data['contact_info'],
+                          parse_price_inr(property_data['price']), property_id))
+        invalidate_cache(property_id)
         return True
     except Exception as e:
         print(f"Error updating property: {e}")
@@ -157,27 +533,68 @@ def update_property(property_id: int, property_data: Dict) -> bool:
 def delete_property(property_id: int) -> bool:
     """Delete property by ID"""
     try:
-        conn = sqlite3.connect(DB_PATH)
-        c = conn.cursor()
-        c.execute('DELETE FROM properties WHERE id = ?', (property_id,))
-        conn.commit()
-        conn.close()
+        with pool.writer() as conn:
+            conn.execute('DELETE FROM properties WHERE id = ?', (property_id,))
+        invalidate_cache(property_id)
         return True
     except Exception as e:
         print(f"Error deleting property: {e}")
         return False
 
+def get_property_geo(property_id: int) -> Optional[Dict]:
+    """Get stored coordinates and nearby landmarks for a property"""
+    with pool.reader() as conn:
+        row = conn.execute('''SELECT location, latitude, longitude, landmarks, computed_at
+                              FROM property_geo WHERE property_id = ?''', (property_id,)).fetchone()
+    if row:
+        return {
+            'location': row[0],
+            'latitude': row[1],
+            'longitude': row[2],
+            'landmarks': json.loads(row[3]) if row[3] else [],
+            'computed_at': row[4]
+        }
+    return None
+
+def save_property_geo(property_id: int, location: str, latitude: Optional[float],
+                      longitude: Optional[float], landmarks: List[Dict]) -> bool:
+    """Store coordinates and nearby landmarks computed for a property"""
+    try:
+        with pool.writer() as conn:
+            conn.execute('''INSERT OR REPLACE INTO property_geo (property_id, location, latitude, longitude, landmarks, computed_at)
+                            VALUES (?, ?, ?, ?, ?, CURRENT_TIMESTAMP)''',
+                         (property_id, location, latitude, longitude, json.dumps(landmarks)))
+        return True
+    except Exception as e:
+        print(f"Error saving property landmarks: {e}")
+        return False
+
 # Legacy function for backward compatibility
 def get_property_info(message: str):
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    message_lower = message.lower()
-    c.execute('SELECT name, price, location FROM properties')
-    for name, price, location in c.fetchall():
-        if name.lower() in message_lower:
-            conn.close()
-            return {'name': name.title(), 'price': price, 'location': location}
-    conn.close()
-    return None 
+    """Property mentioned by name in a chat message, via the retrieval index"""
+    # Imported here because db.retrieval builds on this module
+    from db.retrieval import property_index
+    mentions = property_index.mentions(message)
+    if not mentions:
+        return None
+    match = mentions[0]
+    return {'name': match['name'].title(), 'price': match['price'], 'location': match['location']}
+
+# Async entry point for FastAPI handlers: runs any of the functions above on
+# the pool's executor so the event loop never blocks on SQLite.
+async def run_db(fn, *args, **kwargs):
+    """Await a blocking query function off the event loop, recording its duration"""
+    return await pool.run(_timed, fn, *args, **kwargs)
+
+def _timed(fn, *args, **kwargs):
+    name = getattr(fn, '__qualname__', None) or getattr(fn, '__name__', repr(fn))
+    started = time.perf_counter()
+    failed = True
+    try:
+        result = fn(*args, **kwargs)
+        failed = False
+        return result
+    finally:
+        observe_query(name, time.perf_counter() - started, failed)
 
 init_db() 
\ No newline at end of file
@@ -0,0 +1,55 @@
+"""Compact property rows and their JSON encoding.
+
+Query functions map SQLite rows to records: namedtuples with one class per
+column list, so a row costs a tuple instead of a dict with its own key
+table. Caches keep records, which are immutable and shared freely; callers
+of the query functions still get fresh dicts built from them.
+
+JSON bodies are encoded straight from records, with orjson when it is
+installed and the stdlib encoder otherwise. Whole-catalog reads such as the
+JSONL export encode one chunk of rows at a time, so neither the full list of
+dicts nor the full body is ever held in memory.
+"""
+import functools
+import json
+from collections import namedtuple
+from typing import Iterable, Sequence, Tuple
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Columns of a full property row, in SELECT order
+PROPERTY_COLUMNS = ('id', 'name', 'price', 'location', 'description', 'bedrooms', 'bathrooms',
+                    'area_sqft', 'property_type', 'image_url', 'contact_info', 'created_at')
+
+@functools.lru_cache(maxsize=256)
+def record_type(columns: Tuple[str, ...]) -> type:
+    """Shared namedtuple class for rows with these columns"""
+    return namedtuple('PropertyRecord', columns)
+
+PropertyRecord = record_type(PROPERTY_COLUMNS)
+
+def row_mapper(columns: Sequence[str]):
+    """Function turning a SQLite row with these columns into a record"""
+    return record_type(tuple(columns))._make
+
+def dumps(payload) -> bytes:
+    """Encode a JSON body the way JSONResponse does: compact, UTF-8, no NaN"""
+    if orjson is not None:
+        return orjson.dumps(payload)
+    return json.dumps(payload, ensure_ascii=False, allow_nan=False, separators=(',', ':')).encode('utf-8')
+
+def encode_records(records: Iterable) -> bytes:
+    """JSON array of records, encoded in one call"""
+    return dumps([record._asdict() for record in records])
+
+def json_body(data: bytes, **fields) -> bytes:
+    """``{"success":true,"data":<data>,...fields}`` around an already encoded data value"""
+    tail = dumps(fields)[1:] if fields else b'}'
+    return b'{"success":true,"data":' + data + (b',' + tail if fields else tail)
+
+def encode_lines(records: Iterable) -> bytes:
+    """Records as JSON Lines"""
+    return b''.join(dumps(record._asdict()) + b'\n' for record in records)
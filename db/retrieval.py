@@ -0,0 +1,307 @@
+"""In-memory retrieval index for chat context.
+
+Two structures are kept over the catalog:
+
+- an Aho–Corasick automaton over property names and aliases, so the
+  properties mentioned in a message are found in one pass over the message;
+- a sparse TF-IDF index over name, location, type and description, combined
+  with price/bedroom/type constraints parsed from queries like
+  "3BHK near Hitech under 60 lakhs".
+
+The index follows the property_changes log: each lookup first applies any
+changes logged since it was last synced, so writes from any process are
+picked up row by row instead of by rescanning the table.
+"""
+import math
+import re
+import threading
+from collections import Counter, defaultdict, deque
+from typing import Dict, FrozenSet, Iterable, List, Optional, Set, Tuple
+
+from db.query import pool, parse_price_inr
+
+# More pending changes than this and a full reload is cheaper than replaying
+MAX_INCREMENTAL_CHANGES = 1000
+DEFAULT_MATCHES = 5
+
+_TOKEN_RE = re.compile(r'[a-z0-9]+')
+_STOPWORDS = frozenset('a an and are at for from i in is it me near of on or show the to with what '
+                       'which any some find looking want need property properties'.split())
+_BEDROOMS_RE = re.compile(r'\b(\d+)\s*(?:bhk|bed(?:room)?s?|br)\b', re.IGNORECASE)
+_PRICE_UNIT = r'(?:crores?|cr|lakhs?|lacs?|l|thousand|k)'
+# A price needs a currency or a unit: "within 5 km" or "more than 2 bathrooms" is not one
+_PRICE_NUMBER = (r'(?:(?:rs\.?|inr|₹)\s*(\d+(?:\.\d+)?(?:\s*' + _PRICE_UNIT + r')?)'
+                 r'|(\d+(?:\.\d+)?\s*' + _PRICE_UNIT + r'))\b')
+_MAX_PRICE_RE = re.compile(r'\b(?:under|below|less than|up ?to|within|max(?:imum)?|budget(?: of)?)\s*' + _PRICE_NUMBER,
+                           re.IGNORECASE)
+_MIN_PRICE_RE = re.compile(r'\b(?:above|over|more than|at least|min(?:imum)?)\s*' + _PRICE_NUMBER, re.IGNORECASE)
+_TYPE_WORDS = {'villa': 'villa', 'villas': 'villa', 'apartment': 'apartment', 'apartments': 'apartment',
+               'flat': 'apartment', 'flats': 'apartment'}
+
+def normalize(text: Optional[str]) -> str:
+    """Lowercase and collapse everything but letters and digits to single spaces"""
+    return ' '.join(_TOKEN_RE.findall((text or '').lower()))
+
+def tokenize(text: Optional[str], stopwords: FrozenSet[str] = _STOPWORDS) -> List[str]:
+    """Index terms for free text: normalized words minus stopwords, with '3 bhk' folded to '3bhk'"""
+    text = _BEDROOMS_RE.sub(lambda m: f' {m.group(1)}bhk ', text or '')
+    return [t for t in _TOKEN_RE.findall(text.lower()) if t not in stopwords]
+
+def property_aliases(name: str) -> Set[str]:
+    """Normalized names a property can be mentioned by"""
+    full = normalize(name)
+    aliases = {full} if full else set()
+    if full.startswith('the '):
+        aliases.add(full[4:])
+    return aliases
+
+def parse_constraints(query: str) -> Dict:
+    """Structured filters in a chat query: max_price, min_price, bedrooms, property_type"""
+    constraints = {}
+    match = _MAX_PRICE_RE.search(query)
+    if match:
+        constraints['max_price'] = parse_price_inr(match.group(1) or match.group(2))
+    match = _MIN_PRICE_RE.search(query)
+    if match:
+        constraints['min_price'] = parse_price_inr(match.group(1) or match.group(2))
+    match = _BEDROOMS_RE.search(query)
+    if match:
+        constraints['bedrooms'] = int(match.group(1))
+    for word in _TOKEN_RE.findall(query.lower()):
+        if word in _TYPE_WORDS:
+            constraints['property_type'] = _TYPE_WORDS[word]
+            break
+    return constraints
+
+class AhoCorasick:
+    """Multi-pattern matcher: every occurrence of every pattern in one scan of the text.
+
+    Patterns can be added and removed at any time; the goto/fail tables are
+    rebuilt lazily on the next search after a change (linear in the total
+    pattern length).
+    """
+
+    def __init__(self):
+        self._patterns: Dict[str, Set] = defaultdict(set)
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._output: List[List[str]] = [[]]
+        self._dirty = False
+
+    def add(self, pattern: str, value):
+        if pattern:
+            self._patterns[pattern].add(value)
+            self._dirty = True
+
+    def remove(self, pattern: str, value):
+        values = self._patterns.get(pattern)
+        if values is not None:
+            values.discard(value)
+            if not values:
+                del self._patterns[pattern]
+            self._dirty = True
+
+    def _build(self):
+        goto, output = [{}], [[]]
+        for pattern in self._patterns:
+            state = 0
+            for ch in pattern:
+                nxt = goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(goto)
+                    goto[state][ch] = nxt
+                    goto.append({})
+                    output.append([])
+                state = nxt
+            output[state].append(pattern)
+        fail = [0] * len(goto)
+        queue = deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in goto[state].items():
+                queue.append(nxt)
+                f = fail[state]
+                while f and ch not in goto[f]:
+                    f = fail[f]
+                fail[nxt] = goto[f].get(ch, 0)
+                output[nxt] = output[nxt] + output[fail[nxt]]
+        self._goto, self._fail, self._output = goto, fail, output
+        self._dirty = False
+
+    def search(self, text: str) -> Iterable[Tuple[int, str, Set]]:
+        """Yield (end_index, pattern, values) for each match, in text order"""
+        if self._dirty:
+            self._build()
+        goto, fail, output = self._goto, self._fail, self._output
+        state = 0
+        for i, ch in enumerate(text):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            for pattern in output[state]:
+                yield i + 1, pattern, self._patterns[pattern]
+
+class PropertyIndex:
+    """Name automaton plus TF-IDF postings over the catalog, kept in sync with the change log"""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._reset()
+
+    def _reset(self):
+        self._loaded = False
+        self.synced_seq = 0
+        self._names = AhoCorasick()
+        self._docs: Dict[int, Dict] = {}
+        self._terms: Dict[int, Counter] = {}
+        self._postings: Dict[str, Dict[int, int]] = defaultdict(dict)
+        self._doc_norms: Dict[int, float] = {}
+
+    # Loading and sync
+
+    def load(self):
+        """Rebuild the whole index from the properties table"""
+        with pool.reader() as conn:
+            latest = conn.execute('SELECT MAX(seq) FROM property_changes').fetchone()[0] or 0
+            rows = conn.execute('''SELECT id, name, price, location, description, bedrooms,
+                                          property_type, price_inr FROM properties''').fetchall()
+        with self._lock:
+            self._reset()
+            for row in rows:
+                self._add(self._row_dict(row))
+            self.synced_seq = latest
+            self._loaded = True
+
+    def sync(self):
+        """Apply changes logged since the last sync (or load on first use)"""
+        with self._lock:
+            if not self._loaded:
+                self.load()
+                return
+            with pool.reader() as conn:
+                oldest = conn.execute('SELECT MIN(seq) FROM property_changes').fetchone()[0] or 0
+                changes = conn.execute('''SELECT seq, property_id FROM property_changes
+                                          WHERE seq > ? ORDER BY seq LIMIT ?''',
+                                       (self.synced_seq, MAX_INCREMENTAL_CHANGES + 1)).fetchall()
+            if not changes:
+                return
+            if len(changes) > MAX_INCREMENTAL_CHANGES or oldest > self.synced_seq + 1:
+                # Too far behind, or the log was pruned past our position
+                self.load()
+                return
+            self.refresh({property_id for _, property_id in changes})
+            self.synced_seq = changes[-1][0]
+
+    def refresh(self, property_ids: Iterable[int]):
+        """Re-read the given properties, updating or dropping their entries"""
+        ids = list(property_ids)
+        if not ids:
+            return
+        with pool.reader() as conn:
+            rows = conn.execute(f'''SELECT id, name, price, location, description, bedrooms,
+                                           property_type, price_inr FROM properties
+                                    WHERE id IN ({', '.join('?' for _ in ids)})''', ids).fetchall()
+        with self._lock:
+            for property_id in ids:
+                self._remove(property_id)
+            for row in rows:
+                self._add(self._row_dict(row))
+
+    @staticmethod
+    def _row_dict(row) -> Dict:
+        return {
+            'id': row[0],
+            'name': row[1],
+            'price': row[2],
+            'location': row[3],
+            'description': row[4],
+            'bedrooms': row[5],
+            'property_type': row[6],
+            'price_inr': row[7]
+        }
+
+    def _add(self, doc: Dict):
+        property_id = doc['id']
+        self._docs[property_id] = doc
+        for alias in property_aliases(doc['name']):
+            self._names.add(alias, property_id)
+        terms = Counter(tokenize(' '.join(str(doc[f] or '') for f in ('name', 'location', 'property_type',
+                                                                     'description'))))
+        if doc['bedrooms']:
+            terms[f"{doc['bedrooms']}bhk"] += 1
+        self._terms[property_id] = terms
+        for term, count in terms.items():
+            self._postings[term][property_id] = count
+        self._doc_norms[property_id] = math.sqrt(sum(c * c for c in terms.values())) or 1.0
+
+    def _remove(self, property_id: int):
+        doc = self._docs.pop(property_id, None)
+        if doc is None:
+            return
+        for alias in property_aliases(doc['name']):
+            self._names.remove(alias, property_id)
+        for term in self._terms.pop(property_id):
+            postings = self._postings[term]
+            postings.pop(property_id, None)
+            if not postings:
+                del self._postings[term]
+        self._doc_norms.pop(property_id, None)
+
+    # Queries
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+    def mentions(self, message: str) -> List[Dict]:
+        """Properties whose name appears in the message as whole words, longest match first"""
+        text = f' {normalize(message)} '
+        self.sync()
+        with self._lock:
+            found = {}
+            for end, pattern, ids in self._names.search(text):
+                start = end - len(pattern)
+                if text[start - 1] != ' ' or text[end] != ' ':
+                    continue
+                for property_id in ids:
+                    if len(pattern) > found.get(property_id, 0):
+                        found[property_id] = len(pattern)
+            ranked = sorted(found, key=lambda i: (-found[i], i))
+            return [dict(self._docs[i]) for i in ranked]
+
+    def search(self, query: str, k: int = DEFAULT_MATCHES) -> List[Dict]:
+        """Best matching properties for a free-text query, honouring parsed price/bedroom/type limits"""
+        constraints = parse_constraints(query)
+        text = _MAX_PRICE_RE.sub(' ', _MIN_PRICE_RE.sub(' ', query))
+        terms = Counter(t for t in tokenize(text) if t not in _TYPE_WORDS)
+        self.sync()
+        with self._lock:
+            total = len(self._docs) or 1
+            scores: Dict[int, float] = defaultdict(float)
+            for term, query_count in terms.items():
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + total / len(postings))
+                for property_id, count in postings.items():
+                    scores[property_id] += query_count * count * idf * idf
+            if constraints:
+                candidates = scores.keys() if scores else self._docs.keys()
+                scores = {i: scores.get(i, 0.0) for i in candidates if self._matches(self._docs[i], constraints)}
+            ranked = sorted(scores, key=lambda i: (-scores[i] / self._doc_norms[i], i))[:k]
+            return [dict(self._docs[i], score=round(scores[i] / self._doc_norms[i], 4)) for i in ranked]
+
+    @staticmethod
+    def _matches(doc: Dict, constraints: Dict) -> bool:
+        price = doc['price_inr']
+        if constraints.get('max_price') is not None and (price is None or price > constraints['max_price']):
+            return False
+        if constraints.get('min_price') is not None and (price is None or price < constraints['min_price']):
+            return False
+        if constraints.get('bedrooms') is not None and doc['bedrooms'] != constraints['bedrooms']:
+            return False
+        if constraints.get('property_type') and (doc['property_type'] or '').lower() != constraints['property_type']:
+            return False
+        return True
+
+# Global instance, loaded on first lookup
+property_index = PropertyIndex()
@@ -0,0 +1,229 @@
+"""Read-only snapshots of the properties database.
+
+Writes go to the primary database as usual. The publisher copies it with
+the SQLite backup API into a standalone file (rollback journal, no WAL),
+records the catalog version it contains, and atomically renames it over
+PROPERTIES_SNAPSHOT_PATH. Workers started with that variable set open the
+snapshot with immutable=1 and a large mmap, so reads take no locks and
+share pages through the OS cache; connections keep reading the file they
+opened and switch to a new snapshot once it is published (see
+db.pool.ConnectionPool).
+
+Every worker runs a SnapshotPublisher, which republishes when the catalog
+or stored landmarks change, at most every SNAPSHOT_MIN_INTERVAL seconds. A
+lock file lets one process publish at a time; the others see the new
+version and skip. Reads therefore lag writes by up to the interval plus
+the copy time.
+
+Usage:
+    python -m db.snapshot [--force]    # publish now, e.g. before starting workers
+"""
+import argparse
+import asyncio
+import json
+import os
+import sqlite3
+import sys
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional
+from urllib.parse import quote
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+from db.query import pool, SNAPSHOT_PATH, SCHEMA_VERSION
+
+MIN_INTERVAL = float(os.environ.get('SNAPSHOT_MIN_INTERVAL', 2.0))
+# Rebuild the copy when more than this fraction of its pages are free
+VACUUM_FREE_RATIO = 0.25
+
+def catalog_version(conn: sqlite3.Connection) -> str:
+    """What a snapshot of this database would contain: change log position and stored landmarks"""
+    seq = conn.execute('SELECT MAX(seq) FROM property_changes').fetchone()[0] or 0
+    geo_rows, geo_updated = conn.execute('SELECT COUNT(*), MAX(computed_at) FROM property_geo').fetchone()
+    return f'{SCHEMA_VERSION}:{seq}:{geo_rows}:{geo_updated or ""}'
+
+def snapshot_info(path: Optional[str] = SNAPSHOT_PATH) -> Optional[Dict]:
+    """Version and publish time of the snapshot at path, or None when there is none"""
+    if not path or not os.path.exists(path):
+        return None
+    conn = sqlite3.connect(f'file:{quote(os.path.abspath(path))}?mode=ro&immutable=1', uri=True)
+    try:
+        row = conn.execute('SELECT version, seq, published_at FROM snapshot_info').fetchone()
+    except sqlite3.OperationalError:
+        row = None
+    finally:
+        conn.close()
+    if row is None:
+        return None
+    return {'version': row[0], 'seq': row[1], 'published_at': row[2], 'size': os.path.getsize(path)}
+
+@contextmanager
+def _publish_lock(path: str) -> Iterator[bool]:
+    # Yields False when another process is publishing
+    if fcntl is None:
+        yield True
+        return
+    with open(f'{path}.lock', 'a') as f:
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+def _fsync(path: str):
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+def publish_snapshot(path: Optional[str] = SNAPSHOT_PATH, force: bool = False) -> Optional[Dict]:
+    """Publish a snapshot of the primary unless the current one is up to date.
+
+    Returns the new snapshot's info, or None when nothing was published
+    (already current, or another process holds the lock).
+    """
+    if not path:
+        raise ValueError('No snapshot path configured (set PROPERTIES_SNAPSHOT_PATH)')
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with _publish_lock(path) as locked:
+        if not locked:
+            return None
+        current = snapshot_info(path)
+        source = pool.connect()
+        try:
+            if not force and current and current['version'] == catalog_version(source):
+                return None
+            started = time.perf_counter()
+            tmp = f'{path}.{os.getpid()}.tmp'
+            copy = sqlite3.connect(tmp)
+            try:
+                # One backup step copies every page inside a single read transaction
+                source.backup(copy)
+                copy.execute('PRAGMA journal_mode=DELETE')
+                version = catalog_version(copy)
+                seq = copy.execute('SELECT MAX(seq) FROM property_changes').fetchone()[0] or 0
+                copy.execute('DROP TABLE IF EXISTS snapshot_info')
+                copy.execute('CREATE TABLE snapshot_info (version TEXT, seq INTEGER, published_at REAL)')
+                copy.execute('INSERT INTO snapshot_info VALUES (?, ?, ?)', (version, seq, time.time()))
+                copy.commit()
+                free, pages = (copy.execute(f'PRAGMA {pragma}').fetchone()[0]
+                               for pragma in ('freelist_count', 'page_count'))
+                if pages and free / pages > VACUUM_FREE_RATIO:
+                    copy.execute('VACUUM')
+            except BaseException:
+                copy.close()
+                os.unlink(tmp)
+                raise
+            copy.close()
+            _fsync(tmp)
+            os.replace(tmp, path)
+            if hasattr(os, 'O_DIRECTORY'):
+                _fsync(os.path.dirname(os.path.abspath(path)))
+        finally:
+            source.close()
+    info = snapshot_info(path)
+    info['duration_ms'] = round((time.perf_counter() - started) * 1000, 1)
+    return info
+
+class SnapshotPublisher:
+    """Republishes the snapshot from this process when the primary changes.
+
+    Like db.changes.ChangeFeed it polls PRAGMA data_version, so a write by
+    any process is noticed; most commits (job bookkeeping, for instance)
+    leave the catalog version unchanged and publish nothing. Does nothing
+    unless snapshot mode is enabled.
+    """
+
+    def __init__(self, path: Optional[str] = SNAPSHOT_PATH, min_interval: float = MIN_INTERVAL,
+                 poll_interval: float = 0.5):
+        self.path = path
+        self.min_interval = min_interval
+        self.poll_interval = poll_interval
+        self.published = 0
+        self.failures = 0
+        self.last: Optional[Dict] = None
+        self._task: Optional[asyncio.Task] = None
+        self._conn = None
+
+    async def start(self):
+        if self.path is None or self._task is not None:
+            return
+        self._conn = pool.connect()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        self._conn.close()
+        self._conn = None
+
+    async def publish(self, force: bool = False) -> Optional[Dict]:
+        """Publish now if the snapshot is stale"""
+        info = await pool.run(publish_snapshot, self.path, force)
+        if info is not None:
+            self.published += 1
+            self.last = info
+            print(f"Published snapshot {info['version']} ({info['size']} bytes, {info['duration_ms']} ms)")
+        return info
+
+    async def _run(self):
+        data_version = None
+        while True:
+            delay = self.poll_interval
+            try:
+                version = self._conn.execute('PRAGMA data_version').fetchone()[0]
+                if version != data_version:
+                    data_version = version
+                    await self.publish()
+                    delay = self.min_interval
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.failures += 1
+                data_version = None
+                delay = self.min_interval
+                print(f"Error publishing snapshot: {e}")
+            await asyncio.sleep(delay)
+
+    def stats(self) -> Dict[str, float]:
+        """This process's publish counters and the current snapshot's age"""
+        current = snapshot_info(self.path) if self.path else None
+        return {
+            'published': self.published,
+            'failures': self.failures,
+            'seq': current['seq'] if current else 0,
+            'age_seconds': round(time.time() - current['published_at'], 3) if current else 0,
+            'size_bytes': current['size'] if current else 0,
+        }
+
+# Global instance, started by the app
+snapshot_publisher = SnapshotPublisher()
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description='Publish a read-only snapshot of the properties database')
+    parser.add_argument('--path', default=SNAPSHOT_PATH, help='Snapshot file (default: $PROPERTIES_SNAPSHOT_PATH)')
+    parser.add_argument('--force', action='store_true', help='Publish even if the snapshot is current')
+    args = parser.parse_args(argv)
+    if not args.path:
+        parser.error('no snapshot path: pass --path or set PROPERTIES_SNAPSHOT_PATH')
+    info = publish_snapshot(args.path, args.force)
+    print(json.dumps(info or snapshot_info(args.path), indent=2))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,245 @@
+"""In-process metrics in the Prometheus text exposition format.
+
+Counters and histograms are updated by the ASGI middleware, run_db (query
+functions) and the web search engine; point-in-time values such as cache
+hit counts and WebSocket queue depth are read from collectors when /metrics
+is scraped. Query functions slower than SLOW_QUERY_MS are also logged to the
+``realestate.slow_queries`` logger (and to SLOW_QUERY_LOG, if set).
+"""
+import bisect
+import logging
+import os
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Sequence, Tuple
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SLOW_QUERY_MS = float(os.environ.get('SLOW_QUERY_MS', 100))
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+log = logging.getLogger('realestate.metrics')
+slow_query_log = logging.getLogger('realestate.slow_queries')
+if os.environ.get('SLOW_QUERY_LOG'):
+    _handler = logging.FileHandler(os.environ['SLOW_QUERY_LOG'])
+    _handler.setFormatter(logging.Formatter('%(asctime)s %(message)s'))
+    slow_query_log.addHandler(_handler)
+    slow_query_log.setLevel(logging.INFO)
+
+# A sample is (name suffix, labels, value)
+Sample = Tuple[str, Dict[str, str], float]
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in labels.items()) + '}'
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+class Metric:
+    kind = 'untyped'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, '')) for name in self.labelnames)
+
+    def samples(self) -> List[Sample]:
+        raise NotImplementedError
+
+class Counter(Metric):
+    """Monotonic count; name it ``<something>_total``, the family and sample name alike"""
+    kind = 'counter'
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def samples(self) -> List[Sample]:
+        with self._lock:
+            return [('', dict(zip(self.labelnames, key)), value) for key, value in self._values.items()]
+
+class Gauge(Metric):
+    kind = 'gauge'
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels):
+        self.inc(-amount, **labels)
+
+    def samples(self) -> List[Sample]:
+        with self._lock:
+            return [('', dict(zip(self.labelnames, key)), value) for key, value in self._values.items()]
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # key -> (per-bucket counts, sum, count)
+        self._values: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            if index < len(self.buckets):
+                entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def samples(self) -> List[Sample]:
+        samples = []
+        with self._lock:
+            for key, (counts, total, count) in self._values.items():
+                labels = dict(zip(self.labelnames, key))
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets, counts):
+                    cumulative += bucket_count
+                    samples.append(('_bucket', dict(labels, le=_format_value(bound)), cumulative))
+                samples.append(('_bucket', dict(labels, le='+Inf'), count))
+                samples.append(('_sum', labels, total))
+                samples.append(('_count', labels, count))
+        return samples
+
+# A collector returns (name, kind, documentation, samples) families at scrape time
+Collector = Callable[[], Iterable[Tuple[str, str, str, List[Sample]]]]
+
+class Registry:
+    def __init__(self):
+        self._metrics: List[Metric] = []
+        self._collectors: List[Collector] = []
+
+    def register(self, metric: Metric) -> Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, collector: Collector):
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        """All metrics in Prometheus text format"""
+        lines = []
+        families = [(m.name, m.kind, m.documentation, m.samples()) for m in self._metrics]
+        for collector in self._collectors:
+            try:
+                families.extend(collector())
+            except Exception as e:
+                log.warning('metrics collector failed: %s', e)
+        for name, kind, documentation, samples in families:
+            lines.append(f'# HELP {name} {documentation}')
+            lines.append(f'# TYPE {name} {kind}')
+            for suffix, labels, value in samples:
+                lines.append(f'{name}{suffix}{_format_labels(labels)} {_format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+registry = Registry()
+
+http_request_duration = registry.register(Histogram(
+    'http_request_duration_seconds', 'HTTP request latency by route', ('method', 'route', 'status')))
+http_requests_in_flight = registry.register(Gauge(
+    'http_requests_in_flight', 'HTTP requests currently being handled'))
+db_query_duration = registry.register(Histogram(
+    'db_query_duration_seconds', 'Time spent in each query function on the DB executor', ('function',)))
+db_query_errors = registry.register(Counter(
+    'db_query_errors_total', 'Query functions that raised', ('function',)))
+web_search_upstream_duration = registry.register(Histogram(
+    'web_search_upstream_duration_seconds', 'Upstream web search latency', ('method', 'outcome'),
+    buckets=(0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)))
+admission_rejected = registry.register(Counter(
+    'admission_rejected_total', 'Requests turned away by admission control (rate_limited, queue_full, '
+    'queue_timeout, overloaded)', ('endpoint_class', 'reason')))
+admission_queue_wait = registry.register(Histogram(
+    'admission_queue_wait_seconds', 'Time admitted requests waited for a concurrency slot', ('endpoint_class',),
+    buckets=(0.001, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)))
+
+def observe_query(function: str, seconds: float, failed: bool = False):
+    """Record one query function call and log it if slower than SLOW_QUERY_MS"""
+    db_query_duration.observe(seconds, function=function)
+    if failed:
+        db_query_errors.inc(function=function)
+    if seconds * 1000 >= SLOW_QUERY_MS:
+        slow_query_log.warning('slow query function %s took %.1f ms', function, seconds * 1000)
+
+def route_label(scope) -> str:
+    """Route template for a request ('/property/{property_id}'), keeping label cardinality bounded"""
+    route = scope.get('route')
+    if route is not None and getattr(route, 'path', None):
+        return route.path
+    if scope.get('root_path'):
+        # Mounted apps such as /static
+        return scope['root_path']
+    return 'unmatched'
+
+class MetricsMiddleware:
+    """ASGI middleware timing every HTTP request by method, route template and status"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+        status = {'code': 500}
+
+        async def send_wrapper(message):
+            if message['type'] == 'http.response.start':
+                status['code'] = message['status']
+            await send(message)
+
+        started = time.perf_counter()
+        http_requests_in_flight.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            http_requests_in_flight.dec()
+            http_request_duration.observe(time.perf_counter() - started, method=scope['method'],
+                                          route=route_label(scope), status=str(status['code']))
+
+def stats_collector(name: str, documentation: str, stats: Callable[[], Dict[str, Dict[str, float]]],
+                    label: str = 'cache') -> Collector:
+    """Collector exposing nested stats dicts ({label_value: {stat: value}}) as one gauge family"""
+    def collect():
+        samples = []
+        for label_value, values in stats().items():
+            for stat, value in values.items():
+                if isinstance(value, (int, float)):
+                    samples.append(('', {label: label_value, 'stat': stat}, value))
+            lookups = values.get('hits', 0) + values.get('misses', 0)
+            if lookups:
+                samples.append(('', {label: label_value, 'stat': 'hit_ratio'}, values['hits'] / lookups))
+        return [(name, 'gauge', documentation, samples)]
+    return collect
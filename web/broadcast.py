@@ -0,0 +1,181 @@
+import asyncio
+import json
+from typing import Dict, FrozenSet, Iterable, Optional, Set
+
+from fastapi import WebSocket
+
+DEFAULT_TOPIC = 'properties'
+
+def property_topic(property_id: int) -> str:
+    """Topic carrying events for a single property"""
+    return f'property:{property_id}'
+
+class Subscriber:
+    """One WebSocket client: its topics, bounded outbound queue and sender task"""
+
+    def __init__(self, websocket: WebSocket, topics: Iterable[str], queue_size: int):
+        self.websocket = websocket
+        self.topics: Set[str] = set(topics)
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.sender: Optional[asyncio.Task] = None
+        self.closed = False
+
+class BroadcastHub:
+    """Topic-based WebSocket fan-out with per-connection backpressure.
+
+    publish() never awaits a client: each message is encoded once and put on
+    every matching subscriber's bounded queue, and a per-connection task
+    drains that queue. A subscriber whose queue is full, or whose send takes
+    longer than ``send_timeout``, is disconnected so it cannot hold up
+    anyone else. Messages published with a ``coalesce_key`` are held for
+    ``coalesce_window`` seconds and only the latest one per key is sent.
+    """
+
+    def __init__(self, queue_size: int = 64, send_timeout: float = 5.0,
+                 heartbeat_interval: float = 25.0, coalesce_window: float = 0.25):
+        self.queue_size = queue_size
+        self.send_timeout = send_timeout
+        self.heartbeat_interval = heartbeat_interval
+        self.coalesce_window = coalesce_window
+        self.subscribers: Set[Subscriber] = set()
+        self._pending: Dict[str, tuple] = {}
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._heartbeat_task: Optional[asyncio.Task] = None
+        self.published = 0
+        self.dropped = 0
+
+    async def connect(self, websocket: WebSocket, topics: Optional[Iterable[str]] = None) -> Subscriber:
+        """Accept the socket and register it for the given topics (default: all catalog events)"""
+        await websocket.accept()
+        subscriber = Subscriber(websocket, topics or (DEFAULT_TOPIC,), self.queue_size)
+        subscriber.sender = asyncio.create_task(self._sender(subscriber))
+        self.subscribers.add(subscriber)
+        self._ensure_heartbeat()
+        return subscriber
+
+    def disconnect(self, subscriber: Subscriber):
+        """Unregister a subscriber and stop its sender; safe to call more than once"""
+        if subscriber.closed:
+            return
+        subscriber.closed = True
+        self.subscribers.discard(subscriber)
+        if subscriber.sender is not None and subscriber.sender is not asyncio.current_task():
+            subscriber.sender.cancel()
+
+    def subscribe(self, subscriber: Subscriber, topics: Iterable[str]):
+        subscriber.topics.update(topics)
+
+    def unsubscribe(self, subscriber: Subscriber, topics: Iterable[str]):
+        subscriber.topics.difference_update(topics)
+
+    def send(self, subscriber: Subscriber, message) -> bool:
+        """Queue a message for one subscriber; returns False if it was dropped as too slow"""
+        text = message if isinstance(message, str) else json.dumps(message)
+        return self._enqueue(subscriber, text)
+
+    def publish(self, message: Dict, topics: Iterable[str] = (DEFAULT_TOPIC,),
+                coalesce_key: Optional[str] = None):
+        """Fan a message out to every subscriber of any of the topics without waiting on them"""
+        topics = frozenset(topics)
+        text = json.dumps(message)
+        if coalesce_key is None:
+            # Deliver anything held back first so clients see events in order
+            if self._pending:
+                self._flush_handle.cancel()
+                self._flush()
+            self._fanout(text, topics)
+            return
+        self._pending[coalesce_key] = (text, topics)
+        if self._flush_handle is None:
+            loop = asyncio.get_running_loop()
+            self._flush_handle = loop.call_later(self.coalesce_window, self._flush)
+
+    def handle_message(self, subscriber: Subscriber, data: str):
+        """Apply a client control message: subscribe, unsubscribe or ping"""
+        try:
+            message = json.loads(data)
+        except ValueError:
+            message = None
+        if not isinstance(message, dict) or 'action' not in message:
+            self.send(subscriber, f"Message received: {data}")
+            return
+        action = message['action']
+        topics = [str(t) for t in message.get('topics', [])]
+        if action == 'subscribe':
+            self.subscribe(subscriber, topics)
+        elif action == 'unsubscribe':
+            self.unsubscribe(subscriber, topics)
+        elif action == 'ping':
+            self.send(subscriber, {"type": "pong"})
+            return
+        else:
+            self.send(subscriber, {"type": "error", "message": f"Unknown action: {action}"})
+            return
+        self.send(subscriber, {"type": "subscribed", "topics": sorted(subscriber.topics)})
+
+    def stats(self) -> Dict[str, int]:
+        """Connection count, total queued messages and counters"""
+        return {
+            'connections': len(self.subscribers),
+            'queued': sum(s.queue.qsize() for s in self.subscribers),
+            'published': self.published,
+            'dropped': self.dropped,
+        }
+
+    def _flush(self):
+        self._flush_handle = None
+        pending, self._pending = self._pending, {}
+        for text, topics in pending.values():
+            self._fanout(text, topics)
+
+    def _fanout(self, text: str, topics: Optional[FrozenSet[str]]) -> int:
+        self.published += 1
+        delivered = 0
+        for subscriber in list(self.subscribers):
+            if topics is not None and subscriber.topics.isdisjoint(topics):
+                continue
+            if self._enqueue(subscriber, text):
+                delivered += 1
+        return delivered
+
+    def _enqueue(self, subscriber: Subscriber, text: str) -> bool:
+        if subscriber.closed:
+            return False
+        try:
+            subscriber.queue.put_nowait(text)
+            return True
+        except asyncio.QueueFull:
+            # Slow consumer: cut it loose rather than buffer without bound
+            self.dropped += 1
+            self.disconnect(subscriber)
+            asyncio.ensure_future(self._close(subscriber.websocket, code=1013))
+            return False
+
+    async def _sender(self, subscriber: Subscriber):
+        try:
+            while True:
+                text = await subscriber.queue.get()
+                await asyncio.wait_for(subscriber.websocket.send_text(text), self.send_timeout)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            # Send failed or timed out: the client is gone or too slow
+            self.disconnect(subscriber)
+            await self._close(subscriber.websocket, code=1011)
+
+    async def _close(self, websocket: WebSocket, code: int = 1000):
+        try:
+            await websocket.close(code=code)
+        except Exception:
+            pass
+
+    def _ensure_heartbeat(self):
+        if self.heartbeat_interval and (self._heartbeat_task is None or self._heartbeat_task.done()):
+            self._heartbeat_task = asyncio.create_task(self._heartbeat())
+
+    async def _heartbeat(self):
+        # Keeps idle connections alive through proxies and flushes out dead ones
+        text = json.dumps({"type": "heartbeat"})
+        while self.subscribers:
+            await asyncio.sleep(self.heartbeat_interval)
+            self._fanout(text, None)
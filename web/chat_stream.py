@@ -0,0 +1,160 @@
+"""Incremental chat replies for the SSE and WebSocket chat endpoints.
+
+A token source is a blocking generator ``(message, property_id=None) ->
+Iterator[str]``. ChatStreamer runs it on a worker thread and hands tokens to
+the event loop as they arrive; when the client goes away the consumer stops
+and the source is closed at its next token, which ends the upstream
+generation instead of letting it run to completion.
+"""
+import asyncio
+import json
+import os
+import re
+import threading
+import time
+from typing import AsyncIterator, Callable, Dict, Iterator, Optional
+
+TokenSource = Callable[..., Iterator[str]]
+
+_WORD_RE = re.compile(r'\S+\s*|\s+')
+
+def fake_token_stream(message: str, property_id: Optional[int] = None, delay: float = 0.02) -> Iterator[str]:
+    """Local stand-in for the LLM: a canned reply, one word at a time"""
+    reply = (f"You asked about \"{message}\"" + (f" for property {property_id}" if property_id else '') +
+             ". This is a locally generated reply streamed word by word for testing.")
+    for word in _WORD_RE.findall(reply):
+        time.sleep(delay)
+        yield word
+
+def chunked(respond: Callable[..., str]) -> TokenSource:
+    """Token source for a responder that only returns whole replies.
+
+    The reply is split into words after it completes, so clients get the
+    same protocol but no earlier first token.
+    """
+    def stream(message: str, property_id: Optional[int] = None) -> Iterator[str]:
+        yield from _WORD_RE.findall(respond(message, property_id=property_id) or '')
+    return stream
+
+def default_token_source() -> TokenSource:
+    """CHAT_STREAM_BACKEND=fake selects the local fake model; otherwise use the chat agent,
+    preferring its stream_chatbot_response generator when it has one"""
+    if os.environ.get('CHAT_STREAM_BACKEND') == 'fake':
+        return fake_token_stream
+    from chat import agent
+    stream = getattr(agent, 'stream_chatbot_response', None)
+    return stream or chunked(agent.get_chatbot_response)
+
+def sse_event(event: Dict) -> str:
+    """Encode one stream event as a Server-Sent Events frame"""
+    return f"event: {event['type']}\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
+
+class ChatStreamer:
+    """Streams token events from a blocking token source with cancellation and TTFT tracking.
+
+    stream() yields dicts: one ``start``, a ``token`` per chunk of text and a
+    final ``done`` (with ttft_ms, total_ms and tokens) or ``error``. Closing
+    the async generator early, e.g. on client disconnect, cancels the source.
+    """
+
+    def __init__(self, token_source: Optional[TokenSource] = None, token_timeout: float = 60.0):
+        self._token_source = token_source
+        self.token_timeout = token_timeout
+        self.started = 0
+        self.completed = 0
+        self.cancelled = 0
+        self.failed = 0
+        self._ttft_total = 0.0
+        self._ttft_count = 0
+        self.last_ttft_ms: Optional[float] = None
+
+    @property
+    def token_source(self) -> TokenSource:
+        if self._token_source is None:
+            self._token_source = default_token_source()
+        return self._token_source
+
+    async def stream(self, message: str, property_id: Optional[int] = None) -> AsyncIterator[Dict]:
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+        cancel = threading.Event()
+        source = self.token_source
+
+        def put(item):
+            try:
+                loop.call_soon_threadsafe(queue.put_nowait, item)
+            except RuntimeError:
+                # Event loop already closed
+                pass
+
+        def pump():
+            tokens = None
+            try:
+                tokens = source(message, property_id=property_id)
+                for token in tokens:
+                    if cancel.is_set():
+                        break
+                    put(('token', token))
+            except Exception as e:
+                put(('error', str(e)))
+            finally:
+                close = getattr(tokens, 'close', None)
+                if close is not None:
+                    close()
+                put(('end', None))
+
+        self.started += 1
+        started_at = time.perf_counter()
+        ttft_ms = None
+        count = 0
+        finished = False
+        loop.run_in_executor(None, pump)
+        try:
+            yield {"type": "start", "property_id": property_id}
+            while True:
+                kind, value = await asyncio.wait_for(queue.get(), self.token_timeout)
+                if kind == 'token':
+                    if ttft_ms is None:
+                        ttft_ms = (time.perf_counter() - started_at) * 1000
+                        self._ttft_total += ttft_ms
+                        self._ttft_count += 1
+                        self.last_ttft_ms = ttft_ms
+                    count += 1
+                    yield {"type": "token", "text": value}
+                elif kind == 'error':
+                    finished = True
+                    self.failed += 1
+                    yield {"type": "error", "message": value}
+                    return
+                else:
+                    break
+            finished = True
+            self.completed += 1
+            yield {
+                "type": "done",
+                "tokens": count,
+                "ttft_ms": round(ttft_ms, 1) if ttft_ms is not None else None,
+                "total_ms": round((time.perf_counter() - started_at) * 1000, 1)
+            }
+        except asyncio.TimeoutError:
+            finished = True
+            self.failed += 1
+            yield {"type": "error", "message": "Timed out waiting for the model"}
+        finally:
+            cancel.set()
+            if not finished:
+                self.cancelled += 1
+
+    def stats(self) -> Dict:
+        """Stream counters and time-to-first-token"""
+        return {
+            'started': self.started,
+            'completed': self.completed,
+            'cancelled': self.cancelled,
+            'failed': self.failed,
+            'avg_ttft_ms': round(self._ttft_total / self._ttft_count, 1) if self._ttft_count else None,
+            'last_ttft_ms': round(self.last_ttft_ms, 1) if self.last_ttft_ms is not None else None,
+        }
+
+# Global instance; the token source is resolved on first use
+chat_streamer = ChatStreamer()
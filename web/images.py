@@ -0,0 +1,416 @@
+"""Listing image proxy with an on-disk thumbnail cache.
+
+Pages link to /images/{property_id}/{size} instead of the listing's
+image_url. The first request fetches the original from its origin; resized
+WebP or JPEG variants are generated in a process pool (Pillow) and every
+file is stored content-addressed by the SHA-256 of the original, so listings
+sharing a picture share its files. The cache directory is bounded: when it
+grows past max_bytes the least recently served files are evicted.
+
+Without Pillow the original bytes are served unresized. Origins are only
+fetched from public addresses: image_url is user-supplied, so hosts that
+resolve to loopback, private or link-local addresses are refused, on the
+first request and on every redirect. The connection goes to the address that
+was checked (with the original Host header and TLS hostname), so a second DNS
+lookup cannot swap in another one.
+"""
+import asyncio
+import hashlib
+import io
+import ipaddress
+import multiprocessing
+import os
+import socket
+import sqlite3
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, NamedTuple, Optional, Tuple
+from urllib.parse import urljoin, urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+try:
+    from PIL import Image, ImageOps, features
+except ImportError:
+    Image = None
+
+DEFAULT_DIR = os.environ.get('IMAGE_CACHE_DIR', os.path.join(os.path.dirname(os.path.dirname(__file__)),
+                                                              'db', 'image_cache'))
+DEFAULT_MAX_BYTES = int(os.environ.get('IMAGE_CACHE_MAX_BYTES', 512 * 1024 * 1024))
+# Variant name -> maximum width in pixels; images are only ever scaled down
+SIZES = {'thumb': 160, 'card': 640, 'full': 1280}
+QUALITY = 80
+MAX_ORIGIN_BYTES = 20 * 1024 * 1024
+FETCH_TIMEOUT = 10.0
+MAX_REDIRECTS = 5
+# A failed origin fetch is not retried for this long; requests redirect to the origin meanwhile
+RETRY_AFTER = 300.0
+# Evict down to this fraction of max_bytes so eviction does not run on every write
+EVICT_TO = 0.9
+# Variants generated ahead of the first page view
+PREFETCH_VARIANTS = (('card', 'webp'), ('card', 'jpeg'))
+
+MEDIA_TYPES = {'webp': 'image/webp', 'jpeg': 'image/jpeg'}
+ORIGINAL_EXTENSIONS = {'image/jpeg': '.jpg', 'image/png': '.png', 'image/webp': '.webp', 'image/gif': '.gif'}
+
+class CachedImage(NamedTuple):
+    path: str
+    media_type: str
+    etag: str
+
+class ImageUnavailable(Exception):
+    """The origin image could not be fetched or decoded"""
+
+def image_version(image_url: Optional[str]) -> str:
+    """Short hash of an image_url; part of proxy links so they change with the image"""
+    return hashlib.sha1((image_url or '').encode()).hexdigest()[:10]
+
+def thumbnail_url(property_data: Dict, size: str = 'card') -> str:
+    """Proxy link for a listing's image (template global), or '' if it has none"""
+    image_url = property_data.get('image_url')
+    if not image_url:
+        return ''
+    return f"/images/{property_data['id']}/{size}?v={image_version(image_url)}"
+
+def preferred_format(accept: str) -> str:
+    """'webp' when the client accepts it and Pillow can write it, else 'jpeg'"""
+    if 'image/webp' in accept and Image is not None and features.check('webp'):
+        return 'webp'
+    return 'jpeg'
+
+def check_origin(url: str) -> str:
+    """Address to fetch a URL from; refuses URLs that are not http(s) or whose host
+    resolves to a non-public address"""
+    parsed = urlparse(url)
+    if parsed.scheme not in ('http', 'https') or not parsed.hostname:
+        raise ImageUnavailable(f'Unsupported image URL: {url}')
+    try:
+        port = parsed.port or (443 if parsed.scheme == 'https' else 80)
+        addresses = {info[4][0] for info in socket.getaddrinfo(parsed.hostname, port, proto=socket.IPPROTO_TCP)}
+    except (OSError, ValueError, UnicodeError) as e:
+        raise ImageUnavailable(f'Cannot resolve {parsed.hostname}: {e}')
+    for address in addresses:
+        ip = ipaddress.ip_address(address.split('%')[0])
+        if ip.version == 6 and ip.ipv4_mapped:
+            ip = ip.ipv4_mapped
+        if not ip.is_global or ip.is_multicast:
+            raise ImageUnavailable(f'Refusing to fetch {parsed.hostname}: {ip} is not a public address')
+    return sorted(addresses)[0]
+
+class _PinnedAdapter(HTTPAdapter):
+    """Connects to a checked address while TLS still verifies the URL's hostname"""
+
+    def __init__(self, hostname: str):
+        self.hostname = hostname
+        super().__init__()
+
+    def init_poolmanager(self, *args, **kwargs):
+        # Ignored for plain http
+        kwargs['server_hostname'] = kwargs['assert_hostname'] = self.hostname
+        super().init_poolmanager(*args, **kwargs)
+
+def _pinned_get(url: str, address: str) -> requests.Response:
+    parsed = urlparse(url)
+    host = f'[{address}]' if ':' in address else address
+    port = parsed.port or (443 if parsed.scheme == 'https' else 80)
+    session = requests.Session()
+    session.mount(f'{parsed.scheme}://', _PinnedAdapter(parsed.hostname))
+    try:
+        return session.get(parsed._replace(netloc=f'{host}:{port}').geturl(),
+                           headers={'Host': parsed.netloc.rpartition('@')[2]},
+                           timeout=FETCH_TIMEOUT, stream=True, allow_redirects=False)
+    finally:
+        # The response keeps its connection until it is closed
+        session.close()
+
+def fetch_image(url: str) -> Tuple[bytes, str]:
+    """Download an origin image; returns (body, content type), raises ImageUnavailable"""
+    try:
+        # Redirects are followed by hand so every hop is checked
+        for _ in range(MAX_REDIRECTS + 1):
+            with _pinned_get(url, check_origin(url)) as response:
+                if response.is_redirect:
+                    url = urljoin(url, response.headers['location'])
+                    continue
+                response.raise_for_status()
+                content_type = response.headers.get('content-type', '').split(';')[0].strip().lower()
+                if not content_type.startswith('image/'):
+                    raise ImageUnavailable(f'Not an image: {content_type or "unknown content type"}')
+                body = bytearray()
+                for chunk in response.iter_content(64 * 1024):
+                    body.extend(chunk)
+                    if len(body) > MAX_ORIGIN_BYTES:
+                        raise ImageUnavailable('Image too large')
+                return bytes(body), content_type
+    except requests.RequestException as e:
+        raise ImageUnavailable(str(e))
+    raise ImageUnavailable('Too many redirects')
+
+def make_thumbnail(data: bytes, width: int, fmt: str, quality: int = QUALITY) -> bytes:
+    """Scale an image down to at most ``width`` pixels wide and encode it (runs in worker processes)"""
+    with Image.open(io.BytesIO(data)) as image:
+        image = ImageOps.exif_transpose(image)
+        if image.width > width:
+            image = image.resize((width, max(1, round(image.height * width / image.width))), Image.LANCZOS)
+        if fmt == 'jpeg':
+            image = image.convert('RGB')
+        elif image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if 'A' in image.getbands() else 'RGB')
+        out = io.BytesIO()
+        image.save(out, format=fmt.upper(), quality=quality, **({'method': 4} if fmt == 'webp' else
+                                                                {'optimize': True, 'progressive': True}))
+    return out.getvalue()
+
+class ImageCache:
+    """Fetches origin images once and serves cached, resized variants from disk"""
+
+    def __init__(self, directory: str = DEFAULT_DIR, max_bytes: int = DEFAULT_MAX_BYTES,
+                 workers: Optional[int] = None, fetch=fetch_image):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.workers = workers or min(4, os.cpu_count() or 1)
+        self.fetch = fetch
+        self._executor: Optional[ProcessPoolExecutor] = None
+        # Concurrent requests for the same origin or variant share one task
+        self._inflight: Dict[Tuple, asyncio.Task] = {}
+        self._lock = threading.Lock()
+        self._size: Optional[int] = None
+        self.hits = 0
+        self.misses = 0
+        self.fetches = 0
+        self.fetch_failures = 0
+        self.generated = 0
+        self.evictions = 0
+        self._index_path = os.path.join(directory, 'index.db')
+        self._index_ready = False
+
+    # Index of origin URLs: url -> digest of the fetched bytes, or the last failure
+
+    def _index(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self._index_path)
+        if not self._index_ready:
+            conn.execute('''CREATE TABLE IF NOT EXISTS image_sources (
+                url TEXT PRIMARY KEY,
+                digest TEXT,
+                content_type TEXT,
+                error TEXT,
+                fetched_at REAL NOT NULL
+            )''')
+            self._index_ready = True
+        return conn
+
+    def _lookup(self, url: str) -> Optional[Tuple]:
+        os.makedirs(self.directory, exist_ok=True)
+        with self._index() as conn:
+            return conn.execute('SELECT digest, content_type, error, fetched_at FROM image_sources WHERE url = ?',
+                                (url,)).fetchone()
+
+    def _record(self, url: str, digest: Optional[str], content_type: Optional[str], error: Optional[str]):
+        with self._index() as conn:
+            conn.execute('INSERT OR REPLACE INTO image_sources VALUES (?, ?, ?, ?, ?)',
+                         (url, digest, content_type, error, time.time()))
+
+    # Content-addressed files
+
+    def _original_path(self, digest: str, content_type: str) -> str:
+        return os.path.join(self.directory, 'originals', digest[:2],
+                            digest + ORIGINAL_EXTENSIONS.get(content_type, '.img'))
+
+    def _variant_path(self, digest: str, width: int, fmt: str) -> str:
+        return os.path.join(self.directory, 'variants', digest[:2], f'{digest}-{width}-q{QUALITY}.{fmt}')
+
+    def _write(self, path: str, data: bytes):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        partial = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(partial, 'wb') as f:
+            f.write(data)
+        os.replace(partial, path)
+        with self._lock:
+            if self._size is not None:
+                self._size += len(data)
+        if self.current_size() > self.max_bytes:
+            self._evict()
+
+    @staticmethod
+    def _touch(path: str) -> bool:
+        # mtime doubles as the last-served time for LRU eviction
+        try:
+            os.utime(path)
+            return True
+        except FileNotFoundError:
+            return False
+
+    def _touch_variant(self, path: str, original_path: str) -> bool:
+        # Serving a variant keeps its original too, so new sizes need no refetch
+        if not self._touch(path):
+            return False
+        self._touch(original_path)
+        return True
+
+    def _files(self):
+        for subdir in ('originals', 'variants'):
+            for root, _, names in os.walk(os.path.join(self.directory, subdir)):
+                for name in names:
+                    path = os.path.join(root, name)
+                    try:
+                        yield path, os.stat(path)
+                    except FileNotFoundError:
+                        continue
+
+    def current_size(self) -> int:
+        """Bytes of cached files (scanned once, then tracked)"""
+        with self._lock:
+            if self._size is None:
+                self._size = sum(stat.st_size for _, stat in self._files())
+            return self._size
+
+    def _evict(self):
+        """Delete least recently served files until the cache is under EVICT_TO of max_bytes"""
+        files = sorted(self._files(), key=lambda item: item[1].st_mtime)
+        total = sum(stat.st_size for _, stat in files)
+        target = self.max_bytes * EVICT_TO
+        for path, stat in files:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                continue
+            total -= stat.st_size
+            self.evictions += 1
+        with self._lock:
+            self._size = total
+
+    # Fetching and resizing
+
+    def _executor_or_start(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # spawn: forking a process that holds SQLite connections and threads is unsafe
+            self._executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context('spawn'))
+        return self._executor
+
+    async def _once(self, key: Tuple, make):
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.create_task(make())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._done(key, t))
+        # shield: a caller being cancelled must not cancel the work others are waiting on
+        return await asyncio.shield(task)
+
+    def _done(self, key: Tuple, task: asyncio.Task):
+        self._inflight.pop(key, None)
+        if not task.cancelled():
+            task.exception()  # mark retrieved in case every waiter was cancelled
+
+    def _load_original(self, url: str) -> Tuple[str, str]:
+        """(digest, content type) of a cached origin image, fetching it if needed"""
+        entry = self._lookup(url)
+        if entry is not None:
+            digest, content_type, error, fetched_at = entry
+            if digest and self._touch(self._original_path(digest, content_type)):
+                return digest, content_type
+            if error and fetched_at + RETRY_AFTER > time.time():
+                raise ImageUnavailable(error)
+        self.fetches += 1
+        try:
+            data, content_type = self.fetch(url)
+        except ImageUnavailable as e:
+            self.fetch_failures += 1
+            self._record(url, None, None, str(e))
+            raise
+        digest = hashlib.sha256(data).hexdigest()
+        path = self._original_path(digest, content_type)
+        if not os.path.exists(path):
+            self._write(path, data)
+        self._record(url, digest, content_type, None)
+        return digest, content_type
+
+    async def original(self, url: str) -> Tuple[str, str]:
+        return await self._once(('original', url), lambda: asyncio.to_thread(self._load_original, url))
+
+    def _cached_variant(self, url: str, width: int, fmt: str) -> Optional[CachedImage]:
+        # A variant already on disk is served even if its original has been evicted
+        entry = self._lookup(url)
+        if entry is None or not entry[0]:
+            return None
+        digest, content_type = entry[:2]
+        path = self._variant_path(digest, width, fmt)
+        if not self._touch_variant(path, self._original_path(digest, content_type)):
+            return None
+        return CachedImage(path, MEDIA_TYPES[fmt], f'"{digest[:20]}-{width}-{fmt}"')
+
+    async def variant(self, url: str, size: str, fmt: str) -> CachedImage:
+        """Cached image for a listing URL at a named size; raises ImageUnavailable"""
+        if Image is None:
+            # No Pillow: serve the original as-is
+            digest, content_type = await self.original(url)
+            self.hits += 1
+            return CachedImage(self._original_path(digest, content_type), content_type, f'"{digest[:20]}"')
+        width = SIZES[size]
+        image = await asyncio.to_thread(self._cached_variant, url, width, fmt)
+        if image is not None:
+            self.hits += 1
+            return image
+        digest, content_type = await self.original(url)
+        original_path = self._original_path(digest, content_type)
+        path = self._variant_path(digest, width, fmt)
+        image = CachedImage(path, MEDIA_TYPES[fmt], f'"{digest[:20]}-{width}-{fmt}"')
+        if await asyncio.to_thread(self._touch_variant, path, original_path):
+            self.hits += 1
+            return image
+        self.misses += 1
+        await self._once(('variant', path), lambda: self._generate(original_path, path, width, fmt))
+        return image
+
+    async def _generate(self, original_path: str, path: str, width: int, fmt: str):
+        data = await asyncio.to_thread(_read, original_path)
+        loop = asyncio.get_running_loop()
+        try:
+            body = await loop.run_in_executor(self._executor_or_start(), make_thumbnail, data, width, fmt)
+        except (OSError, ValueError, Image.DecompressionBombError) as e:
+            # Pillow could not decode the original, or it is implausibly large
+            raise ImageUnavailable(str(e))
+        except BrokenProcessPool as e:
+            # A worker died (e.g. killed while decoding); start a fresh pool next time
+            self.close()
+            raise ImageUnavailable(f'Thumbnail worker failed: {e}')
+        await asyncio.to_thread(self._write, path, body)
+        self.generated += 1
+
+    async def prefetch(self, url: Optional[str]):
+        """Fetch a listing image and generate its card variants ahead of the first page view;
+        raises ImageUnavailable"""
+        if not url:
+            return
+        for size, fmt in PREFETCH_VARIANTS:
+            if fmt == 'webp' and preferred_format('image/webp') != 'webp':
+                continue
+            await self.variant(url, size, fmt)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'fetches': self.fetches,
+            'fetch_failures': self.fetch_failures,
+            'generated': self.generated,
+            'evictions': self.evictions,
+            'bytes': self._size or 0,
+            'max_bytes': self.max_bytes,
+        }
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+def _read(path: str) -> bytes:
+    with open(path, 'rb') as f:
+        return f.read()
+
+# Global instance
+image_cache = ImageCache()
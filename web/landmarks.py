@@ -0,0 +1,122 @@
+import heapq
+import json
+import math
+import os
+import re
+from collections import defaultdict
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+DEFAULT_DATASET = os.path.join(os.path.dirname(__file__), 'data', 'landmarks.json')
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEGREE_LAT = 111.32
+
+class Landmark(NamedTuple):
+    name: str
+    category: str
+    lat: float
+    lon: float
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Great-circle distance between two points in kilometres"""
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    dp, dl = p2 - p1, math.radians(lon2 - lon1)
+    a = math.sin(dp / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dl / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+class GridIndex:
+    """Uniform lat/lon grid: a radius query only inspects the cells its bounding box covers"""
+
+    def __init__(self, points: Iterable[Landmark], cell_deg: float = 0.01):
+        self.cell_deg = cell_deg
+        self._cells: Dict[Tuple[int, int], List[Landmark]] = defaultdict(list)
+        self.size = 0
+        for point in points:
+            self._cells[self._cell(point.lat, point.lon)].append(point)
+            self.size += 1
+
+    def _cell(self, lat: float, lon: float) -> Tuple[int, int]:
+        return int(math.floor(lat / self.cell_deg)), int(math.floor(lon / self.cell_deg))
+
+    def nearest(self, lat: float, lon: float, k: int = 5, radius_km: float = 5.0) -> List[Tuple[float, Landmark]]:
+        """Up to k (distance_km, landmark) pairs within radius_km, nearest first"""
+        dlat = radius_km / KM_PER_DEGREE_LAT
+        dlon = radius_km / (KM_PER_DEGREE_LAT * max(math.cos(math.radians(lat)), 1e-6))
+        lat0, lon0 = self._cell(lat - dlat, lon - dlon)
+        lat1, lon1 = self._cell(lat + dlat, lon + dlon)
+        candidates = []
+        for i in range(lat0, lat1 + 1):
+            for j in range(lon0, lon1 + 1):
+                for point in self._cells.get((i, j), ()):
+                    distance = haversine_km(lat, lon, point.lat, point.lon)
+                    if distance <= radius_km:
+                        candidates.append((distance, point))
+        return heapq.nsmallest(k, candidates, key=lambda c: c[0])
+
+class LandmarkStore:
+    """Landmarks and locality centroids with a spatial index per category.
+
+    Property locations are geocoded by locality name (the first known
+    locality mentioned in the address), then answered with k-nearest
+    queries against the grid index.
+    """
+
+    def __init__(self, localities: Dict[str, Tuple[float, float]], landmarks: Iterable[Landmark]):
+        self.localities = {name.lower(): (lat, lon) for name, (lat, lon) in localities.items()}
+        landmarks = list(landmarks)
+        self.landmarks = landmarks
+        self._index = GridIndex(landmarks)
+        by_category = defaultdict(list)
+        for landmark in landmarks:
+            by_category[landmark.category].append(landmark)
+        self._category_index = {category: GridIndex(points) for category, points in by_category.items()}
+        names = sorted(self.localities, key=len, reverse=True)
+        self._locality_re = re.compile('|'.join(re.escape(n) for n in names), re.IGNORECASE) if names else None
+
+    @classmethod
+    def load(cls, path: str = DEFAULT_DATASET) -> 'LandmarkStore':
+        with open(path, encoding='utf-8') as f:
+            data = json.load(f)
+        landmarks = [Landmark(l['name'], l['category'], float(l['lat']), float(l['lon'])) for l in data['landmarks']]
+        return cls(data.get('localities', {}), landmarks)
+
+    @property
+    def categories(self) -> List[str]:
+        return sorted(self._category_index)
+
+    def locality(self, location: Optional[str]) -> Optional[str]:
+        """Lowercased name of the first known locality in a free-text location"""
+        if not location or self._locality_re is None:
+            return None
+        match = self._locality_re.search(location)
+        return match.group(0).lower() if match else None
+
+    def geocode(self, location: Optional[str]) -> Optional[Tuple[float, float]]:
+        """Coordinates of the first known locality in a free-text location"""
+        locality = self.locality(location)
+        return self.localities[locality] if locality else None
+
+    def nearest(self, lat: float, lon: float, k: int = 5, radius_km: float = 5.0,
+                category: Optional[str] = None) -> List[Dict]:
+        """k nearest landmarks within radius_km, optionally of one category"""
+        index = self._index if category is None else self._category_index.get(category)
+        if index is None:
+            return []
+        return [{
+            'name': landmark.name,
+            'category': landmark.category,
+            'distance_km': round(distance, 2)
+        } for distance, landmark in index.nearest(lat, lon, k, radius_km)]
+
+    def summarize(self, location: Optional[str], per_category: int = 3, radius_km: float = 5.0) -> Dict:
+        """Coordinates and nearest landmarks per category for a location, as stored per property"""
+        coords = self.geocode(location)
+        if coords is None:
+            return {'latitude': None, 'longitude': None, 'landmarks': []}
+        landmarks = []
+        for category in self.categories:
+            landmarks.extend(self.nearest(coords[0], coords[1], per_category, radius_km, category))
+        landmarks.sort(key=lambda l: l['distance_km'])
+        return {'latitude': coords[0], 'longitude': coords[1], 'landmarks': landmarks}
+
+# Global instance, loaded once per process
+landmark_store = LandmarkStore.load()
@@ -1,12 +1,30 @@
-# Simulated Google Places API for PoC
-
-def get_nearby_landmarks(location: str):
-    # In a real app, call Google Places API here
-    if 'Gachibowli' in location:
-        return ['Oakridge International School', 'AIG Hospital', 'Inorbit Mall']
-    elif 'Miyapur' in location:
-        return ['Kennedy High School', 'SLG Hospital', 'Miyapur Metro Station']
-    elif 'Kondapur' in location:
-        return ['Chirec International School', 'KIMS Hospital', 'Botanical Garden']
-    else:
-        return ['No landmarks found'] 
\ No newline at end of file
+# Nearby landmarks from the local landmark index (web/landmarks.py)
+from typing import Dict, List, Optional
+
+from db.query import get_property_by_id, get_property_geo, save_property_geo
+from web.landmarks import landmark_store
+
+def get_nearby_landmarks(location: str, k: int = 3, radius_km: float = 5.0) -> List[str]:
+    """Names of the landmarks nearest to a location"""
+    coords = landmark_store.geocode(location)
+    if coords is None:
+        return ['No landmarks found']
+    nearest = landmark_store.nearest(coords[0], coords[1], k=k, radius_km=radius_km)
+    return [landmark['name'] for landmark in nearest] or ['No landmarks found']
+
+def refresh_property_landmarks(property_id: int, property_data: Optional[Dict] = None) -> Optional[Dict]:
+    """Geocode a property, compute its nearby landmarks and store them"""
+    property_data = property_data or get_property_by_id(property_id)
+    if not property_data:
+        return None
+    summary = landmark_store.summarize(property_data['location'])
+    save_property_geo(property_id, property_data['location'], summary['latitude'],
+                      summary['longitude'], summary['landmarks'])
+    return dict(summary, location=property_data['location'])
+
+def get_property_landmarks(property_data: Dict) -> List[Dict]:
+    """Stored landmarks for a property, recomputed if missing or its location changed"""
+    geo = get_property_geo(property_data['id'])
+    if geo is None or geo['location'] != property_data['location']:
+        geo = refresh_property_landmarks(property_data['id'], property_data)
+    return geo['landmarks'] if geo else []
@@ -0,0 +1,59 @@
+"""Cached HTML fragments and conditional GET support for the server-rendered pages"""
+import glob
+import hashlib
+import os
+from typing import Dict, List
+
+from jinja2 import Environment
+from markupsafe import Markup
+from starlette.requests import Request
+
+from db.query import property_cache
+
+TEMPLATE_DIR = os.path.dirname(__file__)
+CARD_TEMPLATE = 'property_card.html'
+
+def _template_version() -> str:
+    # Changes when any template is edited, so a deploy invalidates page ETags
+    digest = hashlib.sha1()
+    for path in sorted(glob.glob(os.path.join(TEMPLATE_DIR, '*.html'))):
+        stat = os.stat(path)
+        digest.update(f'{os.path.basename(path)}:{stat.st_size}:{stat.st_mtime_ns}'.encode())
+    return digest.hexdigest()[:12]
+
+TEMPLATE_VERSION = _template_version()
+
+def render_cards(env: Environment, properties: List[Dict]) -> List[Markup]:
+    """Rendered listing cards, reusing each property's cached fragment.
+
+    A fragment is cached per property id together with the data it was
+    rendered from, so it is only reused for identical input; writes to the
+    property also drop it (db.query.invalidate_cache).
+    """
+    template = env.get_template(CARD_TEMPLATE)
+    cards = []
+    for property_data in properties:
+        key = ('card', property_data['id'])
+        fingerprint = tuple(sorted(property_data.items()))
+        cached = property_cache.get(key)
+        if cached is not None and cached[0] == fingerprint:
+            cards.append(cached[1])
+            continue
+        html = Markup(template.render(property=property_data))
+        property_cache.set(key, (fingerprint, html))
+        cards.append(html)
+    return cards
+
+def page_etag(catalog_version: int, *parts) -> str:
+    """Weak ETag for a page rendered from the catalog at the given change-log version"""
+    digest = hashlib.sha1(repr((TEMPLATE_VERSION, catalog_version) + parts).encode()).hexdigest()[:20]
+    return f'W/"{digest}"'
+
+def not_modified(request: Request, etag: str) -> bool:
+    """Whether the request's If-None-Match already names this ETag"""
+    header = request.headers.get('if-none-match')
+    if not header:
+        return False
+    tags = {tag.strip() for tag in header.split(',')}
+    # Weak comparison: W/"x" and "x" are the same validator
+    return '*' in tags or etag in tags or etag[2:] in tags
@@ -0,0 +1,113 @@
+"""Static files served gzip- or brotli-compressed when the client accepts it.
+
+A ``<file>.br`` or ``<file>.gz`` next to the original is used as-is when it
+is at least as new; otherwise the file is compressed once at maximum level
+and kept in a bounded in-memory cache keyed by path, size and mtime.
+"""
+import gzip
+import os
+import threading
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+import anyio
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import StaticFiles
+from starlette.types import Scope
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_TYPES = ('text/', 'application/json', 'application/javascript', 'application/xml',
+                      'image/svg+xml')
+# Below this size compression saves less than the header costs
+MIN_COMPRESS_SIZE = 1024
+SIDECAR_EXTENSIONS = {'br': '.br', 'gzip': '.gz'}
+
+def accepted_encoding(accept_encoding: str) -> Optional[str]:
+    """Best supported content coding in an Accept-Encoding header: 'br', 'gzip' or None"""
+    accepted = {}
+    for part in accept_encoding.split(','):
+        coding, _, params = part.strip().partition(';')
+        quality = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[coding.strip().lower()] = quality
+    for coding in ('br', 'gzip'):
+        if coding == 'br' and brotli is None:
+            continue
+        if accepted.get(coding, accepted.get('*', 0.0)) > 0:
+            return coding
+    return None
+
+def compress(data: bytes, encoding: str) -> bytes:
+    if encoding == 'br':
+        return brotli.compress(data, quality=11)
+    return gzip.compress(data, compresslevel=9, mtime=0)
+
+class PrecompressedStaticFiles(StaticFiles):
+    """StaticFiles that negotiates Content-Encoding for text assets"""
+
+    def __init__(self, *args, max_cache_bytes: int = 32 * 1024 * 1024, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.max_cache_bytes = max_cache_bytes
+        self._cache: 'OrderedDict[Tuple, bytes]' = OrderedDict()
+        self._cache_bytes = 0
+        self._lock = threading.Lock()
+
+    async def get_response(self, path: str, scope: Scope) -> Response:
+        response = await super().get_response(path, scope)
+        if response.status_code != 200 or not isinstance(response, FileResponse) or response.stat_result is None:
+            return response
+        content_type = response.headers.get('content-type', '')
+        if not content_type.startswith(COMPRESSIBLE_TYPES) or response.stat_result.st_size < MIN_COMPRESS_SIZE:
+            return response
+        response.headers['vary'] = 'Accept-Encoding'
+        encoding = accepted_encoding(Headers(scope=scope).get('accept-encoding', ''))
+        if encoding is None:
+            return response
+        body = await anyio.to_thread.run_sync(self._compressed, str(response.path), response.stat_result, encoding)
+        headers = {k: v for k, v in response.headers.items() if k not in ('content-length', 'content-type')}
+        headers['content-encoding'] = encoding
+        headers['content-length'] = str(len(body))
+        # Same ETag as the identity body: the representation varies by Accept-Encoding
+        return Response(content=body if scope['method'] == 'GET' else b'', headers=headers,
+                        media_type=content_type)
+
+    def _compressed(self, full_path: str, stat_result, encoding: str) -> bytes:
+        key = (full_path, stat_result.st_size, stat_result.st_mtime_ns, encoding)
+        with self._lock:
+            body = self._cache.get(key)
+            if body is not None:
+                self._cache.move_to_end(key)
+                return body
+        body = self._read_sidecar(full_path, stat_result, encoding)
+        if body is None:
+            with open(full_path, 'rb') as f:
+                body = compress(f.read(), encoding)
+        with self._lock:
+            if key not in self._cache:
+                self._cache[key] = body
+                self._cache_bytes += len(body)
+            while self._cache_bytes > self.max_cache_bytes and len(self._cache) > 1:
+                _, evicted = self._cache.popitem(last=False)
+                self._cache_bytes -= len(evicted)
+        return body
+
+    @staticmethod
+    def _read_sidecar(full_path: str, stat_result, encoding: str) -> Optional[bytes]:
+        sidecar = full_path + SIDECAR_EXTENSIONS[encoding]
+        try:
+            with open(sidecar, 'rb') as f:
+                if os.fstat(f.fileno()).st_mtime < stat_result.st_mtime:
+                    return None
+                return f.read()
+        except OSError:
+            return None
@@ -0,0 +1,204 @@
+"""Batch property valuation fitted on the catalog's own prices.
+
+Price per sqft is modelled in log space as a global level plus a locality
+effect and a property-type effect, each estimated with NumPy group sums
+(np.bincount) and shrunk towards zero for groups with few listings. A whole
+catalog, or an uploaded list, is priced with a handful of array operations
+instead of one Python call per listing.
+"""
+from typing import Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+from db.query import pool, listing_cache, parse_price_inr
+from web.landmarks import landmark_store
+
+# Fallback when the catalog has no usable prices (the old fixed multipliers)
+BASE_PRICE_PER_SQFT = 5000.0
+DEFAULT_TYPE_MULTIPLIERS = {'villa': 1.3}
+DEFAULT_LOCATION_MULTIPLIER = 1.2
+# Pseudo-count pulling small groups towards the overall average
+SHRINKAGE = 3.0
+FIT_ITERATIONS = 5
+# Asking price more than this fraction above/below the estimate gets flagged
+FLAG_THRESHOLD = 0.15
+MAX_BATCH_SIZE = 10000
+
+def locality_key(location: Optional[str]) -> str:
+    """Locality a listing is grouped under: a known locality name, else the first address part"""
+    locality = landmark_store.locality(location)
+    if locality:
+        return locality
+    return (location or '').split(',')[0].strip().lower()
+
+def format_price_inr(amount: float) -> str:
+    """Format rupees the way listings do: Crores from 1 crore up, Lakhs below"""
+    if amount > 10000000:
+        return f"₹{amount/10000000:.1f} Crores"
+    return f"₹{amount/100000:.1f} Lakhs"
+
+def _group(keys: Sequence[str], index: Dict[str, int]) -> np.ndarray:
+    return np.fromiter((index.get(k, -1) for k in keys), dtype=np.int64, count=len(keys))
+
+def _to_float(values: Iterable) -> np.ndarray:
+    try:
+        return np.array([np.nan if v is None or v == '' else float(v) for v in values], dtype=np.float64)
+    except (TypeError, OverflowError) as e:
+        raise ValueError(f"Expected a number: {e}")
+
+class ValuationModel:
+    """Fitted log price-per-sqft: level + locality effect + type effect"""
+
+    def __init__(self, level: float, localities: Dict[str, int], locality_effects: np.ndarray,
+                 locality_counts: np.ndarray, types: Dict[str, int], type_effects: np.ndarray,
+                 sample_size: int):
+        self.level = level
+        self.localities = localities
+        self.locality_effects = locality_effects
+        self.locality_counts = locality_counts
+        self.types = types
+        self.type_effects = type_effects
+        self.sample_size = sample_size
+
+    @classmethod
+    def fit(cls, locations: Sequence[Optional[str]], property_types: Sequence[Optional[str]],
+            area_sqft: Sequence, price_inr: Sequence) -> 'ValuationModel':
+        """Fit on parallel columns; rows without a positive price and area are ignored"""
+        area = _to_float(area_sqft)
+        price = _to_float(price_inr)
+        with np.errstate(invalid='ignore'):
+            valid = (area > 0) & (price > 0)
+        locality_keys = [locality_key(l) for l in locations]
+        type_keys = [(t or '').lower() for t in property_types]
+        if not valid.any():
+            return cls.default(locality_keys, type_keys)
+
+        keep = np.flatnonzero(valid)
+        localities = {k: i for i, k in enumerate(sorted({locality_keys[i] for i in keep}))}
+        types = {k: i for i, k in enumerate(sorted({type_keys[i] for i in keep}))}
+        loc = _group([locality_keys[i] for i in keep], localities)
+        typ = _group([type_keys[i] for i in keep], types)
+        y = np.log(price[keep] / area[keep])
+
+        level = float(y.mean())
+        loc_counts = np.bincount(loc, minlength=len(localities)).astype(np.float64)
+        typ_counts = np.bincount(typ, minlength=len(types)).astype(np.float64)
+        loc_effects = np.zeros(len(localities))
+        typ_effects = np.zeros(len(types))
+        # Backfitting: each pass re-estimates one effect from the other's residuals
+        for _ in range(FIT_ITERATIONS):
+            residual = y - level - typ_effects[typ]
+            loc_effects = np.bincount(loc, residual, len(localities)) / (loc_counts + SHRINKAGE)
+            residual = y - level - loc_effects[loc]
+            typ_effects = np.bincount(typ, residual, len(types)) / (typ_counts + SHRINKAGE)
+        return cls(level, localities, loc_effects, loc_counts.astype(np.int64), types, typ_effects, len(keep))
+
+    @classmethod
+    def default(cls, locality_keys: Iterable[str] = (), type_keys: Iterable[str] = ()) -> 'ValuationModel':
+        """Model reproducing the fixed ₹5000/sqft rule for an empty catalog"""
+        localities = {k: i for i, k in enumerate(sorted(set(locality_keys)))}
+        types = {k: i for i, k in enumerate(sorted(set(type_keys) | set(DEFAULT_TYPE_MULTIPLIERS)))}
+        type_effects = np.array([np.log(DEFAULT_TYPE_MULTIPLIERS.get(t, 1.0)) for t in types])
+        return cls(float(np.log(BASE_PRICE_PER_SQFT * DEFAULT_LOCATION_MULTIPLIER)), localities,
+                   np.zeros(len(localities)), np.zeros(len(localities), dtype=np.int64),
+                   types, type_effects, 0)
+
+    def estimate(self, locations: Sequence[Optional[str]], property_types: Sequence[Optional[str]],
+                 area_sqft: Sequence) -> np.ndarray:
+        """Estimated prices in rupees (NaN where the area is unknown)"""
+        area = _to_float(area_sqft)
+        loc = _group([locality_key(l) for l in locations], self.localities)
+        typ = _group([(t or '').lower() for t in property_types], self.types)
+        # Unseen localities and types fall back to the overall average
+        loc_effect = np.where(loc >= 0, self.locality_effects[loc] if len(self.localities) else 0.0, 0.0)
+        typ_effect = np.where(typ >= 0, self.type_effects[typ] if len(self.types) else 0.0, 0.0)
+        with np.errstate(invalid='ignore', over='ignore'):
+            return np.where(area > 0, np.exp(self.level + loc_effect + typ_effect) * area, np.nan)
+
+    def value(self, properties: List[Dict]) -> List[Dict]:
+        """Estimate, price ratio and over/under-priced flag for each property dict.
+
+        Each dict needs location, property_type and area_sqft, and price_inr
+        or price for the flag; results are in input order.
+        """
+        estimates = self.estimate([p.get('location') for p in properties],
+                                  [p.get('property_type') for p in properties],
+                                  [p.get('area_sqft') for p in properties])
+        asking = _to_float(p['price_inr'] if p.get('price_inr') is not None else parse_price_inr(p.get('price'))
+                           for p in properties)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            ratio = asking / estimates
+            flags = np.select([ratio > 1 + FLAG_THRESHOLD, ratio < 1 - FLAG_THRESHOLD, ratio > 0],
+                              ['overpriced', 'underpriced', 'fair'], default='')
+        results = []
+        for i, p in enumerate(properties):
+            known = bool(np.isfinite(estimates[i]))
+            results.append({
+                'id': p.get('id'),
+                'locality': locality_key(p.get('location')),
+                'estimated_price_inr': int(round(estimates[i])) if known else None,
+                'estimated_price': format_price_inr(estimates[i]) if known else None,
+                'price_ratio': round(float(ratio[i]), 3) if np.isfinite(ratio[i]) else None,
+                'valuation': str(flags[i]) or None
+            })
+        return results
+
+    def locality_summary(self) -> List[Dict]:
+        """Fitted price per sqft (for an average property type) and listing count per locality"""
+        return [{
+            'locality': locality,
+            'price_per_sqft': int(round(np.exp(self.level + self.locality_effects[i]))),
+            'listings': int(self.locality_counts[i])
+        } for locality, i in self.localities.items()]
+
+def _read_catalog() -> List[Dict]:
+    with pool.reader() as conn:
+        rows = conn.execute('''SELECT id, name, location, property_type, area_sqft, price_inr
+                               FROM properties ORDER BY id''').fetchall()
+    return [{'id': r[0], 'name': r[1], 'location': r[2], 'property_type': r[3],
+             'area_sqft': r[4], 'price_inr': r[5]} for r in rows]
+
+def _fit_catalog() -> ValuationModel:
+    catalog = _read_catalog()
+    return ValuationModel.fit([p['location'] for p in catalog], [p['property_type'] for p in catalog],
+                              [p['area_sqft'] for p in catalog], [p['price_inr'] for p in catalog])
+
+def get_valuation_model() -> ValuationModel:
+    """Model fitted on the current catalog; refitted after any write clears the listing cache"""
+    return listing_cache.get_or_set(('valuation_model',), _fit_catalog)
+
+def value_catalog() -> List[Dict]:
+    """Valuation of every listing, cached until the next write"""
+    def build():
+        catalog = _read_catalog()
+        valuations = get_valuation_model().value(catalog)
+        for valuation, p in zip(valuations, catalog):
+            valuation['name'] = p['name']
+        return valuations
+    return [dict(v) for v in listing_cache.get_or_set(('valuations',), build)]
+
+def _check_fields(properties: List[Dict]):
+    # Client-supplied dicts: anything but strings and numbers is a bad request, not a crash
+    for i, p in enumerate(properties):
+        for field in ('location', 'property_type'):
+            if not isinstance(p.get(field), (str, type(None))):
+                raise ValueError(f"Property {i}: {field} must be a string")
+        for field in ('area_sqft', 'price_inr', 'price'):
+            value = p.get(field)
+            if isinstance(value, bool) or not isinstance(value, (str, int, float, type(None))):
+                raise ValueError(f"Property {i}: {field} must be a number")
+
+def value_properties(properties: List[Dict]) -> List[Dict]:
+    """Value an arbitrary list of property dicts against the catalog model; raises ValueError"""
+    if len(properties) > MAX_BATCH_SIZE:
+        raise ValueError(f"At most {MAX_BATCH_SIZE} properties per batch")
+    _check_fields(properties)
+    return get_valuation_model().value(properties)
+
+def annotate_valuations(properties: List[Dict]) -> List[Dict]:
+    """Add a 'valuation' flag (overpriced/underpriced/fair) to listing rows in place"""
+    if properties:
+        for p, valuation in zip(properties, get_valuation_model().value(properties)):
+            p['valuation'] = valuation['valuation']
+            p['estimated_price'] = valuation['estimated_price']
+    return properties
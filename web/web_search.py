@@ -1,131 +1,310 @@
-import requests
-from bs4 import BeautifulSoup
-import json
-from typing import List, Dict, Optional
-import re
-try:
-    from googlesearch import search as google_search
-except ImportError:
-    google_search = None
-
-class WebSearchEngine:
-    def __init__(self):
-        self.session = requests.Session()
-        self.session.headers.update({
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-        })
-
-    def search_property_market_info(self, location: str, property_type: Optional[str] = None) -> Dict:
-        """Search for real estate market information in a specific location, or nearby amenities if 'nearby' in location/property_type."""
-        if (location and 'nearby' in location.lower()) or (property_type and 'nearby' in property_type.lower()):
-            return self.search_nearby_amenities(location)
-        if google_search:
-            search_query = f"real estate market {location}"
-            results = list(google_search(search_query, num_results=3))
-            summary = '\n'.join([f"{i+1}. {r}" for i, r in enumerate(results)])
-            return {
-                'location': location,
-                'search_results': results,
-                'summary': f"Top results for real estate market in {location}:\n{summary}"
-            }
-        else:
-            return {
-                'location': location,
-                'search_results': [],
-                'summary': '[Error] googlesearch-python is not installed. Please run: pip install googlesearch-python'
-            }
-
-    def search_property_comparison(self, property_name: str, location: str) -> Dict:
-        """Search for similar properties and market comparisons"""
-        # Simplified version without external search
-        comparison_info = {
-            'property_name': property_name,
-            'location': location,
-            'search_results': [],
-            'comparison': f'Similar properties in {location} are priced competitively. {property_name} offers good value compared to other properties in the area with similar amenities and features.'
-        }
-        return comparison_info
-
-    def search_nearby_amenities(self, location: str, query: Optional[str] = None) -> Dict:
-        """Search for nearby amenities and facilities. If 'nearby' is in the query, perform a real web search using googlesearch-python."""
-        if query and 'nearby' in query.lower() and google_search:
-            # Perform a real Google search for nearby amenities
-            search_query = f"nearby amenities in {location}"
-            results = list(google_search(search_query, num_results=3))
-            summary = '\n'.join([f"{i+1}. {r}" for i, r in enumerate(results)])
-            return {
-                'location': location,
-                'amenities': {},
-                'summary': f"Top results for nearby amenities in {location}:\n{summary}"
-            }
-        elif query and 'nearby' in query.lower() and not google_search:
-            return {
-                'location': location,
-                'amenities': {},
-                'summary': '[Error] googlesearch-python is not installed. Please run: pip install googlesearch-python'
-            }
-        # Simplified version with mock data
-        amenities_info = {
-            'location': location,
-            'amenities': {
-                'schools': {
-                    'search_results': [],
-                    'summary': f'Multiple reputed schools are located within 2-3 km of {location}, including international schools and CBSE institutions.'
-                },
-                'hospitals': {
-                    'search_results': [],
-                    'summary': f'Well-equipped hospitals and medical centers are easily accessible from {location}, with 24/7 emergency services available.'
-                },
-                'shopping centers': {
-                    'search_results': [],
-                    'summary': f'Shopping malls, supermarkets, and retail outlets are conveniently located near {location} for daily needs.'
-                },
-                'restaurants': {
-                    'search_results': [],
-                    'summary': f'A variety of restaurants, cafes, and food courts are available in and around {location}, offering diverse cuisines.'
-                },
-                'parks': {
-                    'search_results': [],
-                    'summary': f'Beautiful parks and recreational areas are located near {location}, perfect for outdoor activities and family time.'
-                }
-            }
-        }
-        return amenities_info
-
-    def search_property_news(self, location: Optional[str] = None, property_type: Optional[str] = None) -> Dict:
-        """Search for recent real estate news and developments"""
-        # Simplified version with mock data
-        news_info = {
-            'location': location,
-            'property_type': property_type,
-            'search_results': [],
-            'summary': 'Recent real estate developments show positive growth trends with increasing demand for quality properties. Market conditions are favorable for both buyers and investors.'
-        }
-        return news_info
-
-    def get_property_valuation_estimate(self, location: str, property_type: str, bedrooms: int, area_sqft: int) -> Dict:
-        """Get property valuation estimate based on market data"""
-        # Simplified version with estimated calculations
-        base_price_per_sqft = 5000  # ₹5000 per sqft as base
-        location_multiplier = 1.2 if 'Hyderabad' in location else 1.0
-        type_multiplier = 1.3 if property_type == 'Villa' else 1.0
-        
-        estimated_price = base_price_per_sqft * area_sqft * location_multiplier * type_multiplier
-        
-        if estimated_price > 10000000:  # More than 1 crore
-            price_str = f"₹{estimated_price/10000000:.1f} Crores"
-        else:
-            price_str = f"₹{estimated_price/100000:.1f} Lakhs"
-        
-        valuation_info = {
-            'location': location,
-            'property_type': property_type,
-            'bedrooms': bedrooms,
-            'area_sqft': area_sqft,
-            'search_results': [],
-            'estimate': f'Estimated price range: {price_str} based on current market rates and property specifications.'
-        }
-        return valuation_info
-
-# Global instance
-web_search = WebSearchEngine() 
\ No newline at end of file
+import requests
+from bs4 import BeautifulSoup
+import json
+import os
+import time
+import sqlite3
+import asyncio
+import threading
+from collections import OrderedDict
+from typing import Callable, List, Dict, Optional, Tuple
+import re
+from metrics import web_search_upstream_duration
+try:
+    from googlesearch import search as google_search
+except ImportError:
+    google_search = None
+
+class WebSearchEngine:
+    def __init__(self, search_backend: Optional[Callable[[str, int], List[str]]] = None):
+        # search_backend(query, num_results) -> list of result URLs; defaults to googlesearch
+        self.search_backend = search_backend
+        if search_backend is None and google_search is not None:
+            self.search_backend = lambda query, num_results: list(google_search(query, num_results=num_results))
+        self.session = requests.Session()
+        self.session.headers.update({
+            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+        })
+
+    def search_property_market_info(self, location: str, property_type: Optional[str] = None) -> Dict:
+        """Search for real estate market information in a specific location, or nearby amenities if 'nearby' in location/property_type."""
+        if (location and 'nearby' in location.lower()) or (property_type and 'nearby' in property_type.lower()):
+            return self.search_nearby_amenities(location)
+        if self.search_backend:
+            search_query = f"real estate market {location}"
+            results = self.search_backend(search_query, 3)
+            summary = '\n'.join([f"{i+1}. {r}" for i, r in enumerate(results)])
+            return {
+                'location': location,
+                'search_results': results,
+                'summary': f"Top results for real estate market in {location}:\n{summary}"
+            }
+        else:
+            return {
+                'location': location,
+                'search_results': [],
+                'summary': '[Error] googlesearch-python is not installed. Please run: pip install googlesearch-python'
+            }
+
+    def search_property_comparison(self, property_name: str, location: str) -> Dict:
+        """Search for similar properties and market comparisons"""
+        # Simplified version without external search
+        comparison_info = {
+            'property_name': property_name,
+            'location': location,
+            'search_results': [],
+            'comparison': f'Similar properties in {location} are priced competitively. {property_name} offers good value compared to other properties in the area with similar amenities and features.'
+        }
+        return comparison_info
+
+    def search_nearby_amenities(self, location: str, query: Optional[str] = None) -> Dict:
+        """Search for nearby amenities and facilities. If 'nearby' is in the query, perform a real web search using googlesearch-python."""
+        if query and 'nearby' in query.lower() and self.search_backend:
+            # Perform a real Google search for nearby amenities
+            search_query = f"nearby amenities in {location}"
+            results = self.search_backend(search_query, 3)
+            summary = '\n'.join([f"{i+1}. {r}" for i, r in enumerate(results)])
+            return {
+                'location': location,
+                'amenities': {},
+                'summary': f"Top results for nearby amenities in {location}:\n{summary}"
+            }
+        elif query and 'nearby' in query.lower() and not self.search_backend:
+            return {
+                'location': location,
+                'amenities': {},
+                'summary': '[Error] googlesearch-python is not installed. Please run: pip install googlesearch-python'
+            }
+        # Simplified version with mock data
+        amenities_info = {
+            'location': location,
+            'amenities': {
+                'schools': {
+                    'search_results': [],
+                    'summary': f'Multiple reputed schools are located within 2-3 km of {location}, including international schools and CBSE institutions.'
+                },
+                'hospitals': {
+                    'search_results': [],
+                    'summary': f'Well-equipped hospitals and medical centers are easily accessible from {location}, with 24/7 emergency services available.'
+                },
+                'shopping centers': {
+                    'search_results': [],
+                    'summary': f'Shopping malls, supermarkets, and retail outlets are conveniently located near {location} for daily needs.'
+                },
+                'restaurants': {
+                    'search_results': [],
+                    'summary': f'A variety of restaurants, cafes, and food courts are available in and around {location}, offering diverse cuisines.'
+                },
+                'parks': {
+                    'search_results': [],
+                    'summary': f'Beautiful parks and recreational areas are located near {location}, perfect for outdoor activities and family time.'
+                }
+            }
+        }
+        return amenities_info
+
+    def search_property_news(self, location: Optional[str] = None, property_type: Optional[str] = None) -> Dict:
+        """Search for recent real estate news and developments"""
+        # Simplified version with mock data
+        news_info = {
+            'location': location,
+            'property_type': property_type,
+            'search_results': [],
+            'summary': 'Recent real estate developments show positive growth trends with increasing demand for quality properties. Market conditions are favorable for both buyers and investors.'
+        }
+        return news_info
+
+    def get_property_valuation_estimate(self, location: str, property_type: str, bedrooms: int, area_sqft: int) -> Dict:
+        """Get property valuation estimate based on market data"""
+        # Priced by the model fitted on the catalog; imported here so that
+        # importing the search engine does not open the database
+        from web.valuation import get_valuation_model, format_price_inr
+        estimated_price = get_valuation_model().estimate([location], [property_type], [area_sqft])[0]
+        
+        if estimated_price != estimated_price:  # NaN: no usable area
+            price_str = 'unavailable'
+        else:
+            price_str = format_price_inr(estimated_price)
+        
+        valuation_info = {
+            'location': location,
+            'property_type': property_type,
+            'bedrooms': bedrooms,
+            'area_sqft': area_sqft,
+            'search_results': [],
+            'estimate': f'Estimated price range: {price_str} based on current market rates and property specifications.'
+        }
+        return valuation_info
+
+class SearchCache:
+    """Bounded in-memory LRU of search results, optionally backed by a SQLite file.
+
+    Entries are stored with the time they were fetched so callers can decide
+    whether a value is fresh, stale-but-usable or expired.
+    """
+
+    def __init__(self, maxsize: int = 1024, path: Optional[str] = None):
+        self.maxsize = maxsize
+        self.path = path
+        self._memory: 'OrderedDict[str, Tuple[Dict, float]]' = OrderedDict()
+        self._lock = threading.Lock()
+        if path:
+            with sqlite3.connect(path) as conn:
+                conn.execute('''CREATE TABLE IF NOT EXISTS search_cache (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    fetched_at REAL NOT NULL
+                )''')
+
+    def peek(self, key: str) -> Optional[Tuple[Dict, float]]:
+        """Return (value, fetched_at) from memory only, or None"""
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                self._memory.move_to_end(key)
+            return entry
+
+    def get(self, key: str) -> Optional[Tuple[Dict, float]]:
+        """Return (value, fetched_at) or None; falls back to disk on a memory miss"""
+        entry = self.peek(key)
+        if entry is not None or not self.path:
+            return entry
+        with sqlite3.connect(self.path) as conn:
+            row = conn.execute('SELECT value, fetched_at FROM search_cache WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            return None
+        entry = (json.loads(row[0]), row[1])
+        self._remember(key, entry)
+        return entry
+
+    def set(self, key: str, value: Dict, fetched_at: Optional[float] = None):
+        entry = (value, fetched_at if fetched_at is not None else time.time())
+        self._remember(key, entry)
+        if self.path:
+            with sqlite3.connect(self.path) as conn:
+                conn.execute('INSERT OR REPLACE INTO search_cache (key, value, fetched_at) VALUES (?, ?, ?)',
+                             (key, json.dumps(value), entry[1]))
+
+    def _remember(self, key: str, entry: Tuple[Dict, float]):
+        with self._lock:
+            self._memory[key] = entry
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.maxsize:
+                self._memory.popitem(last=False)
+
+class AsyncWebSearchEngine:
+    """Non-blocking, cached front end for WebSearchEngine.
+
+    Calls run in worker threads behind a concurrency limit. Identical
+    in-flight queries share one upstream call. Results are cached per query
+    for a per-method TTL; after that they are still served for ``stale_ttl``
+    seconds while a background refresh runs. A caller waits at most
+    ``timeout`` seconds, and gets a stale value instead of an error when
+    one exists.
+    """
+
+    DEFAULT_TTLS = {
+        'search_property_market_info': 6 * 3600,
+        'search_nearby_amenities': 24 * 3600,
+        'search_property_news': 30 * 60,
+    }
+
+    def __init__(self, engine: WebSearchEngine, max_concurrency: int = 4, timeout: float = 8.0,
+                 ttls: Optional[Dict[str, float]] = None, default_ttl: float = 3600,
+                 stale_ttl: float = 24 * 3600, cache: Optional[SearchCache] = None):
+        self.engine = engine
+        self.timeout = timeout
+        self.ttls = dict(self.DEFAULT_TTLS, **(ttls or {}))
+        self.default_ttl = default_ttl
+        self.stale_ttl = stale_ttl
+        self.cache = cache or SearchCache()
+        self.max_concurrency = max_concurrency
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    async def search_property_market_info(self, location: str, property_type: Optional[str] = None) -> Dict:
+        return await self.call('search_property_market_info', location, property_type)
+
+    async def search_nearby_amenities(self, location: str, query: Optional[str] = None) -> Dict:
+        return await self.call('search_nearby_amenities', location, query)
+
+    async def search_property_news(self, location: Optional[str] = None, property_type: Optional[str] = None) -> Dict:
+        return await self.call('search_property_news', location, property_type)
+
+    async def call(self, method: str, *args) -> Dict:
+        """Run engine.<method>(*args) through the cache, coalescing and concurrency limit"""
+        key = json.dumps([method, *args])
+        entry = self.cache.peek(key)
+        if entry is None and self.cache.path:
+            entry = await asyncio.to_thread(self.cache.get, key)
+        if entry is not None:
+            value, fetched_at = entry
+            age = time.time() - fetched_at
+            ttl = self.ttls.get(method, self.default_ttl)
+            if age < ttl:
+                self.hits += 1
+                return value
+            if age < ttl + self.stale_ttl:
+                # Serve stale now, refresh in the background
+                self.stale_hits += 1
+                self._fetch(key, method, args)
+                return value
+        self.misses += 1
+        task = self._fetch(key, method, args)
+        try:
+            # shield: a caller timing out must not cancel the shared fetch
+            return await asyncio.wait_for(asyncio.shield(task), self.timeout)
+        except asyncio.TimeoutError:
+            if entry is not None:
+                return entry[0]
+            raise
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'hits': self.hits,
+            'stale_hits': self.stale_hits,
+            'misses': self.misses,
+            'coalesced': self.coalesced,
+            'inflight': len(self._inflight),
+        }
+
+    def _fetch(self, key: str, method: str, args: tuple) -> asyncio.Task:
+        task = self._inflight.get(key)
+        if task is not None:
+            self.coalesced += 1
+            return task
+        task = asyncio.create_task(self._run(key, method, args))
+        self._inflight[key] = task
+        task.add_done_callback(lambda t: self._done(key, t))
+        return task
+
+    def _done(self, key: str, task: asyncio.Task):
+        self._inflight.pop(key, None)
+        if not task.cancelled():
+            task.exception()  # mark retrieved so background refresh failures are not logged as unhandled
+
+    async def _run(self, key: str, method: str, args: tuple) -> Dict:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        async with self._semaphore:
+            started = time.perf_counter()
+            outcome = 'error'
+            try:
+                value = await asyncio.to_thread(getattr(self.engine, method), *args)
+                outcome = 'ok'
+            finally:
+                web_search_upstream_duration.observe(time.perf_counter() - started, method=method,
+                                                     outcome=outcome)
+        if self.cache.path:
+            await asyncio.to_thread(self.cache.set, key, value)
+        else:
+            self.cache.set(key, value)
+        return value
+
+# Global instance
+web_search = WebSearchEngine() 
+async_web_search = AsyncWebSearchEngine(web_search, cache=SearchCache(path=os.environ.get('WEB_SEARCH_CACHE_DB')))
\ No newline at end of file